@@ -0,0 +1,78 @@
+"""
+Memory and load time of the job store
+
+Builds a synthetic store of N jobs spread over the usual interval folders and compares the legacy full pickle of the
+store against the compact column format written by MemStore.serialize_store().
+
+    python -m benchmarks.bench_store 1000000
+"""
+import gc
+import io
+import pickle
+import sys
+import tracemalloc
+from pathlib import Path
+from time import perf_counter
+
+from pycron import settings
+from pycron.jobs.jobs import Job
+from pycron.persistance.compact_store import CompactStoreCodec
+
+FOLDERS = ['1min', '5min', '15min', '1hour', '1hour/at0030', '2hour/at0015', '1day/at0200', '1day/at1345',
+           '1week/at0015']
+
+
+def build_store(job_count: int) -> dict:
+    store = {}
+    for index in range(job_count):
+        script_path = settings.JOBS_FOLDER / FOLDERS[index % len(FOLDERS)] / f'job_{index:07}.sh'
+        store[script_path] = Job(script_path)
+    return store
+
+
+def measure(label: str, dump, load, store: dict):
+    start = perf_counter()
+    data = dump(store)
+    dump_time = perf_counter() - start
+
+    gc.collect()
+    start = perf_counter()
+    loaded = load(data)
+    load_time = perf_counter() - start
+    assert len(loaded) == len(store)
+    del loaded
+
+    # Memory is measured on a second load, tracing allocations slows loading down several times over
+    gc.collect()
+    tracemalloc.start()
+    loaded = load(data)
+    load_memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{label:10} size {len(data) / 2 ** 20:8.1f} MB | dump {dump_time:6.2f} s | '
+          f'load {load_time:6.2f} s | loaded store {load_memory / 2 ** 20:8.1f} MB')
+
+    del loaded
+    gc.collect()
+
+
+def main(job_count: int):
+    settings.JOBS_FOLDER = Path('/etc/pycron/jobs')
+
+    start = perf_counter()
+    store = build_store(job_count)
+    distinct = len({id(job.interval) for job in store.values()})
+    print(f'Built {job_count} jobs in {perf_counter() - start:.2f} s, sharing {distinct} interval instances')
+
+    # What serialize_store() used to write: every Job, Path, UUID and Interval pickled in full
+    measure('pickle', pickle.dumps, pickle.loads, store)
+
+    def compact_dump(jobs):
+        buffer = io.BytesIO()
+        CompactStoreCodec.dump(jobs, buffer)
+        return buffer.getvalue()
+
+    measure('compact', compact_dump, lambda data: CompactStoreCodec.decode(data, settings.JOBS_FOLDER), store)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -1,4 +1,3 @@
-from pycron.settings import SettingsSingleton
-
-settings = SettingsSingleton.get_settings()
+from pycron.settings import SettingsSingleton, LazySettings
 
+settings = LazySettings()
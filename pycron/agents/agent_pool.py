@@ -0,0 +1,238 @@
+import hmac
+import json
+import socketserver
+from datetime import datetime
+from threading import Lock, Thread
+from time import monotonic
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+from pycron import settings
+from pycron.agents.protocol import Address, decode_result, encode, parse_time, run_message
+from pycron.executor.job_process import RunResult
+from pycron.jobs.jobs import Job
+
+
+class AgentRun:
+    """
+    A run of a worker agent, collected by FolderExecutor.record_result like a JobProcess
+
+    Without a result message the run was lost with its agent and is rerun.
+    """
+
+    def __init__(self, job: Job, message: dict = None):
+        self.job = job
+        self.message = message or {}
+        self.started_at: Optional[datetime] = parse_time(self.message.get('started_at'))
+        self.finished_at: Optional[datetime] = parse_time(self.message.get('finished_at'))
+
+    def result(self) -> Optional[RunResult]:
+        return decode_result(self.message, self.job.script_path)
+
+
+class AgentConnection:
+    """
+    One connected worker agent and the runs the daemon handed it
+    """
+
+    def __init__(self, name: str, slots: int, wfile):
+        self.name = name
+        self.slots = slots
+        self.wfile = wfile
+        self.runs: Dict[UUID, Job] = {}
+        self.write_lock = Lock()
+
+    @property
+    def free(self) -> int:
+        return self.slots - len(self.runs)
+
+    def send(self, message: dict):
+        with self.write_lock:
+            self.wfile.write(encode(message))
+            self.wfile.flush()
+
+
+class _AgentRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        pool: AgentPool = self.server.pool
+        try:
+            hello = json.loads(self.rfile.readline() or 'null')
+        except ValueError:
+            return
+        if not isinstance(hello, dict) or hello.get('type') != 'hello':
+            return
+        if not pool.authenticated(hello):
+            settings.LOG.warning(f'Refused worker agent {hello.get("name")} from {self.client_address or "the socket"}: '
+                                 f'wrong AGENT_TOKEN')
+            return
+
+        agent = pool.connected(hello, self.wfile)
+        try:
+            for line in self.rfile:
+                pool.received(agent, json.loads(line))
+        except (OSError, ValueError) as excp:
+            settings.LOG.warning(f'Lost worker agent {agent.name}: {excp}')
+        finally:
+            pool.disconnected(agent)
+
+
+class _ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class AgentPool:
+    """
+    The worker agents connected to the daemon on AGENT_ADDRESS, see WorkerAgent
+
+    Purpose: Run jobs in other processes, possibly on other hosts, while this daemon keeps scheduling them and their
+            state in its MemStore
+
+            A due job goes to the agent with the most free slots, jobs stay due while no agent has a free slot. Results
+            are recorded from the connection's thread, never from the scheduler loop. The runs of an agent that
+            disconnects wait AGENT_LOST_SECONDS for it to come back and claim them, and are rerun otherwise.
+
+            Agents are sent script paths, environments and working directories, and their results are trusted. With
+            AGENT_TOKEN set, only agents presenting it in their hello are served.
+    """
+
+    def __init__(self, executor, address: Address):
+        self.executor = executor
+        self.address = address
+
+        self.lock = Lock()
+        self.agents: List[AgentConnection] = []
+        # run uuid -> (job, since when) of runs no connected agent claimed
+        self.orphans: Dict[UUID, Tuple[Job, float]] = {}
+
+        self.server: socketserver.BaseServer = None
+        self.thread: Thread = None
+
+    def start(self):
+        if isinstance(self.address, tuple):
+            self.server = _ThreadingTCPServer(self.address, _AgentRequestHandler)
+        else:
+            # A stale socket from a daemon that did not exit cleanly would make the bind fail
+            self.address.unlink(missing_ok=True)
+            self.server = _ThreadingUnixServer(str(self.address), _AgentRequestHandler)
+        self.server.pool = self
+
+        self.thread = Thread(target=self.server.serve_forever, name='agent_socket', daemon=True)
+        self.thread.start()
+        settings.LOG.info(f'Waiting for worker agents on {self.address}')
+
+    def stop(self):
+        if self.server is None:
+            return
+
+        self.server.shutdown()
+        self.server.server_close()
+        if not isinstance(self.address, tuple):
+            self.address.unlink(missing_ok=True)
+
+    def adopt(self, jobs: List[Job]):
+        """
+        Runs a previous daemon handed to agents, they are claimed when the agents reconnect
+        """
+        with self.lock:
+            for job in jobs:
+                self.orphans[job.run_uuid] = (job, monotonic())
+
+    @staticmethod
+    def authenticated(hello: dict) -> bool:
+        if not settings.AGENT_TOKEN:
+            return True
+        return hmac.compare_digest(str(hello.get('token', '')).encode(), settings.AGENT_TOKEN.encode())
+
+    def connected(self, hello: dict, wfile) -> AgentConnection:
+        agent = AgentConnection(hello.get('name', 'agent'), int(hello.get('slots', 0)), wfile)
+
+        with self.lock:
+            for run_uuid in hello.get('running', ()):
+                orphan = self.orphans.pop(UUID(run_uuid), None)
+                if orphan is not None:
+                    agent.runs[orphan[0].run_uuid] = orphan[0]
+            self.agents.append(agent)
+
+        settings.LOG.info(f'Worker agent {agent.name} connected with {agent.slots} slots, {len(agent.runs)} runs resumed')
+        return agent
+
+    def disconnected(self, agent: AgentConnection):
+        with self.lock:
+            if agent not in self.agents:
+                return
+            self.agents.remove(agent)
+            for job in agent.runs.values():
+                self.orphans[job.run_uuid] = (job, monotonic())
+
+        settings.LOG.warning(f'Worker agent {agent.name} disconnected with {len(agent.runs)} runs, they are rerun unless '
+                             f'it reconnects within {settings.AGENT_LOST_SECONDS} seconds')
+
+    def received(self, agent: AgentConnection, message: dict):
+        kind = message.get('type')
+        if kind == 'slots':
+            with self.lock:
+                agent.slots = int(message['slots'])
+        elif kind == 'result':
+            self.completed(agent, message)
+
+    def completed(self, agent: AgentConnection, message: dict):
+        run_uuid = UUID(message['run_uuid'])
+        with self.lock:
+            job = agent.runs.pop(run_uuid, None)
+            if job is None:
+                job = self.orphans.pop(run_uuid, (None, None))[0]
+
+        if job is None:
+            # Given up on and rerun already
+            settings.LOG.warning(f'Worker agent {agent.name} reported unknown run {run_uuid}, ignoring it')
+            return
+
+        self.executor.record_agent_run(job, AgentRun(job, message))
+
+    def free_slots(self) -> int:
+        with self.lock:
+            return sum(max(agent.free, 0) for agent in self.agents)
+
+    def dispatch(self, job: Job) -> bool:
+        """
+        Hand a locked job to the agent with the most free slots, False when there is none
+        """
+        with self.lock:
+            agent = max(self.agents, key=lambda connected: connected.free, default=None)
+            if agent is None or agent.free <= 0:
+                return False
+            agent.runs[job.run_uuid] = job
+
+        try:
+            agent.send(run_message(job))
+        except OSError as excp:
+            # The connection's thread notices as well and orphans the agent's runs, this one included
+            settings.LOG.warning(f'Unable to hand {job.relative_name} to worker agent {agent.name}: {excp}')
+        return True
+
+    def expire_lost(self):
+        """
+        Give up on the runs of agents that did not come back in time, called by the scheduler loop
+        """
+        deadline = monotonic() - settings.AGENT_LOST_SECONDS
+        with self.lock:
+            lost = [run_uuid for run_uuid, (_, since) in self.orphans.items() if since < deadline]
+            jobs = [self.orphans.pop(run_uuid)[0] for run_uuid in lost]
+
+        for job in jobs:
+            self.executor.record_agent_run(job, AgentRun(job))
+
+    def status(self) -> dict:
+        with self.lock:
+            return {
+                'agents': [{'name': agent.name, 'slots': agent.slots,
+                            'running': [str(job.relative_name) for job in agent.runs.values()]}
+                           for agent in self.agents],
+                # Runs of disconnected agents, rerun once AGENT_LOST_SECONDS passed
+                'awaiting_agent': [str(job.relative_name) for job, _ in self.orphans.values()],
+            }
@@ -0,0 +1,91 @@
+"""
+    Messages between the daemon and its worker agents, one JSON object per line as on the control socket
+
+        agent  -> daemon   {"type": "hello", "name": "host-4242", "slots": 8, "running": [<run uuid>, ...]}
+        daemon -> agent    {"type": "run", "run_uuid": ..., "script_path": ..., "locked_at": ..., "metadata": {...}}
+        agent  -> daemon   {"type": "result", "run_uuid": ..., "returncode": 0, "stdout": <base64>, ...}
+        agent  -> daemon   {"type": "slots", "slots": 0}
+
+    The agent says hello first, listing the runs it still has from an earlier connection. Results of runs that finished
+    while it was disconnected follow the hello.
+"""
+import json
+import socket
+from base64 import b64decode, b64encode
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+from pycron.executor.job_process import JobProcess, RunResult
+
+Address = Union[Path, Tuple[str, int]]
+
+
+def encode(message: dict) -> bytes:
+    return json.dumps(message, default=str).encode('utf-8') + b'\n'
+
+
+def connect(address: Address, timeout: float = None) -> socket.socket:
+    if isinstance(address, tuple):
+        return socket.create_connection(address, timeout)
+
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.settimeout(timeout)
+    connection.connect(str(address))
+    return connection
+
+
+def run_message(job) -> dict:
+    metadata = job.metadata
+    return {
+        'type': 'run',
+        'run_uuid': str(job.run_uuid),
+        'script_path': str(job.script_path),
+        'relative_name': str(job.relative_name),
+        # Timeouts count from when the daemon admitted the run
+        'locked_at': job.locked_at.isoformat(),
+        'metadata': {
+            'timeout': metadata.timeout,
+            'environment': metadata.environment,
+            'working_directory': str(metadata.working_directory) if metadata.working_directory else None,
+        },
+    }
+
+
+def result_message(process: JobProcess) -> dict:
+    """
+    Collects the finished run, a returncode of None means it was interrupted before it recorded one
+    """
+    result = process.result()
+    message = {
+        'type': 'result',
+        'run_uuid': str(process.job.run_uuid),
+        'returncode': None,
+        'started_at': process.started_at.isoformat() if process.started_at else None,
+        'finished_at': process.finished_at.isoformat() if process.finished_at else None,
+    }
+    if result is not None:
+        message.update({
+            'returncode': result.returncode,
+            'stdout': b64encode(result.stdout).decode('ascii'),
+            'stderr': b64encode(result.stderr).decode('ascii'),
+            'usage': result.usage,
+            'timed_out': result.timed_out,
+        })
+    return message
+
+
+def decode_result(message: dict, script_path: Path) -> Optional[RunResult]:
+    if message.get('returncode') is None:
+        return None
+
+    return RunResult(args=[script_path],
+                     returncode=message['returncode'],
+                     stdout=b64decode(message.get('stdout', '')),
+                     stderr=b64decode(message.get('stderr', '')),
+                     usage=message.get('usage'),
+                     timed_out=message.get('timed_out', False))
+
+
+def parse_time(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
@@ -0,0 +1,168 @@
+import json
+import logging
+import os
+import socket
+from datetime import datetime
+from pathlib import Path
+from threading import Event, Lock, Thread
+from typing import Dict, List
+from uuid import UUID
+
+from pycron import settings
+from pycron.agents.protocol import Address, connect, encode, parse_time, result_message
+from pycron.executor.job_process import JobProcess
+from pycron.jobs.metadata import JobMetadata
+
+
+class AssignedRun:
+    """
+    The job of a run message, as much of a Job as JobProcess needs
+    """
+
+    __slots__ = ('script_path', 'relative_name', 'run_uuid', 'locked_at', 'pid', 'metadata')
+
+    def __init__(self, message: dict):
+        self.script_path = Path(message['script_path'])
+        self.relative_name = Path(message['relative_name'])
+        self.run_uuid = UUID(message['run_uuid'])
+        self.locked_at = parse_time(message['locked_at'])
+        self.pid = None
+
+        metadata = message.get('metadata') or {}
+        working_directory = metadata.get('working_directory')
+        self.metadata = JobMetadata(timeout=metadata.get('timeout'), environment=metadata.get('environment'),
+                                    working_directory=Path(working_directory) if working_directory else None)
+
+
+class WorkerAgent:
+    """
+    Runs the jobs a daemon hands it over AGENT_ADDRESS, started with `pycron agent`
+
+    Purpose: Add execution capacity without another scheduler, the daemon keeps all job state
+
+            Each run is a JobProcess exactly as in the daemon, and its result is streamed back as soon as it exits. When
+            the connection drops the runs carry on, the agent reconnects and delivers the results it held on to. On
+            SIGTERM the agent takes no more runs and exits once the running ones are reported.
+    """
+
+    RECONNECT_DELAY = 5  # seconds
+
+    def __init__(self, address: Address, slots: int, name: str = None):
+        self.address = address
+        self.slots = slots
+        self.name = name or f'{socket.gethostname()}-{os.getpid()}'
+
+        self.lock = Lock()
+        self.running: Dict[UUID, JobProcess] = {}
+        # Results that finished while disconnected, sent after the next hello
+        self.pending: List[dict] = []
+        self.connection: socket.socket = None
+
+        self.stopping = Event()
+        self.drained = Event()
+
+        logging.basicConfig(level=settings.LOG_LEVEL, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    def run(self):
+        while not self.drained.is_set():
+            try:
+                connection = connect(self.address)
+            except OSError as excp:
+                settings.LOG.warning(f'Unable to reach the daemon on {self.address}: {excp}')
+                self.drained.wait(self.RECONNECT_DELAY)
+                continue
+
+            self.serve(connection)
+            if not self.drained.is_set():
+                self.drained.wait(self.RECONNECT_DELAY)
+
+    def stop(self, *_):
+        """
+        SIGTERM: take no more runs, exit once the running ones are reported
+        """
+        settings.LOG.info(f'Stopping, {len(self.running)} runs left')
+        self.stopping.set()
+        # Signal handlers run on the main thread, which may hold the lock
+        Thread(target=self._announce_stop, name='stop', daemon=True).start()
+
+    def _announce_stop(self):
+        with self.lock:
+            self._send({'type': 'slots', 'slots': 0})
+            self._check_drained()
+
+    def serve(self, connection: socket.socket):
+        with self.lock:
+            self.connection = connection
+            slots = 0 if self.stopping.is_set() else self.slots
+            self._send({'type': 'hello', 'name': self.name, 'slots': slots, 'running': list(self.running),
+                        'token': settings.AGENT_TOKEN})
+            pending, self.pending = self.pending, []
+            for message in pending:
+                self._send(message)
+            self._check_drained()
+
+        settings.LOG.info(f'Connected to the daemon on {self.address} with {slots} slots')
+        reader = connection.makefile('rb')
+        try:
+            for line in reader:
+                message = json.loads(line)
+                if message.get('type') == 'run':
+                    self.start(message)
+        except (OSError, ValueError) as excp:
+            settings.LOG.warning(f'Lost the daemon: {excp}')
+        finally:
+            with self.lock:
+                self.connection = None
+            reader.close()
+            connection.close()
+
+    def start(self, message: dict):
+        process = JobProcess(AssignedRun(message))
+        try:
+            process.start()
+        except OSError as excp:
+            settings.LOG.warning(f'Unable to start {process.job.relative_name}: {excp}')
+            with self.lock:
+                self._send(result_message(process))
+            return
+
+        process.started_at = datetime.now()
+        with self.lock:
+            self.running[process.job.run_uuid] = process
+
+        thread = Thread(target=self.await_run, args=(process,))
+        thread.name = str(process.job.relative_name)
+        thread.daemon = True
+        thread.start()
+
+    def await_run(self, process: JobProcess):
+        process.wait()
+        process.finished_at = datetime.now()
+        message = result_message(process)
+
+        with self.lock:
+            del self.running[process.job.run_uuid]
+            self._send(message)
+            self._check_drained()
+
+    def _send(self, message: dict):
+        """
+        Must be called with the lock held, results that cannot be sent now are sent after the next hello
+        """
+        if self.connection is not None:
+            try:
+                self.connection.sendall(encode(message))
+                return
+            except OSError:
+                # The reader notices too and reconnects
+                self.connection = None
+
+        if message['type'] == 'result':
+            self.pending.append(message)
+
+    def _check_drained(self):
+        if self.stopping.is_set() and not self.running and not self.pending:
+            self.drained.set()
+            if self.connection is not None:
+                # Unblocks the reader
+                self.connection.shutdown(socket.SHUT_RDWR)
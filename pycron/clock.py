@@ -0,0 +1,49 @@
+"""
+    Wall clock used by the scheduling logic
+
+    Jobs, intervals and the store read the time through now() so the simulator can run them on a virtual clock.
+"""
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+_virtual_clock = None
+
+
+class VirtualClock:
+    """
+    A clock that only moves when told to
+    """
+
+    def __init__(self, start: datetime):
+        self.current = start
+
+    def now(self) -> datetime:
+        return self.current
+
+    def advance_to(self, moment: datetime):
+        assert moment >= self.current, f'Virtual clock cannot go back from {self.current} to {moment}'
+        self.current = moment
+
+    def advance(self, seconds: float):
+        self.current += timedelta(seconds=seconds)
+
+
+def now() -> datetime:
+    if _virtual_clock is not None:
+        return _virtual_clock.current
+
+    return datetime.now()
+
+
+@contextmanager
+def virtual_clock(clock: VirtualClock):
+    """
+    Run the scheduling logic on the given clock for the duration of the block
+    """
+    global _virtual_clock
+
+    previous, _virtual_clock = _virtual_clock, clock
+    try:
+        yield clock
+    finally:
+        _virtual_clock = previous
@@ -0,0 +1,317 @@
+"""
+    Lightweight management commands
+
+    These read the jobs folder and the persistence file directly. They never build a FolderExecutor or import rich, so
+    they start in tens of milliseconds and are safe to run next to a live daemon.
+"""
+import csv
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+from uuid import UUID
+
+from pycron import settings
+from pycron.clock import VirtualClock, virtual_clock
+from pycron.control.control_client import ControlClient
+from pycron.job_discovery.folder_discovery import JobFolderScanner
+from pycron.jobs.dependencies import DependencyGraph
+from pycron.jobs.history import history_rows, HISTORY_FIELDS
+from pycron.jobs.jobs import Job
+from pycron.jobs.priority import WAIT_REPORT_FIELDS, wait_report
+from pycron.jobs.usage import USAGE_REPORT_FIELDS, usage_rows
+from pycron.persistance.output_archive import OutputArchive
+from pycron.persistance.pickle_persistence import MemStore
+from pycron.simulation.simulator import Simulator, modelled_durations
+from pycron.tracing import all_trace_files, read_trace
+
+# Seconds a simulated run takes when neither --duration nor its recorded history say otherwise
+SIMULATED_DEFAULT_DURATION = 60
+
+
+def load_state() -> Dict:
+    """
+    Jobs as last persisted by the daemon, keyed by script path. Empty if the daemon never ran.
+    """
+    if not settings.PERSISTENCE_FILE.is_file():
+        return {}
+
+    return MemStore.read_store_file(settings.PERSISTENCE_FILE)
+
+
+def current_jobs() -> List[Tuple[Job, bool]]:
+    """
+    Every valid job in the jobs folder, with its persisted state where the daemon already knows about it.
+
+    Paired with whether the job was found in the persisted state.
+    """
+    state = load_state()
+    jobs, _ = JobFolderScanner(store=None).parse_jobs()
+
+    return [(state[job.script_path], True) if job.script_path in state else (job, False) for job in jobs]
+
+
+def _format_time(value: datetime) -> str:
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else '-'
+
+
+def list_jobs(args) -> int:
+    jobs = sorted(current_jobs(), key=lambda pair: str(pair[0].relative_name))
+
+    print(f'{"Job":50} {"Last run":20} {"Failures":>8} {"p50 (s)":>9} {"p95 (s)":>9}  Status')
+    for job, known in jobs:
+        last_run = _format_time(job.last_execution) if known else 'never'
+        p50, p95 = (f'{job.history.p50:.1f}', f'{job.history.p95:.1f}') if job.history else ('-', '-')
+        if job.locked:
+            status = f'running (pid {job.pid})'
+        elif job.parked:
+            status = 'parked'
+        else:
+            status = job.run_reason.value
+        print(f'{str(job.relative_name):50} {last_run:20} {job.failed_attempts:>8} {p50:>9} {p95:>9}  {status}')
+
+    print(f'{len(jobs)} jobs')
+    return 0
+
+
+def next_runs(args) -> int:
+    # Jobs with dependencies run after their upstream jobs, not at a time of their own
+    upcoming = sorted(((job.next_execution, job) for job, _ in current_jobs()
+                       if not job.locked and not DependencyGraph.sidecar(job.script_path).is_file()),
+                      key=lambda pair: pair[0])
+
+    now = datetime.now()
+    for next_execution, job in upcoming[:args['number']]:
+        due = 'overdue' if next_execution < now else f'in {next_execution - now}'.split('.')[0]
+        print(f'{_format_time(next_execution):20} {due:20} {job.relative_name}')
+
+    return 0
+
+
+def validate_tree(args) -> int:
+    """
+    Reports scripts the daemon would reject or be unable to run. Exits non zero if there are any.
+    """
+    jobs, invalid = JobFolderScanner(store=None).parse_jobs()
+    invalid += DependencyGraph.from_scripts([job.script_path for job in jobs]).problems
+
+    problems = [f'{invalid_job.args[0]}: {invalid_job.args[1]}' for invalid_job in invalid]
+    problems += [f'{job.script_path}: Script is not executable'
+                 for job in jobs if not os.access(job.script_path, os.X_OK)]
+
+    for problem in problems:
+        print(problem)
+
+    print(f'{len(jobs)} valid jobs, {len(problems)} problems')
+    return 1 if problems else 0
+
+
+def export_history(args) -> int:
+    """
+    Streams the recorded runs of every job to stdout as csv (default) or jsonl
+    """
+    export_format = args['arguments'][0] if args['arguments'] else 'csv'
+    rows = history_rows(job for job, _ in current_jobs())
+
+    if export_format == 'csv':
+        writer = csv.DictWriter(sys.stdout, fieldnames=HISTORY_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+    elif export_format == 'jsonl':
+        for row in rows:
+            sys.stdout.write(json.dumps(row) + '\n')
+    else:
+        print(f'Unknown export format {export_format}, use csv or jsonl')
+        return 2
+
+    return 0
+
+
+def show_usage(args) -> int:
+    """
+    The jobs, or interval folders with `folders`, that used the most CPU. `csv` prints every one of them as csv.
+    """
+    unknown = set(args['arguments']) - {'folders', 'csv'}
+    if unknown:
+        print('Usage: pycron usage [folders] [csv]')
+        return 2
+
+    rows = usage_rows((job for job, _ in current_jobs()), by_folder='folders' in args['arguments'])
+
+    if 'csv' in args['arguments']:
+        writer = csv.DictWriter(sys.stdout, fieldnames=USAGE_REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+        return 0
+
+    print(f'{"Folder" if "folders" in args["arguments"] else "Job":50} {"Runs":>7} {"CPU (s)":>10} {"CPU/run":>9} '
+          f'{"Max RSS (MB)":>12} {"Blocks in":>10} {"Blocks out":>10}')
+    for row in rows[:args['number']]:
+        print(f'{row["name"]:50} {row["runs"]:>7} {row["cpu_seconds"]:>10.1f} {row["cpu_seconds_per_run"]:>9.3f} '
+              f'{row["max_rss_kb"] / 1024:>12.1f} {row["block_input"]:>10} {row["block_output"]:>10}')
+
+    return 0
+
+
+def show_waits(args) -> int:
+    """
+    How long runs of each priority class waited between being due and starting, `csv` prints it as csv
+    """
+    rows = wait_report(job for job, _ in current_jobs())
+
+    if args['arguments'] and args['arguments'][0] == 'csv':
+        writer = csv.DictWriter(sys.stdout, fieldnames=WAIT_REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+        return 0
+
+    print(f'{"Priority":10} {"Jobs":>7} {"Runs":>8} {"p50 (s)":>9} {"p95 (s)":>9} {"p99 (s)":>9} {"Max (s)":>9}')
+    for row in rows:
+        waits = [f'{row[field]:.1f}' if row[field] is not None else '-' for field in WAIT_REPORT_FIELDS[3:]]
+        print(f'{row["priority"]:10} {row["jobs"]:>7} {row["runs"]:>8} ' + ' '.join(f'{wait:>9}' for wait in waits))
+
+    return 0
+
+
+def show_output(args) -> int:
+    """
+    Prints the archived output of a run, given its run uuid, or of the latest archived run of a job
+    """
+    if not args['arguments']:
+        print('Usage: pycron output <run uuid|job>')
+        return 2
+
+    target = args['arguments'][0]
+    archives = OutputArchive.all_archives()
+
+    try:
+        run_uuid = UUID(target)
+    except ValueError:
+        job = load_state().get(settings.script_path(target))
+        if job is None:
+            print(f'No job {target} has run yet')
+            return 1
+
+        runs = [run for archive in archives for run in archive.runs_of(job.job_uuid)]
+        if not runs:
+            print(f'No archived output for {target}')
+            return 1
+        run_uuid = max(runs, key=lambda run: run[1])[0]
+
+    for archive in archives:
+        record = archive.find(run_uuid)
+        if record is not None:
+            break
+    else:
+        print(f'No archived output for run {run_uuid}')
+        return 1
+
+    output, error = record.pop('output'), record.pop('error')
+    print(json.dumps(record, indent=True))
+    print('--- stdout ---')
+    print(output, end='')
+    print('--- stderr ---')
+    print(error, end='')
+    return 0
+
+
+def simulate(args) -> int:
+    """
+    Replays the schedule of the jobs folder on a virtual clock and reports the load, see Simulator.
+
+    `--add 300:1day/at0200[:120]` adds 300 made up jobs to a folder, optionally with their duration in seconds.
+    `pycron simulate csv` prints one row per minute instead of the summary.
+    """
+    start = datetime.fromisoformat(args['start']) if args['start'] else datetime.now().replace(second=0, microsecond=0)
+
+    jobs = {}
+    with virtual_clock(VirtualClock(start)):
+        for job, _ in current_jobs():
+            jobs[job.script_path] = job
+        durations = modelled_durations(jobs.values(), args['duration'], SIMULATED_DEFAULT_DURATION)
+
+        for addition in args['add'] or []:
+            number, folder, *duration = addition.split(':')
+            for index in range(int(number)):
+                job = Job(settings.JOBS_FOLDER / folder / f'simulated_{index}.sh')
+                jobs[job.script_path] = job
+                durations[job.script_path] = float(duration[0]) if duration else (args['duration'] or
+                                                                                  SIMULATED_DEFAULT_DURATION)
+
+    store = MemStore(jobs=jobs)
+    store.dependencies = DependencyGraph.from_scripts([job.script_path for job in jobs.values()])
+
+    report = Simulator(store, durations, start).run(start + timedelta(days=args['days']))
+
+    if args['arguments'] and args['arguments'][0] == 'csv':
+        writer = csv.DictWriter(sys.stdout, fieldnames=['minute', 'starts', 'concurrency', 'max_lag_seconds'])
+        writer.writeheader()
+        writer.writerows(report.per_minute())
+    else:
+        print('\n'.join(report.summary(args['number'])))
+
+    return 0
+
+
+def export_trace(args) -> int:
+    """
+    Prints the recorded spans as a Chrome trace, optionally only those of one job, e.g. `pycron trace > trace.json`
+    """
+    target = args['arguments'][0] if args['arguments'] else None
+
+    events = [event for path in all_trace_files() for event in read_trace(path)
+              if target is None or event['args'].get('job') == target]
+    if not events:
+        print('No spans recorded, tracing is enabled by TRACE_SAMPLE_RATE', file=sys.stderr)
+        return 1
+
+    json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, sys.stdout)
+    return 0
+
+
+def control(args) -> int:
+    """
+    Sends one request to the running daemon, e.g. `pycron ctl pause 1hour/at0030`
+    """
+    if not args['arguments']:
+        print('Usage: pycron ctl <status|in_flight|next|failures|waits|agents|handlers|run|pause|resume|reset|discover|profile|ping> [job or folder]')
+        return 2
+
+    if not settings.CONTROL_SOCKET:
+        print('No CONTROL_SOCKET configured')
+        return 1
+
+    command, *targets = args['arguments']
+    request = {'limit': args['number']}
+    if targets:
+        request['target'] = targets[0]
+
+    try:
+        with ControlClient(settings.CONTROL_SOCKET) as client:
+            response = client.request(command, **request)
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f'PyCron is not running, nothing listening on {settings.CONTROL_SOCKET}')
+        return 1
+
+    if not response['ok']:
+        print(response['error'])
+        return 1
+
+    print(json.dumps(response['result'], indent=True))
+    return 0
+
+
+COMMANDS = {
+    'list': list_jobs,
+    'next': next_runs,
+    'validate': validate_tree,
+    'history': export_history,
+    'output': show_output,
+    'usage': show_usage,
+    'waits': show_waits,
+    'simulate': simulate,
+    'trace': export_trace,
+    'ctl': control,
+}
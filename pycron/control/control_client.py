@@ -0,0 +1,36 @@
+import json
+import socket
+from pathlib import Path
+
+
+class ControlClient:
+    """
+    Talks to a running daemon over its control socket, see ControlServer for the protocol
+
+    The connection is kept open so tooling can send many requests without reconnecting.
+    """
+
+    def __init__(self, socket_path: Path, timeout: float = 5):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.settimeout(timeout)
+        self.socket.connect(str(socket_path))
+        self.reader = self.socket.makefile('rb')
+
+    def request(self, command: str, **arguments) -> dict:
+        self.socket.sendall(json.dumps({'command': command, **arguments}).encode('utf-8') + b'\n')
+
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError('Control socket closed the connection')
+
+        return json.loads(line)
+
+    def close(self):
+        self.reader.close()
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
@@ -0,0 +1,211 @@
+import heapq
+import json
+import socketserver
+from datetime import datetime
+from pathlib import Path
+from threading import Thread
+
+from pycron import settings
+from pycron.jobs.priority import wait_report
+
+
+class ControlRequestError(Exception):
+    ...
+
+
+class _ControlRequestHandler(socketserver.StreamRequestHandler):
+    """
+    One connection, any number of requests. Each request and response is a single line of JSON.
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                response = {'ok': True, 'result': self.server.control.dispatch(request)}
+            except (ControlRequestError, ValueError, KeyError, TypeError) as excp:
+                response = {'ok': False, 'error': f'{type(excp).__name__}: {excp}'}
+            except Exception as excp:
+                # A failing command must not take the connection down with it
+                settings.LOG.exception(f'Control request {line.strip().decode("utf-8", "replace")} failed')
+                response = {'ok': False, 'error': f'{type(excp).__name__}: {excp}'}
+
+            self.wfile.write(json.dumps(response, default=str).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class _ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class ControlServer:
+    """
+    Local control plane of a running daemon, served on the CONTROL_SOCKET unix socket
+
+    Purpose: Inspect and steer the scheduler without reading the persistence file or restarting the daemon
+
+            Queries are answered from the in memory store, under the executor's store lock when they read jobs the
+            scheduler changes. Commands that change state take the same lock, which job completions are recorded under.
+
+    Request:  {"command": "pause", "target": "1hour/at0030"}
+    Response: {"ok": true, "result": ...} or {"ok": false, "error": "..."}
+    """
+
+    def __init__(self, executor, socket_path: Path):
+        self.executor = executor
+        self.store = executor.store
+        self.socket_path = socket_path
+
+        self.server: _ThreadingUnixServer = None
+        self.thread: Thread = None
+
+    def start(self):
+        # A stale socket from a daemon that did not exit cleanly would make the bind fail
+        self.socket_path.unlink(missing_ok=True)
+
+        self.server = _ThreadingUnixServer(str(self.socket_path), _ControlRequestHandler)
+        self.server.control = self
+
+        self.thread = Thread(target=self.server.serve_forever, name='control_socket', daemon=True)
+        self.thread.start()
+        settings.LOG.info(f'Control socket listening on {self.socket_path}')
+
+    def stop(self):
+        if self.server is None:
+            return
+
+        self.server.shutdown()
+        self.server.server_close()
+        self.socket_path.unlink(missing_ok=True)
+
+    def dispatch(self, request: dict):
+        command = request.get('command')
+        handler = getattr(self, f'command_{command}', None)
+        if handler is None:
+            raise ControlRequestError(f'Unknown command {command}')
+
+        return handler(request)
+
+    def _job(self, request: dict):
+        job = self.store.find(request['target'])
+        if job is None:
+            raise ControlRequestError(f'No job {request["target"]}')
+        return job
+
+    # --- queries ---
+
+    def command_ping(self, request):
+        return 'pong'
+
+    def command_status(self, request):
+        jobs = list(self.store.store.values())
+        return {
+            'jobs': len(jobs),
+            'in_flight': sum(job.locked for job in jobs),
+            'paused': sum(job.paused for job in jobs),
+            'failing': sum(job.failed_attempts > 0 for job in jobs),
+            'parked': sum(job.parked for job in jobs),
+            'last_discovery': self.executor.job_parser.last_check,
+            'catch_up': self.executor.catch_up.status(),
+            'tick_overruns': self.executor.watchdog.overruns,
+            'last_tick_seconds': {name: round(seconds, 3) for name, seconds in self.executor.watchdog.last_tick.items()},
+        }
+
+    def command_in_flight(self, request):
+        with self.executor.store_lock:
+            return [
+                {
+                    'file': str(job.relative_name),
+                    'run_uuid': str(job.run_uuid),
+                    'pid': job.pid,
+                    'started_at': job.locked_at,
+                    'running_for_seconds': (datetime.now() - job.locked_at).total_seconds(),
+                }
+                for job in self.store.in_flight()
+            ]
+
+    def command_next(self, request):
+        limit = int(request.get('limit', 20))
+        # Copy first, discovery may add or remove jobs while this runs
+        jobs = list(self.store.store.values())
+        upcoming = heapq.nsmallest(limit, ((job.next_execution, str(job.relative_name)) for job in jobs
+                                           if not job.locked and not job.paused and self.store.scheduled(job)))
+        return [{'file': name, 'next_execution': next_execution} for next_execution, name in upcoming]
+
+    def command_failures(self, request):
+        limit = int(request.get('limit', self.store.RECENT_FAILURES))
+        with self.executor.store_lock:
+            return list(self.store.recent_failures)[-limit:]
+
+    def command_agents(self, request):
+        if self.executor.agents is None:
+            raise ControlRequestError('No AGENT_ADDRESS configured, jobs run in the daemon itself')
+        return self.executor.agents.status()
+
+    def command_handlers(self, request):
+        if self.executor.results is None:
+            raise ControlRequestError('No RESULT_HANDLERS configured')
+        return self.executor.results.status()
+
+    def command_waits(self, request):
+        with self.executor.store_lock:
+            return wait_report(list(self.store.store.values()))
+
+    # --- commands ---
+
+    def command_run(self, request):
+        job = self._job(request)
+
+        with self.executor.store_lock:
+            if job.locked:
+                raise ControlRequestError(f'{job.relative_name} is already running')
+            if not self.store.within_caps([job]):
+                raise ControlRequestError(f'{job.relative_name} would go over the concurrency limits, try again once '
+                                          f'running jobs finish')
+
+        if not self.executor.parallel_job_runner([job]):
+            # Started by the loop in between, or no worker agent had a free slot
+            raise ControlRequestError(f'{job.relative_name} was not started, '
+                                      f'{"it is already running" if job.locked else "no worker agent has a free slot"}')
+        return {'file': str(job.relative_name), 'run_uuid': str(job.run_uuid)}
+
+    def command_pause(self, request):
+        return self._set_paused(request, True)
+
+    def command_resume(self, request):
+        return self._set_paused(request, False)
+
+    def _set_paused(self, request, paused: bool):
+        with self.executor.store_lock:
+            jobs = self.store.set_paused(request['target'], paused)
+            self.store.trigger_threaded_write()
+
+        return [str(job.relative_name) for job in jobs]
+
+    def command_reset(self, request):
+        with self.executor.store_lock:
+            jobs = self.store.reset_failures(request['target'])
+            self.store.trigger_threaded_write()
+
+        return [str(job.relative_name) for job in jobs]
+
+    def command_profile(self, request):
+        profiler = self.executor.profiler
+        kind = request.get('target')
+
+        if kind == 'cpu':
+            try:
+                return profiler.request_cpu_toggle()
+            except RuntimeError as excp:
+                raise ControlRequestError(str(excp))
+        if kind == 'memory':
+            return profiler.toggle_memory()
+        if kind == 'stacks':
+            return profiler.dump_stacks()
+
+        raise ControlRequestError(f'Unknown profile {kind}, use cpu, memory or stacks')
+
+    def command_discover(self, request):
+        # Discovery walks the tree and edits the store, leave it to the scheduler loop on its next tick
+        self.executor.job_parser.request_discovery()
+        return 'Discovery scheduled for the next tick'
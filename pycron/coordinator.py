@@ -1,8 +1,8 @@
+import signal
 from pathlib import Path
 
 
 from pycron import settings
-from pycron.executor.folder_executor import FolderExecutor
 # from pycron.settings import SLEEP_DURATION, JOBS_FOLDER, LOG
 
 
@@ -16,10 +16,17 @@ class MainThread:
 
         self.param_validation()
 
-        self.executor: FolderExecutor = FolderExecutor( nuke_persistence)
+        from pycron.executor.folder_executor import FolderExecutor
+
+        self.executor: FolderExecutor = FolderExecutor(nuke_persistence)
         self.main_log = settings.LOG
         self.startup_status()
 
+        signal.signal(signal.SIGTERM, self.shutdown)
+        signal.signal(signal.SIGHUP, self.handoff)
+        # SIGUSR1, SIGUSR2 and SIGQUIT profile the running daemon
+        self.executor.profiler.install_signal_handlers()
+
     def param_validation(self):
         if not self.MIN_SLEEP_DURATION < self.job_check_interval < self.MAX_SLEEP_DURATION:
             raise AttributeError(
@@ -31,7 +38,25 @@ class MainThread:
     def startup_status(self):
         self.main_log.info(f'--- Main settings ---')
         self.main_log.info(f'Job folder         -> {self.jobs_folder}')
+        for name, folder in settings.EXTRA_JOB_ROOTS.items():
+            self.main_log.info(f'Job root @{name:11} -> {folder}')
         self.main_log.info(f'Job check interval -> {self.job_check_interval} seconds')
+        if settings.AGENT_ADDRESS:
+            self.main_log.info(f'Worker agents      -> {settings.AGENT_ADDRESS}')
+
+    def shutdown(self, *_):
+        """
+        SIGTERM: stop admitting jobs and give the running ones DRAIN_TIMEOUT_SECONDS to finish
+        """
+        self.main_log.info(f'Shutting down, draining running jobs...')
+        self.executor.stop(settings.DRAIN_TIMEOUT_SECONDS)
+
+    def handoff(self, *_):
+        """
+        SIGHUP: exit straight away and leave the running jobs for the next daemon to re-adopt
+        """
+        self.main_log.info(f'Handing off running jobs for a warm restart...')
+        self.executor.stop(0)
 
     def run(self):
         self.executor.loop()
@@ -0,0 +1,120 @@
+from pathlib import Path
+from time import monotonic
+from typing import List, Optional, Set
+
+from pycron import clock, settings
+from pycron.jobs.jobs import Job
+
+
+class TokenBucket:
+    """
+    Allows `rate` takes a second on average, and up to `burst` at once after a quiet spell
+    """
+
+    def __init__(self, rate: float, burst: int, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = now
+
+    def take(self, now: float) -> bool:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class CatchUp:
+    """
+    Rate limits the runs missed while no daemon was running
+
+    Purpose: Restart after downtime without starting every overdue job in the first tick
+
+            The jobs overdue when the daemon starts are the backlog. They are started at most CATCH_UP_RATE a second,
+            with bursts of up to CATCH_UP_BURST, in the order the store returns due jobs: most urgent priority first,
+            then the longest overdue. Jobs that come due after the start are not held back. Progress is logged every
+            PROGRESS_SECONDS until the backlog is drained.
+    """
+
+    PROGRESS_SECONDS = 10
+
+    def __init__(self, store, rate: float, burst: int):
+        self.store = store
+        self.rate = rate
+        self.burst = burst
+
+        self.backlog: Set[Path] = set()
+        self.total = 0
+        self.started = 0
+
+        self.bucket: TokenBucket = None
+        self.began: float = None
+        self.last_report: float = None
+
+    def start(self):
+        """
+        Called after the first discovery, which reads the dependencies, and before the first tick
+        """
+        if not self.rate:
+            return
+
+        now = clock.now()
+        self.backlog = {job.script_path for job in self.store.store.values() if self.overdue(job, now)}
+        self.total = len(self.backlog)
+
+        if self.total <= self.burst:
+            # Started in the first tick all the same
+            self.backlog = set()
+            return
+
+        self.began = self.last_report = monotonic()
+        self.bucket = TokenBucket(self.rate, self.burst, self.began)
+        settings.LOG.warning(f'{self.total} jobs came due while PyCron was not running, catching up at '
+                             f'{self.rate} jobs a second after a first {self.burst}')
+
+    def overdue(self, job: Job, now) -> bool:
+        return not job.locked and not job.paused and self.store.is_due(job, now)
+
+    def admit(self, jobs: List[Job]) -> List[Job]:
+        """
+        The due jobs, in order, without the backlog jobs that have to wait for a token. Those stay due.
+        """
+        if not self.backlog:
+            return jobs
+
+        now = monotonic()
+        admitted = []
+        for job in jobs:
+            if job.script_path in self.backlog:
+                if not self.bucket.take(now):
+                    continue
+                self.backlog.discard(job.script_path)
+                self.started += 1
+            admitted.append(job)
+
+        if now - self.last_report >= self.PROGRESS_SECONDS or not self.backlog:
+            self.report(now)
+        return admitted
+
+    def report(self, now: float):
+        self.last_report = now
+
+        # Jobs removed, paused or started from the control socket since are no longer waiting
+        current = clock.now()
+        self.backlog = {script_path for script_path in self.backlog
+                        if script_path in self.store.store and self.overdue(self.store.store[script_path], current)}
+
+        if not self.backlog:
+            settings.LOG.info(f'Caught up on {self.total} jobs in {now - self.began:.0f} seconds')
+            return
+
+        settings.LOG.info(f'Catching up: {self.started} of {self.total} overdue jobs started, {len(self.backlog)} left, '
+                          f'about {len(self.backlog) / self.rate:.0f} seconds to go')
+
+    def status(self) -> Optional[dict]:
+        if not self.backlog:
+            return None
+        return {'overdue': self.total, 'started': self.started, 'left': len(self.backlog)}
@@ -1,16 +1,23 @@
 import logging
-import subprocess
+from datetime import datetime, timedelta
 from logging.handlers import TimedRotatingFileHandler
-from pathlib import Path
-from threading import Thread, Lock
-from time import sleep
-
-from rich.logging import RichHandler
+from threading import Thread, Lock, Condition, Event
+from time import monotonic, sleep
+from typing import List, Tuple
 
 from pycron import settings
+from pycron.agents.agent_pool import AgentPool, AgentRun
+from pycron.executor.catch_up import CatchUp
+from pycron.control.control_server import ControlServer
+from pycron.executor.job_process import BatchProcess, JobProcess
+from pycron.executor.profiler import Profiler
+from pycron.executor.result_handlers import ResultDispatcher
+from pycron.executor.second_timer import SecondTimer
+from pycron.executor.watchdog import TickWatchdog
 from pycron.job_discovery.folder_discovery import JobFolderScanner
 from pycron.jobs.jobs import Job
 from pycron.persistance.pickle_persistence import MemStore
+from pycron.tracing import tracer
 
 
 # from pycron.settings import LOG, SLEEP_DURATION, RELATIVE_LOGS_FOLDER, LOGGING_LEVEL
@@ -26,11 +33,22 @@ class FolderExecutor:
     """
 
     def __init__(self, nuke_persistence):
+        # rich is only needed once the daemon actually runs, management commands never import it
+        from rich.logging import RichHandler
 
         self.store = MemStore(nuke_persistence)
-        self.job_parser = JobFolderScanner(self.store)
-
         self.store_lock = Lock()
+        self.job_parser = JobFolderScanner(self.store, self.store_lock)
+        # Jobs overdue after downtime are started gradually rather than all in the first tick
+        self.catch_up = CatchUp(self.store, settings.CATCH_UP_RATE, settings.CATCH_UP_BURST)
+
+        # Notified every time a run is recorded, used to drain in-flight runs on shutdown
+        self.run_recorded = Condition(self.store_lock)
+
+        self.stopping = Event()
+        self.drain_timeout = 0
+        # Set once the final state is written on shutdown, runs finishing after that are left for the next daemon
+        self.handed_off = False
 
         logging.basicConfig(
             level=settings.LOG_LEVEL,
@@ -42,7 +60,11 @@ class FolderExecutor:
         logging.addLevelName(self.store.JOB_FAILED, 'JOB FAILED')
         logging.addLevelName(self.store.JOB_SUCCEEDED, 'JOB SUCCEEDED')
 
-        file_handler = TimedRotatingFileHandler(settings.LOGS_FOLDER / 'job_status.log',
+        status_log = settings.LOGS_FOLDER / 'job_status.log'
+        if settings.sharded:
+            status_log = settings.shard_file(status_log, settings.SHARD_ID)
+
+        file_handler = TimedRotatingFileHandler(status_log,
                                                 when='H',
                                                 interval=24,
                                                 backupCount=30)
@@ -52,55 +74,333 @@ class FolderExecutor:
             logging.Formatter('%(asctime)s - %(levelname)s - %(message)s \n'))
         settings.LOG.addHandler(file_handler)
 
+        # Jobs with second intervals run from their own timer thread rather than from the loop below
+        self.second_timer = SecondTimer(self)
+        self.profiler = Profiler(self)
+        self.watchdog = TickWatchdog(settings.TICK_BUDGET_SECONDS)
+
+        # Started before re-adopting runs, their results are handed to the handlers too
+        self.results = ResultDispatcher.from_settings()
+        if self.results is not None:
+            self.results.start()
+
+        # Runs go to worker agents rather than child processes of the daemon when AGENT_ADDRESS is set
+        self.agents: AgentPool = None
+        if settings.AGENT_ADDRESS:
+            self.agents = AgentPool(self, settings.AGENT_ADDRESS)
+
+        self.adopt_running_jobs()
+        if self.agents is not None:
+            self.agents.start()
+
+        self.control_server = None
+        if settings.CONTROL_SOCKET:
+            self.control_server = ControlServer(self, settings.CONTROL_SOCKET)
+            self.control_server.start()
+
+    def adopt_running_jobs(self):
+        """
+        Pick up the runs a previous daemon handed off instead of rerunning them
+        """
+        for job in self.store.in_flight():
+            if job.pid is None:
+                # Handed to a worker agent, which claims it again when it reconnects
+                if self.agents is not None:
+                    self.agents.adopt([job])
+                else:
+                    settings.LOG.warning(f'{job.relative_name} was handed off without a pid, to a worker agent or '
+                                         f'before its process started, and AGENT_ADDRESS is not set, it will be rerun')
+                    job.unlock()
+                continue
+
+            process = JobProcess.reattach(job)
+
+            if process.running():
+                settings.LOG.info(f'Re-adopting {job.relative_name} (pid {job.pid})')
+                self._start_job_thread(job, self.await_job, process)
+            else:
+                # Finished while no daemon was watching it
+                with self.store_lock:
+                    self.record_result(job, process)
+
+    def stop(self, drain_timeout: float):
+        """
+        Stop admitting jobs. The loop then waits up to drain_timeout seconds for in-flight runs before handing off.
+        """
+        self.drain_timeout = drain_timeout
+        self.stopping.set()
+
+    def drain(self):
+        """
+        Wait for in-flight runs up to the deadline, then persist the state of the runs still going.
+
+        The runs still going keep running and are re-adopted by pid by the next daemon.
+        """
+        deadline = monotonic() + self.drain_timeout
+
+        with self.store_lock:
+            in_flight = self.store.in_flight()
+            if in_flight:
+                settings.LOG.info(f'Waiting up to {self.drain_timeout} seconds for {len(in_flight)} running jobs...')
+
+            while in_flight and monotonic() < deadline:
+                self.run_recorded.wait(deadline - monotonic())
+                in_flight = self.store.in_flight()
+
+            if in_flight:
+                settings.LOG.warning(f'Handing off {len(in_flight)} running jobs to the next daemon: {in_flight}')
+
+            self.store.trigger_threaded_write()
+            self.handed_off = True
+
+        if self.results is not None:
+            self.results.stop(max(deadline - monotonic(), 0))
+        if self.control_server:
+            self.control_server.stop()
+        if self.agents is not None:
+            self.agents.stop()
+
     def loop(self):
-        while True:
-            runnables = self.store.runnable()
+        # Dependencies are only known once the jobs folder was read, until then downstream jobs look overdue
+        if self.job_parser.run_discovery():
+            self.second_timer.sync(self.store)
+        with self.store_lock:
+            self.catch_up.start()
 
-            self.parallel_job_runner(runnables)
+        self.second_timer.start()
+        self.watchdog.start()
+        phase = self.watchdog.phase
+
+        while not self.stopping.is_set():
+            with phase('runnable'), tracer.span('runnable', tracer.tick_sampled()):
+                # Runs recorded or commands handled meanwhile change the jobs, take a consistent snapshot
+                with self.store_lock:
+                    runnables = self.catch_up.admit(self.store.runnable())
+
+            with phase('spawn'):
+                if self.agents is None:
+                    batches, runnables = self.batches(runnables)
+                    for batch in batches:
+                        self.batch_job_runner(batch)
+                else:
+                    self.agents.expire_lost()
+                self.parallel_job_runner(runnables)
 
             # Debug runtimes
-            self.store.next_runnable()
+            with phase('next_runnable'):
+                self.store.next_runnable()
 
             # update store after run
-            self.job_parser.run_discovery()
-            sleep(settings.SLEEP_DURATION)
+            with phase('discovery'):
+                if self.job_parser.run_discovery():
+                    self.second_timer.sync(self.store)
+
+            with phase('sleep'):
+                self.stopping.wait(settings.SLEEP_DURATION)
+            self.watchdog.end_tick()
 
-    def parallel_job_runner(self, jobs: [Job]):
+        self.watchdog.stop()
+        self.second_timer.stop()
+        self.drain()
+
+    def parallel_job_runner(self, jobs: [Job], due: datetime = None) -> List[Job]:
+        """
+        Start the jobs, returns those started. The others were already running or found no free agent slot.
+        """
         number_of_threads = len(jobs)
 
         threads = []
+        started = []
+        for job in jobs:
+            with self.store_lock:
+                # Jobs can also be started from the control socket, never run one twice
+                if job.locked:
+                    continue
+                if self.agents is not None and not self.agents.free_slots():
+                    # The rest stay due until an agent has room, the most urgent ones come first
+                    break
+                job.lock(due or self.store.due_time(job))  # Job is locked by thread
+
+                if self.agents is not None:
+                    with tracer.run_span('dispatch', job):
+                        if self.agents.dispatch(job):
+                            started.append(job)
+                        else:
+                            job.unlock()
+                    continue
+
+                started.append(job)
+
+            with tracer.run_span('start_thread', job):
+                threads.append(self._start_job_thread(job, self.execute_job))
+
+            if tracer.run_sampled(job.run_uuid):
+                # From when the job became due until it was admitted
+                tracer.complete('queued', job.locked_at - timedelta(seconds=job.start_lag), job.locked_at,
+                                **tracer.run_args(job))
+
+        settings.LOG.debug(f'Finished creating {number_of_threads} threads')
+        return started
+
+    def batches(self, jobs: List[Job]) -> Tuple[List[List[Job]], List[Job]]:
+        """
+        Split off the jobs of BATCH_FOLDERS, grouped by folder in batches of at most BATCH_MAX_JOBS
+        """
+        if not settings.BATCH_FOLDERS:
+            return [], jobs
+
+        by_folder = {}
+        single = []
         for job in jobs:
-            job.lock()  # Job is locked by thread
-            thread = Thread(target=self.execute_job, args=(job,))
-            thread.name = job.relative_name
+            folder = job.relative_name.parent
+            # Timeouts, environment and working directory need a process of the job's own
+            if folder in settings.BATCH_FOLDERS and self.store.scheduled(job) and not job.metadata.isolated:
+                by_folder.setdefault(folder, []).append(job)
+            else:
+                single.append(job)
+
+        batches = []
+        for folder_jobs in by_folder.values():
+            if len(folder_jobs) == 1:
+                single.extend(folder_jobs)
+                continue
+            for start in range(0, len(folder_jobs), settings.BATCH_MAX_JOBS):
+                batches.append(folder_jobs[start:start + settings.BATCH_MAX_JOBS])
+
+        return batches, single
+
+    def batch_job_runner(self, jobs: List[Job]):
+        with self.store_lock:
+            # Jobs can also be started from the control socket, never run one twice
+            jobs = [job for job in jobs if not job.locked]
+            for job in jobs:
+                job.lock(self.store.due_time(job))
+
+        if jobs:
+            thread = Thread(target=self.execute_batch, args=(jobs,))
+            thread.name = f'batch {jobs[0].relative_name.parent}'
             thread.daemon = True
             thread.start()
-            threads.append(thread)
 
-        settings.LOG.debug(f'Finished creating {number_of_threads} threads')
+    @staticmethod
+    def _start_job_thread(job: Job, target, *args) -> Thread:
+        thread = Thread(target=target, args=(job, *args))
+        thread.name = str(job.relative_name)
+        thread.daemon = True
+        thread.start()
+        return thread
 
     def execute_job(self, job: Job):
         """
+        Runs the job's script and records the result once it exits
+        """
+        settings.LOG.debug(f'Trying to execute: {(job.script_path.absolute())}')
+        process = JobProcess(job)
+
+        # Spawning under the lock keeps the pid consistent with what drain() persists
+        with self.store_lock:
+            if self.stopping.is_set():
+                job.unlock()
+                return
+            with tracer.run_span('spawn', job):
+                process.start()
 
-        Async this
+        self.await_job(job, process)
 
-        :param job:
-        :return:
+    def execute_batch(self, jobs: List[Job]):
         """
-        settings.LOG.debug(f'Trying to execute: {(job.script_path.absolute())}')
-        feedback: subprocess.CompletedProcess = subprocess.run(
-            [(job.script_path.absolute())],
-            shell=True,
-            capture_output=True
-        )
+        Runs the scripts of the jobs one after the other in a single shell and records each result as it comes in
+        """
+        batch = BatchProcess(jobs)
+        traced = any(tracer.run_sampled(job.run_uuid) for job in jobs)
+
         with self.store_lock:
-            if feedback.returncode == 0:
-                settings.LOG.debug(f'{job.relative_name} succeeded')
+            if self.stopping.is_set():
+                for job in jobs:
+                    job.unlock()
+                return
+            with tracer.span('spawn_batch', traced, jobs=len(jobs)):
+                batch.start()
 
-                self.store.job_successful(job, feedback)
-            else:
-                settings.LOG.warning(f'{job.relative_name} failed...')
-                self.store.job_failed(job, feedback)
+        self.await_batch(batch)
+
+    def await_batch(self, batch: BatchProcess):
+        while batch.current() is not None:
+            finished = batch.finished()
+            if not finished:
+                sleep(batch.POLL_INTERVAL)
+                continue
+
+            # One store write for every run that finished since the last check
+            traced = any(tracer.run_sampled(run.job.run_uuid) for run in finished)
+            with tracer.span('record_batch', traced, jobs=len(finished)), self.store_lock:
+                if self.handed_off:
+                    return
+                for run in finished:
+                    if run.started_at is not None:
+                        run.job.mark_started(run.started_at)
+                    if run.finished_at is not None and tracer.run_sampled(run.job.run_uuid):
+                        tracer.complete('execute', run.job.locked_at, run.finished_at, **tracer.run_args(run.job))
+                    self.record_result(run.job, run, persist=False)
+                self.store.trigger_threaded_write()
+
+                downstream = [ready for run in finished for ready in self.store.ready_downstream(run.job)]
+
+            if downstream and not self.stopping.is_set():
+                self.parallel_job_runner(downstream)
+
+    def await_job(self, job: Job, process: JobProcess):
+        with tracer.run_span('execute', job, pid=job.pid):
+            process.wait()
+
+        # Includes waiting for the store lock, the status log and writing the store
+        with tracer.run_span('record_result', job), self.store_lock:
+            if self.handed_off:
+                return
+            self.record_result(job, process)
+            downstream = self.store.ready_downstream(job)
+
+        # Start the next jobs of a pipeline right away rather than on the next tick, independent branches run in parallel
+        if downstream and not self.stopping.is_set():
+            self.parallel_job_runner(downstream)
+
+    def record_agent_run(self, job: Job, run: AgentRun):
+        """
+        Called from the connection thread of the worker agent that ran the job
+        """
+        with tracer.run_span('record_result', job), self.store_lock:
+            if self.handed_off:
+                return
+            if run.started_at is not None:
+                job.mark_started(run.started_at)
+            self.record_result(job, run)
+            downstream = self.store.ready_downstream(job)
+
+        if downstream and not self.stopping.is_set():
+            self.parallel_job_runner(downstream)
+
+    def record_result(self, job: Job, process: JobProcess, persist=True):
+        """
+        Must be called with the store lock held, persist=False leaves writing the store to the caller
+        """
+        feedback = process.result()
+
+        if feedback is None:
+            settings.LOG.warning(f'{job.relative_name} was interrupted before it finished, it will be rerun')
+            job.unlock()
+            if persist:
+                self.store.trigger_threaded_write()
+        elif feedback.returncode == 0:
+            settings.LOG.debug(f'{job.relative_name} succeeded')
+
+            self.store.job_successful(job, feedback, persist, process.finished_at)
+        else:
+            settings.LOG.warning(f'{job.relative_name} failed...')
+            self.store.job_failed(job, feedback, persist, process.finished_at)
+
+        if feedback is not None and self.results is not None:
+            self.results.submit(job, feedback)
+        self.run_recorded.notify_all()
 
 
 class JobFilter(logging.Filter):
@@ -0,0 +1,289 @@
+import os
+import shlex
+import signal
+import subprocess
+from datetime import datetime
+from pathlib import Path
+from threading import Timer
+from time import sleep
+from typing import List, Optional
+
+from pycron import clock, settings
+from pycron.jobs.jobs import Job
+from pycron.jobs.usage import usage_of
+
+
+class RunResult(subprocess.CompletedProcess):
+    """
+    A finished run, usage holds the resources its process used when this daemon reaped it
+    """
+
+    def __init__(self, args, returncode, stdout, stderr, usage: dict = None, timed_out: bool = False):
+        super().__init__(args, returncode, stdout, stderr)
+        self.usage = usage
+        # Terminated for running longer than the timeout of its metadata
+        self.timed_out = timed_out
+
+
+class JobProcess:
+    """
+    A single run of a job's script as a child process
+
+    The script runs in its own session with stdout, stderr and the exit code written to files under
+    LOGS_FOLDER/running. That way the run survives the daemon being restarted, and the next daemon can re-adopt it by
+    pid and still collect its result.
+    """
+
+    POLL_INTERVAL = 0.5  # seconds, only used for adopted runs that are not our children
+    PF_KTHREAD = 0x00200000  # flag of kernel threads in /proc/<pid>/stat
+    KILL_GRACE = 10  # seconds a run that timed out gets to exit after SIGTERM before it is killed
+
+    def __init__(self, job: Job, process: subprocess.Popen = None):
+        self.job = job
+        self.process = process
+
+        run_folder = self.run_folder()
+        self.stdout_file = run_folder / f'{job.run_uuid}.out'
+        self.stderr_file = run_folder / f'{job.run_uuid}.err'
+        self.return_code_file = run_folder / f'{job.run_uuid}.rc'
+
+        # Only known for the runs of a batch, for single runs the time the result is recorded is used
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+
+        # Resource usage, only known for runs of our own children
+        self.usage: Optional[dict] = None
+
+        self.timed_out = False
+        self.timers: List[Timer] = []
+
+    @staticmethod
+    def run_folder() -> Path:
+        run_folder = settings.LOGS_FOLDER / 'running'
+        run_folder.mkdir(parents=True, exist_ok=True)
+        return run_folder
+
+    def start(self):
+        metadata = self.job.metadata
+        script = shlex.quote(str(self.job.script_path.absolute()))
+        return_code_file = shlex.quote(str(self.return_code_file))
+
+        if metadata.working_directory is not None:
+            # A missing directory fails the run like the script would, with the reason in its error output
+            script = f'cd {shlex.quote(str(metadata.working_directory))} && {script}'
+
+        # Record the exit code next to the output so it can be read by whichever daemon ends up reaping the run
+        command = f'{script}; rc=$?; echo $rc > {return_code_file}; exit $rc'
+
+        with open(self.stdout_file, 'wb') as stdout, open(self.stderr_file, 'wb') as stderr:
+            self.process = subprocess.Popen(command,
+                                            shell=True,
+                                            stdout=stdout,
+                                            stderr=stderr,
+                                            env={**os.environ, **metadata.environment} if metadata.environment else None,
+                                            start_new_session=True)
+
+        self.job.pid = self.process.pid
+
+    @classmethod
+    def reattach(cls, job: Job) -> 'JobProcess':
+        """
+        Wrap a run started by a previous daemon
+        """
+        return cls(job)
+
+    def running(self) -> bool:
+        if self.process is not None:
+            return self.process.poll() is None
+
+        pid = self.job.pid
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+
+        # Guard against the pid having been reused by an unrelated process
+        cmdline = Path(f'/proc/{pid}/cmdline')
+        if cmdline.exists():
+            try:
+                arguments = cmdline.read_text(errors='replace')
+                if not arguments:
+                    return self._executing(pid)
+                return str(self.job.run_uuid) in arguments
+            except OSError:
+                return False
+
+        return True
+
+    @classmethod
+    def _executing(cls, pid: int) -> bool:
+        """
+        A process without arguments is either still inside exec, its arguments only show up once the shell is loaded,
+        or a zombie or kernel thread
+        """
+        try:
+            stat = Path(f'/proc/{pid}/stat').read_text(errors='replace')
+        except OSError:
+            return False
+
+        # The command name in parentheses may contain spaces, the fields after it are state, ppid, ... flags
+        fields = stat.rpartition(')')[2].split()
+        return fields[0] != 'Z' and not int(fields[6]) & cls.PF_KTHREAD
+
+    def wait(self):
+        timeout = self.job.metadata.timeout
+        if timeout is not None:
+            # Adopted runs keep the deadline they got when they started
+            remaining = timeout - (clock.now() - self.job.locked_at).total_seconds()
+            self._after(max(remaining, 0), self.time_out)
+
+        try:
+            self._wait()
+        finally:
+            for timer in self.timers:
+                timer.cancel()
+
+    def _wait(self):
+        if self.process is not None:
+            # Reaped with wait4 rather than Popen.wait for the resource usage of the script and its children
+            try:
+                _, status, rusage = os.wait4(self.process.pid, 0)
+            except ChildProcessError:
+                self.process.wait()
+                return
+
+            self.process.returncode = os.waitstatus_to_exitcode(status)
+            self.usage = usage_of(rusage)
+            return
+
+        while self.running():
+            sleep(self.POLL_INTERVAL)
+
+    def _after(self, seconds: float, action, *args):
+        timer = Timer(seconds, action, args)
+        timer.daemon = True
+        self.timers.append(timer)
+        timer.start()
+
+    def time_out(self):
+        """
+        Terminate the whole session of the run, its script and anything the script started
+        """
+        self.timed_out = True
+        settings.LOG.warning(f'{self.job.relative_name} ran longer than its {self.job.metadata.timeout} second timeout, '
+                             f'terminating it')
+        self._signal(signal.SIGTERM)
+        self._after(self.KILL_GRACE, self._signal, signal.SIGKILL)
+
+    def _signal(self, signal_number: int):
+        try:
+            # Runs are started in a session of their own, the shell's pid is its process group
+            os.killpg(self.job.pid, signal_number)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def result(self) -> Optional[subprocess.CompletedProcess]:
+        """
+        Collect the output of a finished run and clean up its files.
+
+        Returns None when the run was interrupted before it could record an exit code.
+        """
+        return_code = None
+        if self.return_code_file.is_file():
+            try:
+                return_code = int(self.return_code_file.read_text().strip())
+            except ValueError:
+                return_code = None
+
+        if return_code is None and self.process is not None:
+            # Killed by a signal, the shell never got to write the exit code
+            return_code = self.process.returncode
+
+        stdout = self.stdout_file.read_bytes() if self.stdout_file.is_file() else b''
+        stderr = self.stderr_file.read_bytes() if self.stderr_file.is_file() else b''
+
+        self.cleanup()
+
+        if return_code is None:
+            return None
+
+        return RunResult(args=[self.job.script_path.absolute()],
+                         returncode=return_code,
+                         stdout=stdout,
+                         stderr=stderr,
+                         usage=self.usage,
+                         timed_out=self.timed_out)
+
+    def cleanup(self):
+        for run_file in (self.stdout_file, self.stderr_file, self.return_code_file):
+            run_file.unlink(missing_ok=True)
+
+
+class BatchProcess:
+    """
+    The runs of several jobs back to back in one shell, see BATCH_FOLDERS
+
+    Each script still writes its output and exit code to its own run files, exactly as a JobProcess would, so results
+    are collected per job and a batch handed off to the next daemon is re-adopted job by job. Only the shell, the
+    waiting thread and the store write are shared.
+    """
+
+    POLL_INTERVAL = 0.02  # seconds between checks for finished runs
+
+    def __init__(self, jobs: List[Job]):
+        self.runs = [JobProcess(job) for job in jobs]
+        self.process: subprocess.Popen = None
+
+        # Index of the first run not collected yet
+        self.collected = 0
+
+    def start(self):
+        commands = []
+        for run in self.runs:
+            script = shlex.quote(str(run.job.script_path.absolute()))
+            stdout, stderr, return_code_file = (shlex.quote(str(run_file)) for run_file in
+                                                (run.stdout_file, run.stderr_file, run.return_code_file))
+            commands.append(f'{script} > {stdout} 2> {stderr}; echo $? > {return_code_file}')
+
+        # Taken before the launch, the coarser file times that end each run never come before it
+        self.runs[0].started_at = clock.now()
+        self.process = subprocess.Popen('\n'.join(commands),
+                                        shell=True,
+                                        stdout=subprocess.DEVNULL,
+                                        stderr=subprocess.DEVNULL,
+                                        start_new_session=True)
+
+        for run in self.runs:
+            run.job.pid = self.process.pid
+
+    def finished(self) -> List[JobProcess]:
+        """
+        Runs that finished since the last call
+
+        A run is over once the shell opened the output of the next one, its exit code is fully written by then. The
+        exit code file is written as the run ends, so its modification time is when the run finished and the next
+        one started.
+        """
+        exited = self.process.poll() is not None
+
+        finished = []
+        while self.collected < len(self.runs):
+            following = self.collected + 1
+            if not exited and (following == len(self.runs) or not self.runs[following].stdout_file.exists()):
+                break
+
+            run = self.runs[self.collected]
+            if run.return_code_file.is_file():
+                run.finished_at = datetime.fromtimestamp(run.return_code_file.stat().st_mtime)
+            if self.collected > 0:
+                run.started_at = self.runs[self.collected - 1].finished_at
+
+            finished.append(run)
+            self.collected = following
+
+        return finished
+
+    def current(self) -> Optional[JobProcess]:
+        return self.runs[self.collected] if self.collected < len(self.runs) else None
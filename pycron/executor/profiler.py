@@ -0,0 +1,186 @@
+import cProfile
+import os
+import pstats
+import signal
+import sys
+import threading
+import tracemalloc
+import traceback
+from datetime import datetime
+from pathlib import Path
+from threading import RLock
+from time import perf_counter
+from typing import List, Optional
+
+from pycron import settings
+
+
+class Profiler:
+    """
+    Looks inside a running daemon without restarting it, toggled by signal or from the control socket
+
+        SIGUSR1 ->  start / stop a cProfile session of the scheduler loop and of recording job results
+        SIGUSR2 ->  start / stop tracing allocations, on stop the growth since the start is written out
+        SIGQUIT ->  dump the stack of every thread
+
+    Reports are written to LOGS_FOLDER/profiles. Nothing is hooked in while a session is inactive: the loop profile is
+    the interpreter's own per thread hook, and result recording is only wrapped while a session runs.
+    """
+
+    # Allocation sites listed in the memory report
+    TOP_ALLOCATIONS = 25
+    TRACE_FRAMES = 10
+
+    def __init__(self, executor):
+        self.executor = executor
+        # Reentrant, a signal handler can interrupt another one holding it
+        self.lock = RLock()
+        self.signal_handlers = False
+
+        self.loop_profile: Optional[cProfile.Profile] = None
+        # One profile per recorded result, a profile can only follow the thread it was enabled in
+        self.completion_profiles: List[cProfile.Profile] = []
+        # Seconds each recorded result took, also measured where a second profiler cannot be enabled
+        self.completion_seconds: List[float] = []
+
+        self.memory_baseline: Optional[tracemalloc.Snapshot] = None
+
+    def install_signal_handlers(self):
+        signal.signal(signal.SIGUSR1, self.toggle_cpu)
+        signal.signal(signal.SIGUSR2, self.toggle_memory)
+        signal.signal(signal.SIGQUIT, self.dump_stacks)
+        self.signal_handlers = True
+
+    @staticmethod
+    def _report_path(kind: str, suffix: str) -> Path:
+        folder = settings.LOGS_FOLDER / 'profiles'
+        folder.mkdir(parents=True, exist_ok=True)
+        # Shards share the logs folder, the pid keeps their reports apart
+        return folder / f'{kind}-{datetime.now():%Y%m%d-%H%M%S.%f}-{os.getpid()}{suffix}'
+
+    # --- cpu ---
+
+    @property
+    def profiling(self) -> bool:
+        return self.loop_profile is not None
+
+    def toggle_cpu(self, *_) -> str:
+        with self.lock:
+            if self.profiling:
+                return self._stop_cpu()
+            return self._start_cpu()
+
+    def request_cpu_toggle(self) -> str:
+        """
+        Toggle from another thread: signal handlers run in the main thread, which runs the scheduler loop
+        """
+        if not self.signal_handlers:
+            raise RuntimeError('CPU profiling is only available in a daemon running the scheduler loop')
+
+        action = 'stopping' if self.profiling else 'starting'
+        os.kill(os.getpid(), signal.SIGUSR1)
+        return f'CPU profiling {action}, the daemon log names the report'
+
+    def _start_cpu(self) -> str:
+        # Profiles the thread this runs in, the scheduler loop when called from a signal handler
+        self.loop_profile = cProfile.Profile()
+        self.loop_profile.enable()
+
+        self.executor.record_result = self._profiled_record_result
+        settings.LOG.warning('CPU profiling started, send SIGUSR1 again to write the report')
+        return 'CPU profiling started'
+
+    def _stop_cpu(self) -> str:
+        del self.executor.record_result
+        self.loop_profile.disable()
+
+        stats = pstats.Stats(self.loop_profile)
+        for profile in self.completion_profiles:
+            stats.add(profile)
+
+        path = self._report_path('cpu', '.pstats')
+        stats.dump_stats(path)
+
+        completions = self.completion_seconds
+        if completions:
+            settings.LOG.warning(f'Recorded {len(completions)} results while profiling, '
+                                 f'{sum(completions) / len(completions) * 1000:.1f} ms on average, '
+                                 f'{max(completions) * 1000:.1f} ms at most')
+
+        self.loop_profile = None
+        self.completion_profiles = []
+        self.completion_seconds = []
+        settings.LOG.warning(f'CPU profile written to {path}')
+        return str(path)
+
+    def _profiled_record_result(self, *args):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # From Python 3.12 only one profiler can be active, the loop's, and it already follows every thread
+            profile = None
+
+        started = perf_counter()
+        try:
+            return type(self.executor).record_result(self.executor, *args)
+        finally:
+            self.completion_seconds.append(perf_counter() - started)
+            if profile is not None:
+                profile.disable()
+                self.completion_profiles.append(profile)
+
+    # --- memory ---
+
+    @property
+    def tracing(self) -> bool:
+        return self.memory_baseline is not None
+
+    def toggle_memory(self, *_) -> str:
+        with self.lock:
+            if self.tracing:
+                return self._stop_memory()
+            return self._start_memory()
+
+    def _start_memory(self) -> str:
+        tracemalloc.start(self.TRACE_FRAMES)
+        self.memory_baseline = tracemalloc.take_snapshot()
+        settings.LOG.warning('Tracing allocations, send SIGUSR2 again to write what grew since now')
+        return 'Memory tracing started'
+
+    def _stop_memory(self) -> str:
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        # Allocations made by tracemalloc itself would dominate the report
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        growth = snapshot.filter_traces(ignore).compare_to(self.memory_baseline.filter_traces(ignore), 'traceback')
+        self.memory_baseline = None
+
+        total = sum(difference.size_diff for difference in growth)
+        lines = [f'Allocated since the start of tracing: {total / 1024:.1f} KiB', '']
+        for difference in growth[:self.TOP_ALLOCATIONS]:
+            lines.append(f'{difference.size_diff / 1024:+.1f} KiB in {difference.count_diff:+} blocks '
+                         f'({difference.size / 1024:.1f} KiB now)')
+            lines.extend(f'    {line}' for line in difference.traceback.format())
+
+        path = self._report_path('memory', '.txt')
+        path.write_text('\n'.join(lines) + '\n')
+        settings.LOG.warning(f'Memory growth written to {path}')
+        return str(path)
+
+    # --- stacks ---
+
+    def dump_stacks(self, *_) -> str:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+        lines = []
+        for ident, frame in sys._current_frames().items():
+            lines.append(f'Thread {names.get(ident, "unknown")} ({ident}):')
+            lines.extend(line.rstrip('\n') for line in traceback.format_stack(frame))
+            lines.append('')
+
+        path = self._report_path('stacks', '.txt')
+        path.write_text('\n'.join(lines))
+        settings.LOG.warning(f'Stacks of {len(names)} threads written to {path}')
+        return str(path)
@@ -0,0 +1,310 @@
+import abc
+import importlib
+import json
+from collections import deque
+from queue import Empty, Full, Queue
+from threading import Event, Lock, Thread
+from time import monotonic
+from typing import Dict, List, Optional
+from urllib import request as urllib_request
+
+from pycron import settings
+from pycron.jobs.history import RunHistory
+
+
+class HandledRun:
+    """
+    A finished run as result handlers see it
+
+    Copied from the job when the run is recorded, handlers never read a Job the scheduler goes on changing.
+    """
+
+    __slots__ = ('file', 'root', 'priority', 'job_uuid', 'run_uuid', 'returncode', 'timed_out', 'started_at',
+                 'finished_at', 'failed_attempts', 'parked', 'stdout', 'stderr', 'usage')
+
+    def __init__(self, job, job_status):
+        self.file = str(job.relative_name)
+        self.root = job.root
+        self.priority = job.priority
+        self.job_uuid = job.job_uuid
+        self.run_uuid = job.run_uuid
+        self.returncode = job_status.returncode
+        self.timed_out = getattr(job_status, 'timed_out', False)
+        self.started_at = job.locked_at
+        self.finished_at = job.unlocked_at
+        self.failed_attempts = job.failed_attempts
+        self.parked = job.parked
+        self.stdout: bytes = job_status.stdout
+        self.stderr: bytes = job_status.stderr
+        self.usage: Optional[dict] = getattr(job_status, 'usage', None)
+
+    @property
+    def failed(self) -> bool:
+        return self.returncode != 0
+
+    @property
+    def runtime(self) -> float:
+        return (self.finished_at - self.started_at).total_seconds()
+
+    def as_dict(self) -> dict:
+        """
+        Summary of the run without its output, as in the job status log
+        """
+        return {
+            'file': self.file,
+            'root': self.root,
+            'priority': self.priority,
+            'uuid': str(self.job_uuid),
+            'run_uuid': str(self.run_uuid),
+            'status_code': self.returncode,
+            'timed_out': self.timed_out,
+            'begun_at': self.started_at.isoformat(),
+            'ended_at': self.finished_at.isoformat(),
+            'runtime': self.runtime,
+            'number_of_failed_attempts': self.failed_attempts,
+            'parked': self.parked,
+            **(self.usage or {}),
+        }
+
+
+class ResultHandler(abc.ABC):
+    """
+    Base class of the handlers listed in RESULT_HANDLERS
+
+    A handler is created once when the daemon starts, without arguments, and handle() is called with every finished
+    run. Several handler threads may call it at once, a handler that is not thread safe takes a lock of its own. What
+    it raises is logged and counted, the run is not handed to it again.
+    """
+
+    @abc.abstractmethod
+    def handle(self, result: HandledRun):
+        ...
+
+    def close(self):
+        """
+        Called once on shutdown, after the queued runs were handled
+        """
+
+
+class FailureWebhook(ResultHandler):
+    """
+    Posts every failed run to RESULT_WEBHOOK_URL as JSON, e.g. to an alerting hook
+    """
+
+    TIMEOUT = 10  # seconds
+
+    def __init__(self):
+        if not settings.RESULT_WEBHOOK_URL:
+            raise ValueError('FailureWebhook posts to RESULT_WEBHOOK_URL, which is not set')
+        self.url = settings.RESULT_WEBHOOK_URL
+
+    def handle(self, result: HandledRun):
+        if not result.failed:
+            return
+
+        body = json.dumps(result.as_dict()).encode('utf-8')
+        post = urllib_request.Request(self.url, data=body, headers={'Content-Type': 'application/json'}, method='POST')
+        with urllib_request.urlopen(post, timeout=self.TIMEOUT) as response:
+            response.read()
+
+
+class HandlerMetrics:
+    """
+    Timings of one handler, updated with the dispatcher's lock held
+    """
+
+    RECENT = 100  # runs the percentile is taken over
+
+    def __init__(self, name: str):
+        self.name = name
+        self.handled = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.recent = deque(maxlen=self.RECENT)
+        self.last_error: Optional[str] = None
+
+    def record(self, seconds: float, error: Optional[str]):
+        self.handled += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.recent.append(seconds)
+        if error is not None:
+            self.errors += 1
+            self.last_error = error
+
+    def report(self) -> dict:
+        recent = sorted(self.recent)
+        return {
+            'handler': self.name,
+            'handled': self.handled,
+            'errors': self.errors,
+            'mean_seconds': round(self.total_seconds / self.handled, 4) if self.handled else None,
+            'p95_seconds': round(RunHistory._percentile(recent, 95), 4) if recent else None,
+            'max_seconds': round(self.max_seconds, 4),
+            'last_error': self.last_error,
+        }
+
+
+class ResultDispatcher:
+    """
+    Hands every finished run to the RESULT_HANDLERS on a pool of RESULT_WORKERS threads
+
+    Purpose: Act on results, alert on failures, parse metrics or archive artifacts, without slow integrations holding
+             up the scheduler
+
+            Recording a run only copies it onto a queue of at most RESULT_QUEUE_SIZE runs, it never waits for a
+            handler. Once the handlers fall behind far enough to fill the queue, RESULT_DROP_POLICY drops either the
+            run that just finished (newest) or the one waiting longest (oldest). Drops are counted and logged once per
+            backlog. Each handler is timed on its own.
+    """
+
+    DROP_POLICIES = ('newest', 'oldest')
+
+    def __init__(self, handlers: Dict[str, ResultHandler], queue_size: int, workers: int, drop_policy: str):
+        assert drop_policy in self.DROP_POLICIES, f'Unknown drop policy {drop_policy}'
+
+        self.handlers = handlers
+        self.drop_policy = drop_policy
+        self.worker_count = workers
+        # (queued at, run) pairs
+        self.queue = Queue(maxsize=queue_size)
+
+        self.lock = Lock()
+        self.metrics = {name: HandlerMetrics(name) for name in handlers}
+        self.dropped = 0
+        # Set from the first drop until the queue is empty again
+        self.saturated = False
+        self.max_wait_seconds = 0.0
+
+        self.stopping = Event()
+        self.workers: List[Thread] = []
+
+    @classmethod
+    def from_settings(cls) -> Optional['ResultDispatcher']:
+        if not settings.RESULT_HANDLERS:
+            return None
+
+        handlers = {spec: cls.load(spec) for spec in settings.RESULT_HANDLERS}
+        return cls(handlers, settings.RESULT_QUEUE_SIZE, settings.RESULT_WORKERS, settings.RESULT_DROP_POLICY)
+
+    @staticmethod
+    def load(spec: str) -> ResultHandler:
+        """
+        Creates the handler of a <module>:<class> spec
+        """
+        module_name, class_name = spec.split(':')
+        try:
+            handler_class = getattr(importlib.import_module(module_name), class_name)
+        except (ImportError, AttributeError) as excp:
+            raise ValueError(f'Unable to load result handler {spec}: {excp}')
+
+        if not isinstance(handler_class, type) or not issubclass(handler_class, ResultHandler):
+            raise ValueError(f'Result handler {spec} is not a ResultHandler')
+        try:
+            return handler_class()
+        except TypeError as excp:
+            # Missing handle(), or an __init__ that takes arguments
+            raise ValueError(f'Unable to create result handler {spec}: {excp}')
+
+    def start(self):
+        for number in range(self.worker_count):
+            worker = Thread(target=self.work, name=f'result_handler_{number}', daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+        settings.LOG.info(f'Handing results to {", ".join(self.handlers)} on {self.worker_count} threads')
+
+    def stop(self, timeout: float):
+        """
+        Handle the runs still queued for up to timeout seconds, then close the handlers
+        """
+        self.stopping.set()
+        deadline = monotonic() + timeout
+        for worker in self.workers:
+            worker.join(max(deadline - monotonic(), 0))
+
+        left = self.queue.qsize()
+        if left:
+            settings.LOG.warning(f'Shutting down with {left} runs not given to the result handlers')
+
+        for name, handler in self.handlers.items():
+            try:
+                handler.close()
+            except Exception as excp:
+                settings.LOG.warning(f'Result handler {name} failed to close: {excp!r}')
+
+    def submit(self, job, job_status):
+        """
+        Called with the store lock held as a run is recorded, never blocks
+        """
+        entry = (monotonic(), HandledRun(job, job_status))
+        try:
+            self.queue.put_nowait(entry)
+            return
+        except Full:
+            pass
+
+        if self.drop_policy == 'oldest':
+            try:
+                self.queue.get_nowait()
+            except Empty:
+                pass
+            try:
+                self.queue.put_nowait(entry)
+            except Full:
+                # Refilled by another thread in between, the new run is dropped after all
+                pass
+
+        with self.lock:
+            self.dropped += 1
+            if self.saturated:
+                return
+            self.saturated = True
+
+        settings.LOG.warning(f'Result handlers are falling behind, {self.queue.maxsize} runs queued, dropping the '
+                             f'{self.drop_policy} runs until they catch up')
+
+    def work(self):
+        while True:
+            try:
+                queued_at, result = self.queue.get(timeout=0.1)
+            except Empty:
+                if self.stopping.is_set():
+                    return
+                continue
+
+            waited = monotonic() - queued_at
+            timings = []
+            for name, handler in self.handlers.items():
+                started = monotonic()
+                error = None
+                try:
+                    handler.handle(result)
+                except Exception as excp:
+                    error = f'{type(excp).__name__}: {excp}'
+                    settings.LOG.warning(f'Result handler {name} failed on {result.file} ({result.run_uuid}): {error}')
+                timings.append((name, monotonic() - started, error))
+
+            with self.lock:
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+                for name, seconds, error in timings:
+                    self.metrics[name].record(seconds, error)
+                caught_up = self.saturated and self.queue.empty()
+                if caught_up:
+                    self.saturated = False
+                dropped = self.dropped
+
+            if caught_up:
+                settings.LOG.info(f'Result handlers caught up, {dropped} runs dropped since the daemon started')
+
+    def status(self) -> dict:
+        with self.lock:
+            return {
+                'queued': self.queue.qsize(),
+                'queue_size': self.queue.maxsize,
+                'drop_policy': self.drop_policy,
+                'dropped': self.dropped,
+                'max_wait_seconds': round(self.max_wait_seconds, 4),
+                'handlers': [metrics.report() for metrics in self.metrics.values()],
+            }
@@ -0,0 +1,153 @@
+import heapq
+from datetime import datetime, timedelta
+from itertools import count
+from pathlib import Path
+from threading import Condition, Thread
+from time import monotonic, time
+from typing import Dict, List, Optional, Tuple
+
+from pycron import settings
+
+
+class SecondTimer:
+    """
+    Runs the jobs with second intervals (`15sec` folders) at their slots
+
+    Purpose: Schedule high frequency jobs precisely without scanning the whole store more often
+
+            Deadlines are kept in a heap on the monotonic clock, so wall clock changes do not move them. The thread
+            sleeps until the earliest deadline, or until the jobs change, instead of polling.
+
+            Each job's first deadline is aligned with the wall clock multiples of its interval, after that the next
+            deadline is always the previous one plus the interval. Slots therefore never drift with how long runs
+            take. A slot is skipped when the previous run is still going, and slots missed while the process was
+            suspended are not caught up.
+
+            Due jobs go through the same concurrency limits and priority order as the loop's. A job held back by them
+            is retried every SLEEP_DURATION, as the loop would, until it starts or its next slot comes up.
+    """
+
+    def __init__(self, executor):
+        self.executor = executor
+
+        # (monotonic deadline, tie breaker, script path, slot of a retry or None)
+        self.heap: List[Tuple[float, int, Path, Optional[float]]] = []
+        # script path -> interval in seconds of the jobs the timer runs
+        self.periods: Dict[Path, int] = {}
+        # script path -> tie breaker of the retry still due for it
+        self.retries: Dict[Path, int] = {}
+        self._sequence = count()
+
+        self.condition = Condition()
+        self.stopped = False
+        self.thread = Thread(target=self.run, name='second_timer', daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+
+    def sync(self, store):
+        """
+        Pick up added and removed jobs after a discovery
+        """
+        periods = {job.script_path: job.interval.every for job in store.store.values()
+                   if job.interval.timer_driven and not store.dependencies.has_dependencies(job.script_path)}
+
+        with self.condition:
+            for script_path in periods.keys() - self.periods.keys():
+                heapq.heappush(self.heap, (self._first_deadline(periods[script_path]), next(self._sequence), script_path,
+                                           None))
+
+            # Removed jobs are dropped from the heap when their deadline comes up
+            self.periods = periods
+            self.condition.notify()
+
+        settings.LOG.debug(f'Second timer runs {len(periods)} jobs')
+
+    @staticmethod
+    def _first_deadline(period: int) -> float:
+        # Wall clock first, so the slot lands just after the whole second rather than just before it
+        into_period = time() % period
+        return monotonic() + period - into_period
+
+    def retry(self, script_path: Path, slot: float):
+        """
+        Try again after SLEEP_DURATION to start the run of a slot held back by the concurrency limits
+        """
+        with self.condition:
+            sequence = next(self._sequence)
+            self.retries[script_path] = sequence
+            heapq.heappush(self.heap, (monotonic() + settings.SLEEP_DURATION, sequence, script_path, slot))
+            self.condition.notify()
+
+    def _due(self) -> List[Tuple[Path, float]]:
+        """
+        Waits for the next deadline, then returns the jobs due with the monotonic time of their slot
+        """
+        with self.condition:
+            while not self.stopped:
+                if not self.heap:
+                    self.condition.wait()
+                    continue
+
+                delay = self.heap[0][0] - monotonic()
+                if delay > 0:
+                    self.condition.wait(delay)
+                    continue
+
+                now = monotonic()
+                due = []
+                while self.heap and self.heap[0][0] <= now:
+                    deadline, sequence, script_path, slot = heapq.heappop(self.heap)
+                    period = self.periods.get(script_path)
+                    if period is None:
+                        continue
+
+                    if slot is not None:
+                        # Superseded by a later retry or by the next slot
+                        if self.retries.get(script_path) == sequence:
+                            del self.retries[script_path]
+                            due.append((script_path, slot))
+                        continue
+
+                    self.retries.pop(script_path, None)
+                    due.append((script_path, deadline))
+                    # Next slot after now, skipping any slots missed while the process was not running
+                    missed = int((now - deadline) // period)
+                    heapq.heappush(self.heap, (deadline + (missed + 1) * period, next(self._sequence), script_path,
+                                               None))
+
+                return due
+
+        return []
+
+    def run(self):
+        store = self.executor.store
+        while not self.stopped:
+            due = self._due()
+
+            now = monotonic()
+            started = datetime.now()
+            slots = {}
+            with self.executor.store_lock:
+                jobs = []
+                for script_path, slot in due:
+                    job = store.store.get(script_path)
+                    # Locked means the previous run is still going, the slot is skipped rather than queued
+                    if job is None or job.locked or job.paused:
+                        continue
+                    jobs.append(job)
+                    slots[script_path] = slot
+
+                admitted = store.within_caps(store.prioritised(jobs))
+
+            held_back = slots.keys() - {job.script_path for job in admitted}
+            for script_path in held_back:
+                self.retry(script_path, slots[script_path])
+
+            for job in admitted:
+                self.executor.parallel_job_runner([job], due=started - timedelta(seconds=now - slots[job.script_path]))
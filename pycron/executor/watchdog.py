@@ -0,0 +1,146 @@
+import json
+import sys
+import traceback
+from contextlib import contextmanager
+from threading import Event, Thread, get_ident
+from time import monotonic
+from typing import Dict, Optional
+
+from pycron import settings
+
+
+class TickWatchdog:
+    """
+    Times the phases of every iteration of the scheduler loop and reports the ones that overrun TICK_BUDGET_SECONDS
+
+        runnable -> spawn -> next_runnable -> discovery -> sleep
+
+    The work phases of a tick share the budget, the sleep may take up to SLEEP_DURATION on top of it. A thread of its own
+    notices an overrun while it is happening, and logs the phases so far with a stack sample of the loop's thread, so
+    a tick that never ends is reported as well. Once the overrunning tick does end, its full timings are logged.
+    """
+
+    SLEEP_PHASE = 'sleep'
+
+    def __init__(self, budget: float):
+        self.budget = budget
+        # Ticks that overran since the daemon started
+        self.overruns = 0
+        # Seconds per phase of the last tick that ended
+        self.last_tick: Dict[str, float] = {}
+
+        self.ticks = 0
+        # The tick in progress, written by the loop's thread and read by the watchdog thread
+        self.current: Optional[dict] = None
+        self.loop_thread: Optional[int] = None
+
+        self.stopping = Event()
+        self.thread: Thread = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget > 0
+
+    def start(self):
+        if not self.enabled:
+            return
+
+        self.loop_thread = get_ident()
+        self.thread = Thread(target=self.watch, name='tick_watchdog', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Time one phase of the current tick, the first phase of a tick starts it
+        """
+        if not self.enabled:
+            yield
+            return
+
+        now = monotonic()
+        tick = self.current
+        if tick is None:
+            self.ticks += 1
+            tick = self.current = {'number': self.ticks, 'phases': {}, 'reported': False}
+        # One assignment, the watchdog thread never sees a phase with the start of another
+        tick['running'] = (name, now)
+        try:
+            yield
+        finally:
+            # Cleared first, a phase is never counted both as running and as done
+            tick['running'] = None
+            tick['phases'][name] = monotonic() - now
+
+    def end_tick(self):
+        tick, self.current = self.current, None
+        if tick is None:
+            return
+
+        self.last_tick = tick['phases']
+        if tick['reported'] or self.overran(tick, monotonic()):
+            if not tick['reported']:
+                self.overruns += 1
+            # Full timings, the watchdog thread only saw the phases up to the one that overran
+            settings.LOG.warning(f'Scheduler tick {tick["number"]} overran its {self.budget} second budget: '
+                                 f'{json.dumps(self.report(tick, monotonic()))}')
+
+    def overran(self, tick: dict, now: float) -> bool:
+        running = tick.get('running')
+        if running is not None and running[0] == self.SLEEP_PHASE:
+            if now - running[1] > settings.SLEEP_DURATION + self.budget:
+                return True
+        elif tick['phases'].get(self.SLEEP_PHASE, 0) > settings.SLEEP_DURATION + self.budget:
+            return True
+        return self.work_seconds(tick, now) > self.budget
+
+    def work_seconds(self, tick: dict, now: float) -> float:
+        # Copied, the loop's thread adds phases while the watchdog thread reads them
+        work = sum(seconds for name, seconds in dict(tick['phases']).items() if name != self.SLEEP_PHASE)
+        running = tick.get('running')
+        if running is not None and running[0] != self.SLEEP_PHASE:
+            work += now - running[1]
+        return work
+
+    def report(self, tick: dict, now: float) -> dict:
+        return {
+            'tick': tick['number'],
+            'work_seconds': round(self.work_seconds(tick, now), 3),
+            'phases': {name: round(seconds, 3) for name, seconds in dict(tick['phases']).items()},
+            'overruns': self.overruns,
+        }
+
+    def watch(self):
+        # Checking four times per budget reports an overrun at most a quarter budget late
+        interval = max(self.budget / 4, 0.05)
+        while not self.stopping.wait(interval):
+            self.check(monotonic())
+
+    def check(self, now: float):
+        tick = self.current
+        if tick is None or tick['reported']:
+            return
+
+        running = tick.get('running')
+        if running is None or not self.overran(tick, now):
+            return
+
+        tick['reported'] = True
+        self.overruns += 1
+
+        name, started = running
+        report = self.report(tick, now)
+        report['current_phase'] = name
+        report['current_phase_seconds'] = round(now - started, 3)
+        report['stack'] = self.sample_stack()
+        settings.LOG.warning(f'Scheduler tick {tick["number"]} is overrunning its {self.budget} second budget in '
+                             f'{name}: {json.dumps(report)}')
+
+    def sample_stack(self) -> list:
+        frame = sys._current_frames().get(self.loop_thread)
+        if frame is None:
+            return []
+        return [line.rstrip('\n') for line in traceback.format_stack(frame)]
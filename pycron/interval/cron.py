@@ -0,0 +1,219 @@
+from calendar import monthrange
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from pycron import clock
+from pycron.interval.interval import Interval
+
+
+class Cron(Interval):
+    """
+    Interval defined by a standard 5 field cron expression: minute hour day-of-month month day-of-week
+
+        30 6,18 * * mon-fri     ->  weekdays at 06:30 and 18:30
+        */15 9-17 * * *         ->  every quarter hour from 09:00 to 17:45
+        0 0 1,15 * *            ->  the 1st and 15th of every month at midnight
+
+    Fields accept `*`, numbers, `a-b` ranges, `/step`, comma separated lists and month / weekday names. `@hourly`,
+    `@daily`, `@weekly`, `@monthly` and `@yearly` are shorthands. As in cron, a day is due if either the day of month
+    or the day of week matches when both are restricted.
+
+    Each field is compiled once into a bitset (an int with bit n set when n is allowed). next_time() then jumps to the
+    lowest allowed bit of each field at or after the current value instead of stepping through minutes.
+    """
+
+    __slots__ = ('expression', 'minutes', 'hours', 'days', 'months', 'weekdays', 'days_restricted',
+                 'weekdays_restricted', 'month_cache')
+
+    # Jobs in the cron folder read their expression from a sidecar, see Job._parse_cron_sidecar
+    FOLDER = 'cron'
+    SUFFIX = '.cron'
+
+    MACROS = {
+        '@yearly': '0 0 1 1 *',
+        '@annually': '0 0 1 1 *',
+        '@monthly': '0 0 1 * *',
+        '@weekly': '0 0 * * 0',
+        '@daily': '0 0 * * *',
+        '@midnight': '0 0 * * *',
+        '@hourly': '0 * * * *',
+    }
+
+    _MONTH_NAMES = {name: number for number, name in
+                    enumerate(['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'], 1)}
+    _WEEKDAY_NAMES = {name: number for number, name in enumerate(['sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat'])}
+
+    # A schedule that has not fired within this many years (e.g. 29 Feb on a Monday) is searched no further
+    _SEARCH_YEARS = 28
+
+    def __init__(self, expression: str):
+        super().__init__(every=None)
+        self._compile(expression)
+
+        # Expressions such as `0 0 31 2 *` parse but never fire
+        if self.next_time(datetime(2000, 1, 1)) is None:
+            raise ValueError(f'Cron expression `{expression}` never fires')
+
+    def _compile(self, expression: str):
+        self.expression = ' '.join(expression.split())
+        fields = self.MACROS.get(self.expression.lower(), self.expression).lower().split()
+        if len(fields) != 5:
+            raise ValueError(f'Cron expression `{expression}` needs 5 fields, it has {len(fields)}')
+
+        minute, hour, day, month, weekday = fields
+        self.minutes = self._parse_field(minute, 0, 59)
+        self.hours = self._parse_field(hour, 0, 23)
+        self.days = self._parse_field(day, 1, 31)
+        self.months = self._parse_field(month, 1, 12, self._MONTH_NAMES)
+        # Sunday is both 0 and 7
+        weekdays = self._parse_field(weekday, 0, 7, self._WEEKDAY_NAMES)
+        self.weekdays = (weekdays | weekdays >> 7) & 0b1111111
+
+        self.days_restricted = not day.startswith('*')
+        self.weekdays_restricted = not weekday.startswith('*')
+
+        # (year, month, day bits) of the month looked at last, consecutive runs nearly always fall in the same month
+        self.month_cache = (None, None, 0)
+
+    @staticmethod
+    def _parse_field(field: str, low: int, high: int, names: Dict[str, int] = None) -> int:
+        names = names or {}
+
+        def value(text: str) -> int:
+            number = names[text] if text in names else int(text)
+            if not low <= number <= high:
+                raise ValueError(f'{number} is outside {low}-{high}')
+            return number
+
+        bits = 0
+        for part in field.split(','):
+            span, _, step = part.partition('/')
+            step = int(step) if step else 1
+            if step < 1:
+                raise ValueError(f'Invalid step in `{part}`')
+
+            if span == '*':
+                start, end = low, high
+            elif '-' in span:
+                start, end = map(value, span.split('-', 1))
+            else:
+                # `5/15` means every 15 starting at 5
+                start = value(span)
+                end = high if step > 1 else start
+
+            for number in range(start, end + 1, step):
+                bits |= 1 << number
+
+        return bits
+
+    @staticmethod
+    def _next_bit(bits: int, start: int) -> Optional[int]:
+        """
+        Lowest set bit at or above start
+        """
+        remaining = bits >> start
+        if not remaining:
+            return None
+        return start + (remaining & -remaining).bit_length() - 1
+
+    def _day_bits(self, year: int, month: int) -> int:
+        """
+        Bitset of the days of a month the schedule fires on
+        """
+        cached_year, cached_month, day_bits = self.month_cache
+        if cached_year == year and cached_month == month:
+            return day_bits
+
+        day_bits = self._compute_day_bits(year, month)
+        self.month_cache = (year, month, day_bits)
+        return day_bits
+
+    def _compute_day_bits(self, year: int, month: int) -> int:
+        first_weekday, length = monthrange(year, month)
+        # Cron counts weekdays from Sunday, the calendar module from Monday
+        first_weekday = (first_weekday + 1) % 7
+
+        weekday_days = 0
+        if self.weekdays_restricted:
+            for weekday in range(7):
+                if self.weekdays >> weekday & 1:
+                    for day in range((weekday - first_weekday) % 7 + 1, length + 1, 7):
+                        weekday_days |= 1 << day
+
+        if self.days_restricted and self.weekdays_restricted:
+            day_bits = self.days | weekday_days
+        elif self.weekdays_restricted:
+            day_bits = weekday_days
+        else:
+            day_bits = self.days
+
+        # Drop the days this month does not have
+        return day_bits & ((1 << length + 1) - 2)
+
+    def next_time(self, last_run=None):
+        if last_run is None:
+            last_run = clock.now()
+
+        start = last_run.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        year, month, day, hour, minute = start.year, start.month, start.day, start.hour, start.minute
+
+        while year <= min(start.year + self._SEARCH_YEARS, datetime.max.year):
+            next_month = self._next_bit(self.months, month)
+            if next_month is None:
+                year, month, day, hour, minute = year + 1, 1, 1, 0, 0
+                continue
+            if next_month != month:
+                month, day, hour, minute = next_month, 1, 0, 0
+
+            next_day = self._next_bit(self._day_bits(year, month), day)
+            if next_day is None:
+                year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+                day, hour, minute = 1, 0, 0
+                continue
+            if next_day != day:
+                day, hour, minute = next_day, 0, 0
+
+            next_hour = self._next_bit(self.hours, hour)
+            if next_hour is None:
+                day, hour, minute = day + 1, 0, 0
+                continue
+            if next_hour != hour:
+                hour, minute = next_hour, 0
+
+            next_minute = self._next_bit(self.minutes, minute)
+            if next_minute is None:
+                hour, minute = hour + 1, 0
+                if hour == 24:
+                    day, hour = day + 1, 0
+                continue
+
+            return datetime(year, month, day, hour, next_minute)
+
+        return None
+
+    def _key(self):
+        # Compare what is scheduled rather than the text, `@daily` equals `0 0 * * *`
+        return (type(self), self.minutes, self.hours, self.days, self.months, self.weekdays, self.days_restricted,
+                self.weekdays_restricted)
+
+    def __getstate__(self):
+        return {'expression': self.expression}
+
+    def __setstate__(self, state):
+        self.every = None
+        self.at_data = {}
+        self.window = None
+        self._compile(state['expression'])
+
+    def _at(self, at: str) -> Dict:
+        raise ValueError('Cron intervals are fully defined by their expression')
+
+    def time_delta(self) -> timedelta:
+        """
+        Cron schedules have no fixed length, this is the gap between the next run and the one after it
+        """
+        next_run = self.next_time()
+        return self.next_time(next_run) - next_run
+
+    def __repr__(self):
+        return f'Cron({self.expression!r})'
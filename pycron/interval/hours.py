@@ -5,6 +5,7 @@ from pycron.interval.interval import Interval
 
 
 class Hours(Interval):
+    __slots__ = ()
 
     def time_delta(self):
         return timedelta(hours=self.every)
@@ -1,19 +1,26 @@
 import abc
-from datetime import datetime, timedelta
+from datetime import timedelta
 from typing import Dict
 
+from pycron import clock
+
 
 class Interval(abc.ABC):
     """
     Root class for job intervals
 
     Children need to implement the Time_delta function to generate the correct datetime.timedelta object for the next_time method
+
+    Subclasses declare empty __slots__ so large stores do not carry a __dict__ per interval
     """
-    at_data = {}  # Parameters passed to datetime.replace function.
+    __slots__ = (
+        'every',  # Used to calculate the number of time units to wait between jobs, see time_delta
+        'at_data',  # Parameters passed to datetime.replace function.
+        'window',  # Tolerance after each slot the job may start in, see WindowPlanner
+    )
 
-    # Used to calculate the number of time units to wait between jobs
-    # Implemented by subclasses in the time_delta method
-    every = None
+    # Whether the executor's SecondTimer runs jobs with this interval instead of the store scan
+    timer_driven = False
 
     def __init__(self, every, at: str = None):
         self.every = every
@@ -21,12 +28,31 @@ class Interval(abc.ABC):
             self.at_data = self._at(at)
         else:
             self.at_data = {}
+        self.window = None
+
+    def _key(self):
+        return type(self), self.every, tuple(sorted(self.at_data.items())), self.window
+
+    def __eq__(self, other):
+        return isinstance(other, Interval) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __getstate__(self):
+        return {'every': self.every, 'at_data': self.at_data, 'window': self.window}
+
+    def __setstate__(self, state):
+        # Pickles written before __slots__ hold the instance __dict__, possibly without at_data
+        self.every = state.get('every')
+        self.at_data = state.get('at_data', {})
+        self.window = state.get('window')
 
     def next_time(self, last_run=None):
         int_at = {k: int(v) for k, v in self.at_data.items()}
 
         if last_run is None:
-            last_run = datetime.now()
+            last_run = clock.now()
 
         last_run = last_run.replace(second=00, microsecond=00)
 
@@ -69,6 +95,19 @@ class Interval(abc.ABC):
     def at(self, at: str):
         self.at_data = self._at(at)
 
+    def within(self, window: timedelta):
+        """
+        Let the job start anywhere in the window after each slot rather than on the slot itself
+
+        Only slots pinned by an at folder can carry a window, and the window must end before the next slot
+        """
+        if not self.at_data:
+            raise ValueError('A tolerance window needs an at folder to anchor it')
+        if not timedelta(0) < window < self.time_delta():
+            raise ValueError(f'The tolerance window must be shorter than the interval ({self.time_delta()})')
+
+        self.window = window
+
     @abc.abstractmethod
     def time_delta(self) -> timedelta:
         """
@@ -5,6 +5,7 @@ from pycron.interval.interval import Interval
 
 
 class Minutes(Interval):
+    __slots__ = ()
 
     def _at(self, at: str) -> Dict:
         return {}
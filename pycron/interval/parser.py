@@ -0,0 +1,140 @@
+import re
+from datetime import timedelta
+from typing import Dict, Tuple, Union
+
+from pycron.interval.cron import Cron
+from pycron.interval.days import Days
+from pycron.interval.hours import Hours
+from pycron.interval.interval import Interval
+from pycron.interval.minutes import Minutes
+from pycron.interval.seconds import Seconds
+from pycron.interval.weeks import Weeks
+
+
+class IntervalParser:
+    """
+    Turns the interval folders of a job's path, or a cron expression, into its Interval
+
+        1hour/at0030                ->  every hour at half past
+        1day/at0200/within0300      ->  every day at 02:00, starting within 3 hours
+
+    The grammar is compiled once and each folder is parsed once. Jobs with the same schedule share one Interval
+    instance, whether they were parsed or loaded from the store, so shared intervals must not be changed.
+    """
+
+    EVERY_UNITS = {
+        'sec': Seconds,
+        'min': Minutes,
+        'hour': Hours,
+        'day': Days,
+        'week': Weeks,
+    }
+
+    #                    captures every               captures timeinterval      ensures string ends
+    EVERY = re.compile(rf'(?P<every>[0-9]+)(?P<time_interval>{"|".join(EVERY_UNITS)})\Z')
+    AT = re.compile(r'at(?P<at>[0-2][0-9][0-5][0-9])\Z')
+    WITHIN = re.compile(r'within(?P<hours>[0-9][0-9])(?P<minutes>[0-5][0-9])\Z')
+
+    def __init__(self):
+        # Interval folders -> their interval, or the reason they are invalid
+        self.folders: Dict[Tuple[str, ...], Union[Interval, str]] = {}
+        # Cron expression -> its interval, or the reason it is invalid
+        self.expressions: Dict[str, Union[Cron, str]] = {}
+        # Interval -> the instance every equal interval is replaced by
+        self.shared: Dict[Interval, Interval] = {}
+
+    def intern(self, interval: Interval) -> Interval:
+        return self.shared.setdefault(interval, interval)
+
+    def folder(self, parts: Tuple[str, ...]) -> Interval:
+        """
+        The interval of the folders between the job root and a script, raises ValueError when they are invalid
+        """
+        # Only an at folder, and a within folder below it, add to the interval, deeper folders organise the jobs
+        if len(parts) == 2 or (len(parts) == 3 and parts[2].startswith('within')):
+            key = parts
+        else:
+            key = parts[:1]
+
+        parsed = self.folders.get(key)
+        if parsed is None:
+            try:
+                parsed = self.intern(self._parse_folder(key))
+            except ValueError as excp:
+                # Every script in an invalid folder is rejected with the same reason, it is parsed once
+                parsed = str(excp)
+            self.folders[key] = parsed
+
+        if isinstance(parsed, str):
+            raise ValueError(parsed)
+        return parsed
+
+    def cron(self, expression: str) -> Cron:
+        """
+        The interval of a cron expression, raises ValueError when it is invalid
+        """
+        expression = ' '.join(expression.split())
+
+        parsed = self.expressions.get(expression)
+        if parsed is None:
+            try:
+                parsed = self.intern(Cron(expression))
+            except ValueError as excp:
+                parsed = str(excp)
+            self.expressions[expression] = parsed
+
+        if isinstance(parsed, str):
+            raise ValueError(parsed)
+        return parsed
+
+    def cron_folder(self, parts: Tuple[str, ...]):
+        """
+        Raises ValueError when the folders of a cron job hold an at or within folder, the expression alone is its
+        schedule
+        """
+        for part in parts[1:]:
+            if self.AT.match(part) or self.WITHIN.match(part):
+                raise ValueError(f'Cron jobs are scheduled by their expression, the `{part}` folder does not apply')
+
+    def _parse_folder(self, parts: Tuple[str, ...]) -> Interval:
+        interval = self._parse_every(parts[0])
+
+        if len(parts) >= 2:
+            interval.at(self._parse_at(parts[1]))
+        if len(parts) == 3:
+            self._parse_within(interval, parts[2])
+
+        return interval
+
+    def _parse_every(self, every_parameter: str) -> Interval:
+        matches = self.EVERY.match(every_parameter)
+        if not matches:
+            raise ValueError(f'Unable to correctly parse the `every` parameter ({every_parameter}) of the folder structure')
+
+        every = int(matches.group('every'))
+        if every == 0:
+            raise ValueError(f'The `every` parameter ({every_parameter}) must be at least 1')
+
+        return self.EVERY_UNITS[matches.group('time_interval')](every)
+
+    def _parse_at(self, at_parameter: str) -> str:
+        matches = self.AT.match(at_parameter)
+        if not matches:
+            raise ValueError(f'Unable to correctly parse the `at` parameter ({at_parameter}) of the folder structure')
+
+        return matches['at']
+
+    def _parse_within(self, interval: Interval, within_parameter: str):
+        matches = self.WITHIN.match(within_parameter)
+        if not matches:
+            raise ValueError(f'Unable to correctly parse the `within` parameter ({within_parameter}) of the folder '
+                             f'structure')
+
+        window = timedelta(hours=int(matches['hours']), minutes=int(matches['minutes']))
+        try:
+            interval.within(window)
+        except ValueError as excp:
+            raise ValueError(f'Invalid `within` parameter ({within_parameter}): {excp}')
+
+
+interval_parser = IntervalParser()
@@ -0,0 +1,29 @@
+from datetime import datetime, timedelta
+from typing import Dict
+
+from pycron import clock
+from pycron.interval.interval import Interval
+
+
+class Seconds(Interval):
+    """
+    Runs every x seconds, e.g. a `15sec` folder
+
+    Slots are multiples of the interval since the epoch, so they do not drift with how long runs take. The executor
+    runs these jobs from its SecondTimer on the monotonic clock rather than from the once a second store scan.
+    """
+    __slots__ = ()
+
+    timer_driven = True
+
+    def _at(self, at: str) -> Dict:
+        return {}
+
+    def time_delta(self) -> timedelta:
+        return timedelta(seconds=self.every)
+
+    def next_time(self, last_run=None):
+        if last_run is None:
+            last_run = clock.now()
+
+        return datetime.fromtimestamp((last_run.timestamp() // self.every + 1) * self.every)
@@ -6,6 +6,7 @@ from pycron.interval.interval import Interval
 
 
 class Weeks(Days):
+    __slots__ = ()
 
     def time_delta(self) -> timedelta:
         return timedelta(weeks=self.every)
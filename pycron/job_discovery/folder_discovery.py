@@ -1,11 +1,17 @@
 import datetime
+from contextlib import nullcontext
 from pathlib import Path
-from typing import List
+from typing import List, Tuple
 
 from pycron import settings
+from pycron.interval.cron import Cron
 from pycron.interval.minutes import Minutes
-from pycron.jobs.jobs import InvalidJobException
+from pycron.jobs.dependencies import DependencyGraph
+from pycron.jobs.jobs import InvalidJobException, Job
+from pycron.jobs.metadata import MetadataCache, metadata_cache
 from pycron.persistance.pickle_persistence import MemStore
+from pycron.sharding.hash_ring import shard_key
+from pycron.tracing import tracer
 
 
 # from pycron.settings import LOG, CHECK_FOR_NEW_JOBS_EVERY
@@ -18,15 +24,21 @@ class JobFolderScanner:
     Purpose: Scan for jobs and determine how often they need to run
 
     Checks persistant store to see if the job already exists in the store.
+
+    The jobs folder is read without the store lock, the changes are applied to the store while holding it.
     """
 
-    def __init__(self, store: MemStore):
+    def __init__(self, store: MemStore, store_lock=None):
         self.job_folder: Path = settings.JOBS_FOLDER
         self.store = store
+        self.store_lock = store_lock or nullcontext()
 
         self.last_check = None
         self.check_interval = Minutes(every=settings.CHECK_FOR_NEW_JOBS_EVERY)
 
+        # Set from other threads to run discovery on the next call to run_discovery
+        self.discovery_requested = False
+
     def scan_folder(self):
         """
         Get all folders in scripts directory
@@ -34,50 +46,131 @@ class JobFolderScanner:
         """
         files = []
         dirs = []
-        for item in self.job_folder.glob('**'):
+        for root in settings.JOB_ROOTS.values():
+            if not root.is_dir():
+                settings.LOG.warning(f'Job root {root} is not a directory, skipping it')
+                continue
 
-            if item.is_dir():
-                dirs.append(item)
-            elif item.is_file():
-                files.append(item)
-            else:
-                settings.LOG.warning(f'Unclassified item: {item}')
+            for item in root.glob('**'):
+
+                if item.is_dir():
+                    dirs.append(item)
+                elif item.is_file():
+                    files.append(item)
+                else:
+                    settings.LOG.warning(f'Unclassified item: {item}')
 
         return files, dirs
 
+    # Files next to scripts that describe them, never scheduled themselves
+    SIDECAR_SUFFIXES = (DependencyGraph.SUFFIX, Cron.SUFFIX, MetadataCache.SUFFIX)
+
     def _collect_all_scripts(self) -> List[Path]:
         """
         Get all scripts and return them
+
+        Hidden files and folders (editor swap files, .git, ...) and sidecar files are skipped
         :return: []
         """
         files, folders = self.scan_folder()
-        for dir in folders:
+        # A job root nested in another is scanned by both
+        for dir in dict.fromkeys(folders):
             for file in dir.iterdir():
-                if file.is_file():
+                if file.is_file() and self.is_script(file):
                     files.append(file)
 
         return files
 
+    def is_script(self, path: Path) -> bool:
+        if path.name.endswith(self.SIDECAR_SUFFIXES):
+            return False
+
+        return not any(part.startswith('.') for part in settings.relative_name(path).parts)
+
+    def parse_jobs(self) -> Tuple[List[Job], List[InvalidJobException]]:
+        """
+        Parse every script in the jobs folder without touching the store
+
+        Used by the management commands, returns the valid jobs and the reasons the other scripts were rejected
+        """
+        jobs, invalid = [], []
+        with metadata_cache.discovery_pass():
+            for path in self._collect_all_scripts():
+                try:
+                    jobs.append(Job(path))
+                except InvalidJobException as invalid_job_excp:
+                    invalid.append(invalid_job_excp)
+
+        return jobs, invalid
+
+    def _owned_scripts(self, all_scripts: List[Path], dependencies: DependencyGraph) -> List[Path]:
+        """
+        When sharded only the scripts this shard owns on the hash ring are scheduled here
+
+        The jobs of a pipeline are placed on the ring by its first script, so they all land on the same shard.
+        """
+        if not settings.sharded:
+            return all_scripts
+
+        ring, departed_shards = settings.SHARD_MEMBERSHIP.refresh()
+
+        def owns(path: Path) -> bool:
+            return ring.owns(settings.SHARD_ID, shard_key(dependencies.pipeline_root(path)))
+
+        # Pick up where the shards that left the ring stopped instead of starting their jobs afresh
+        for shard_id in departed_shards:
+            shard_file = settings.shard_file(settings.SHARDED_PERSISTENCE_FILE, shard_id)
+            self.store.adopt_jobs(shard_file, owns)
+
+        return [path for path in all_scripts if owns(path)]
+
     def _check_for_jobs(self):
 
         settings.LOG.info(f'Checking for jobs changes...')
         all_scripts = self._collect_all_scripts()
-        for path in all_scripts:
-            try:
-                # Create record of job in store
-                self.store.fetch(path)
-            except InvalidJobException as invalid_job_excp:
-                settings.LOG.warning(f'Invalid Script {invalid_job_excp.args[0]}, reason: {invalid_job_excp.args[1]}')
 
-        # Purge old jobs that no longer exist
-        self.store.check_for_non_existent_job(all_scripts)
+        dependencies = DependencyGraph.from_scripts(all_scripts)
+        for problem in dependencies.problems:
+            settings.LOG.warning(f'Held back {problem.args[0]}, reason: {problem.args[1]}')
+
+        with self.store_lock:
+            self.store.dependencies = dependencies
 
-    def run_discovery(self):
+            all_scripts = self._owned_scripts(all_scripts, dependencies)
+            with metadata_cache.discovery_pass():
+                for path in all_scripts:
+                    try:
+                        # Create record of job in store
+                        self.store.fetch(path)
+                    except InvalidJobException as invalid_job_excp:
+                        settings.LOG.warning(f'Invalid Script {invalid_job_excp.args[0]}, reason: '
+                                             f'{invalid_job_excp.args[1]}')
+
+            # Purge old jobs that no longer exist
+            self.store.check_for_non_existent_job(all_scripts)
+
+            # With the runs recorded since the last check, replan when jobs with a tolerance window start
+            self.store.plan_windows()
+
+    def run_discovery(self) -> bool:
         """
         Callable in a loop and will only run check_for_jobs if it is expected
+
+        Returns whether the jobs folder was checked
         """
         now = datetime.datetime.now()
 
-        if now > self.check_interval.next_time(self.last_check) or self.last_check is None:
-            self._check_for_jobs()
+        rebalanced = settings.sharded and settings.SHARD_MEMBERSHIP.changed()
+        forced = rebalanced or self.discovery_requested
+
+        if self.last_check is None or now > self.check_interval.next_time(self.last_check) or forced:
+            self.discovery_requested = False
+            with tracer.span('discovery', tracer.enabled, forced=forced):
+                self._check_for_jobs()
             self.last_check = now
+            return True
+
+        return False
+
+    def request_discovery(self):
+        self.discovery_requested = True
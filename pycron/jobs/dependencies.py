@@ -0,0 +1,143 @@
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+
+from pycron import settings
+from pycron.jobs.jobs import InvalidJobException
+
+
+class DependencyGraph:
+    """
+    Dependencies between jobs, declared in a `<script>.deps` sidecar next to the script
+
+    Each line of the sidecar names an upstream job. A bare file name refers to a script in the same folder, anything
+    with a `/` is relative to the jobs folder, `@<root>/...` to another job root. Blank lines and lines starting with
+    `#` are ignored.
+
+        1day/at0200/extract.sh
+        1day/at0200/transform.sh
+        1day/at0200/transform.sh.deps   ->  extract.sh
+        1day/at0200/load.sh
+        1day/at0200/load.sh.deps        ->  transform.sh
+
+    A job with dependencies ignores the interval of its folder, it runs once every one of its upstream jobs succeeded
+    since its own last run. Jobs that depend on a missing script or are part of a cycle are held and never run.
+    """
+
+    SUFFIX = '.deps'
+
+    def __init__(self):
+        # downstream script -> the scripts it waits for
+        self.upstream: Dict[Path, Tuple[Path, ...]] = {}
+        # upstream script -> the scripts waiting for it
+        self.downstream: Dict[Path, List[Path]] = {}
+
+        # script -> first script of its pipeline
+        self.roots: Dict[Path, Path] = {}
+
+        self.held: Set[Path] = set()
+        self.problems: List[InvalidJobException] = []
+
+    @classmethod
+    def sidecar(cls, script: Path) -> Path:
+        return script.with_name(script.name + cls.SUFFIX)
+
+    @classmethod
+    def from_scripts(cls, scripts: List[Path]) -> 'DependencyGraph':
+        graph = cls()
+        known = set(scripts)
+
+        for script in scripts:
+            sidecar = cls.sidecar(script)
+            if not sidecar.is_file():
+                continue
+
+            upstream = cls._read_sidecar(script, sidecar)
+            graph.upstream[script] = upstream
+            for upstream_script in upstream:
+                graph.downstream.setdefault(upstream_script, []).append(script)
+
+            missing = [str(settings.relative_name(upstream_script))
+                       for upstream_script in upstream if upstream_script not in known]
+            if missing:
+                graph._hold(script, f'Depends on jobs that do not exist: {", ".join(missing)}')
+
+        for script in graph._cycles():
+            graph._hold(script, 'Depends on itself through a dependency cycle')
+
+        graph._find_roots()
+
+        return graph
+
+    @staticmethod
+    def _read_sidecar(script: Path, sidecar: Path) -> Tuple[Path, ...]:
+        upstream = []
+        for line in sidecar.read_text().splitlines():
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+
+            upstream.append(settings.script_path(line) if '/' in line else script.parent / line)
+
+        return tuple(upstream)
+
+    def _hold(self, script: Path, reason: str):
+        self.held.add(script)
+        self.problems.append(InvalidJobException(script, reason))
+
+    def _cycles(self) -> Set[Path]:
+        """
+        Every script that is part of a cycle, found with an iterative depth first search
+        """
+        visiting, done = 1, 2
+        state: Dict[Path, int] = {}
+        in_cycle = set()
+
+        for start in self.upstream:
+            if start in state:
+                continue
+
+            state[start] = visiting
+            path = [start]
+            stack = [iter(self.upstream.get(start, ()))]
+            while stack:
+                upstream_script = next(stack[-1], None)
+                if upstream_script is None:
+                    state[path.pop()] = done
+                    stack.pop()
+                elif state.get(upstream_script) == visiting:
+                    in_cycle.update(path[path.index(upstream_script):])
+                elif upstream_script not in state:
+                    state[upstream_script] = visiting
+                    path.append(upstream_script)
+                    stack.append(iter(self.upstream.get(upstream_script, ())))
+
+        return in_cycle
+
+    def has_dependencies(self, script: Path) -> bool:
+        return script in self.upstream
+
+    def pipeline_root(self, script: Path) -> Path:
+        """
+        The first script, by name, of the jobs connected to this one through dependencies
+
+        Used as the sharding key so a whole pipeline is scheduled by the same shard.
+        """
+        return self.roots.get(script, script)
+
+    def _find_roots(self):
+        for script in (*self.upstream, *self.downstream):
+            if script in self.roots:
+                continue
+
+            pipeline = {script}
+            pending = [script]
+            while pending:
+                current = pending.pop()
+                for neighbour in (*self.upstream.get(current, ()), *self.downstream.get(current, ())):
+                    if neighbour not in pipeline:
+                        pipeline.add(neighbour)
+                        pending.append(neighbour)
+
+            root = min(pipeline)
+            for member in pipeline:
+                self.roots[member] = root
@@ -0,0 +1,74 @@
+import heapq
+from collections import Counter
+from itertools import groupby
+from typing import Dict, List
+
+from pycron import settings
+from pycron.jobs.jobs import Job
+
+
+def shares_limited() -> bool:
+    """
+    Whether MAX_RUNNING_JOBS or the max running jobs of a job root can hold due jobs back
+    """
+    return bool(settings.MAX_RUNNING_JOBS) or any(max_running for _, max_running in settings.ROOT_SHARES.values())
+
+
+def fair_share(jobs: List[Job], running: Counter) -> List[Job]:
+    """
+    The due jobs that may start now, given the running jobs per job root
+
+    A root never runs more than its own max running jobs. When MAX_RUNNING_JOBS leaves fewer free slots than there are
+    due jobs, the slots go one at a time to the root with the fewest running jobs for its weight: a root with a burst
+    of due jobs gets its share while the other roots have work, and the rest when they do not. Jobs of a root keep
+    their order, the ones left out stay due for a later tick.
+
+    Slots are shared out one priority class at a time: critical jobs of any root are admitted before the high ones.
+    """
+    if not shares_limited():
+        return jobs
+
+    running = Counter(running)
+    free = settings.MAX_RUNNING_JOBS - sum(running.values()) if settings.MAX_RUNNING_JOBS else len(jobs)
+
+    # Every priority class gets its pick of the free slots before the next one, the jobs come ordered by class
+    admitted = []
+    for _, class_jobs in groupby(jobs, key=lambda job: job.priority_rank):
+        class_admitted = _share(list(class_jobs), running, free)
+        admitted.extend(class_admitted)
+        free -= len(class_admitted)
+
+    return admitted
+
+
+def _share(jobs: List[Job], running: Counter, free: int) -> List[Job]:
+    """
+    The jobs of one priority class that get the free slots, counts the admitted ones in running
+    """
+    shares = settings.ROOT_SHARES
+
+    by_root: Dict[str, List[Job]] = {}
+    for job in jobs:
+        by_root.setdefault(job.root, []).append(job)
+
+    # (running jobs per unit of weight, root), the root furthest below its share first
+    queue = [(running[root] / shares.get(root, (1, 0))[0], root) for root in by_root]
+    heapq.heapify(queue)
+    taken = dict.fromkeys(by_root, 0)
+
+    admitted = []
+    while queue and free > 0:
+        _, root = heapq.heappop(queue)
+        weight, max_running = shares.get(root, (1, 0))
+        if max_running and running[root] >= max_running:
+            continue
+
+        admitted.append(by_root[root][taken[root]])
+        taken[root] += 1
+        running[root] += 1
+        free -= 1
+
+        if taken[root] < len(by_root[root]):
+            heapq.heappush(queue, (running[root] / weight, root))
+
+    return admitted
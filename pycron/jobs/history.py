@@ -0,0 +1,122 @@
+from array import array
+from datetime import datetime
+from math import ceil
+from typing import Iterable, Iterator, Optional, Tuple
+
+
+class RunHistory:
+    """
+    Fixed size ring buffer of a job's most recent runs
+
+    Each run is stored as start, end and lag (seconds since the epoch / seconds) plus the exit code, in parallel arrays
+    so a history costs a few bytes per run. Appending overwrites the oldest run once the buffer is full.
+
+    Appending is constant time, it runs for every recorded run with the store lock held. The duration percentiles are
+    only computed when read, by the export, the window planner or the simulator, and kept until the next append.
+    """
+
+    __slots__ = ('capacity', 'starts', 'ends', 'lags', 'exit_codes', 'head', 'count', 'percentiles')
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+
+        # Grown up to capacity rather than preallocated, most jobs in a large store only ever run a few times
+        self.starts = array('d')
+        self.ends = array('d')
+        self.lags = array('d')
+        self.exit_codes = array('i')
+
+        # Index the next run is written to, and number of runs stored
+        self.head = 0
+        self.count = 0
+
+        # (p50, p95) of the durations in seconds, None until read after the last append
+        self.percentiles = None
+
+    def append(self, start: datetime, end: datetime, exit_code: int, lag: float):
+        index = self.head
+        if self.count < self.capacity:
+            self.starts.append(start.timestamp())
+            self.ends.append(end.timestamp())
+            self.lags.append(lag)
+            self.exit_codes.append(exit_code)
+        else:
+            self.starts[index] = start.timestamp()
+            self.ends[index] = end.timestamp()
+            self.lags[index] = lag
+            self.exit_codes[index] = exit_code
+
+        self.head = (index + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+        self.percentiles = None
+
+    def _duration_percentiles(self) -> Tuple[float, float]:
+        percentiles = self.percentiles
+        if percentiles is None:
+            durations = sorted(self.ends[i] - self.starts[i] for i in range(self.count))
+            percentiles = self.percentiles = (self._percentile(durations, 50), self._percentile(durations, 95))
+        return percentiles
+
+    @property
+    def p50(self) -> Optional[float]:
+        """
+        Median duration in seconds, None until there is a run
+        """
+        return self._duration_percentiles()[0] if self.count else None
+
+    @property
+    def p95(self) -> Optional[float]:
+        return self._duration_percentiles()[1] if self.count else None
+
+    @staticmethod
+    def _percentile(ordered, percent: int) -> float:
+        """
+        Nearest rank percentile of an already sorted sequence
+        """
+        rank = max(ceil(percent / 100 * len(ordered)), 1)
+        return ordered[rank - 1]
+
+    def runs(self) -> Iterator[Tuple[datetime, datetime, int, float]]:
+        """
+        Oldest to newest (start, end, exit code, lag in seconds)
+        """
+        first = (self.head - self.count) % self.capacity
+        for offset in range(self.count):
+            index = (first + offset) % self.capacity
+            yield (datetime.fromtimestamp(self.starts[index]), datetime.fromtimestamp(self.ends[index]),
+                   self.exit_codes[index], self.lags[index])
+
+    def __len__(self):
+        return self.count
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        # Histories written before the percentiles were computed lazily hold p50 and p95 values, they are recomputed
+        for name in self.__slots__:
+            setattr(self, name, state.get(name))
+
+
+HISTORY_FIELDS = ['file', 'start', 'end', 'duration_seconds', 'exit_code', 'lag_seconds']
+
+
+def history_rows(jobs: Iterable) -> Iterator[dict]:
+    """
+    One row per recorded run of every job, generated lazily so exports of large stores stream
+    """
+    for job in jobs:
+        if job.history is None:
+            continue
+
+        file = str(job.relative_name)
+        for start, end, exit_code, lag in job.history.runs():
+            yield {
+                'file': file,
+                'start': start.isoformat(),
+                'end': end.isoformat(),
+                'duration_seconds': round((end - start).total_seconds(), 3),
+                'exit_code': exit_code,
+                'lag_seconds': round(lag, 3),
+            }
@@ -1,15 +1,18 @@
-import re
 from datetime import datetime, timedelta
 from enum import Enum
 from pathlib import Path
 from uuid import uuid4
 
-from pycron import settings
-from pycron.interval.days import Days
-from pycron.interval.hours import Hours
+from pycron import clock, settings
+from pycron.settings import DEFAULT_ROOT, ROOT_PREFIX
+from pycron.interval.cron import Cron
 from pycron.interval.interval import Interval
-from pycron.interval.minutes import Minutes
-from pycron.interval.weeks import Weeks
+from pycron.interval.parser import interval_parser
+from pycron.jobs.history import RunHistory
+from pycron.jobs.metadata import JobMetadata, NO_METADATA, metadata_cache
+from pycron.jobs.priority import DEFAULT_PRIORITY, PRIORITY_RANKS
+from pycron.jobs.retry import RetryPolicy
+from pycron.jobs.usage import ResourceUsage
 
 
 # from pycron.settings import RELATIVE_JOB_FOLDER, JOB_FAIL_TIMEOUT_PERIOD_MINUTES
@@ -38,12 +41,15 @@ class Job:
                             than a scheduled run. This re-run will be according to JOB_FAIL_TIMEOUT_PERIOD_MINUTES
 
     Acceptable every folders:
+        cron    -> runs on the cron expression in the `<script>.cron` sidecar file
+        sec     -> runs every x seconds
         min     -> runs every x minutes
         hour    -> runs every x hours
         day     -> runs every x days
         week    -> runs every x weeks
 
     Acceptable at folders:
+        sec     -> no at parameters
         min     -> no at parameters
         hour    |
                 |-> at00<xx> for running at xx minutes every hour
@@ -52,6 +58,9 @@ class Job:
         week    |
                 |-> at<yy><xx> for running on yy hour at xx minutes every week
 
+    Acceptable within folders, below an at folder:
+        within<yy><xx>  -> the job may start up to yy hours and xx minutes after its slot, WindowPlanner picks when
+
     Example:
         jobs_root
             |-> 1min
@@ -65,23 +74,43 @@ class Job:
             |-> 1week
                     |-> at0015
                             |-> run_weekly_at_quarter_past.sh
+            |-> 1day
+                    |-> at0200
+                            |-> within0300
+                                    |-> run_nightly_between_2_and_5.sh
 
 
     """
 
+    # Stores hold one Job per script, keep them free of a per instance __dict__
+    __slots__ = ('script_path', 'relative_name', 'job_uuid', 'interval', 'last_execution', 'last_success',
+                 'last_failed_execution', 'run_reason', 'failed_attempts', 'locked', 'locked_at', 'unlocked_at', 'run_uuid', 'pid', 'paused',
+                 'start_lag', 'history', 'usage', 'window_offset', 'metadata')
+
+    # Values for attributes missing from stores written by older versions
+    STATE_DEFAULTS = {
+        'run_reason': JobRunReasons.ROUTINE,
+        'failed_attempts': 0,
+        'locked': False,
+        'paused': False,
+        'metadata': NO_METADATA,
+    }
+
     def __init__(self, script_path: Path):
         # Absolute path to script
         self.script_path = script_path
-        # Truncated path relative to job folder
-        self.relative_name = script_path.relative_to(settings.JOBS_FOLDER)
+        # Truncated path relative to job folder, prefixed with @<root> for the jobs of extra job roots
+        self.relative_name = settings.relative_name(script_path)
 
         self.job_uuid = uuid4()
 
         # Interval for the job to be run
         self.interval: Interval = None
 
-        # Stores the last successful time the job ran
-        self.last_execution = datetime.now()
+        # Stores the last successful time the job ran, the discovery time until it first ran
+        self.last_execution = clock.now()
+        # When the job last succeeded, None until it has. Downstream jobs wait for it, see MemStore.dependencies_met
+        self.last_success = None
 
         #  Stores the last failed time this job ran
         self.last_failed_execution = None
@@ -89,6 +118,9 @@ class Job:
         # Parse the relative name and assign the correct interval
         self._parse_script_folder_structure()
 
+        # Timeout, concurrency cap, environment and working directory from the sidecar INI files, see JobMetadata
+        self.metadata: JobMetadata = self._load_metadata()
+
         # Reason the job is going to run
         self.run_reason: JobRunReasons = JobRunReasons.ROUTINE
 
@@ -100,117 +132,169 @@ class Job:
         self.locked_at = None
         self.unlocked_at = None
 
+        # Identifies the current run and the process executing it. Persisted so a restarted daemon can re-adopt it.
+        self.run_uuid = None
+        self.pid = None
+
+        # Paused jobs are skipped by the scheduler until resumed through the control socket
+        self.paused = False
+
+        # Seconds between when the current run was due and when it started
+        self.start_lag = None
+        # Most recent runs, created on the first run
+        self.history: RunHistory = None
+        # Resources used by all runs so far, created on the first run with a known usage
+        self.usage: ResourceUsage = None
+
+        # Seconds after its slot the job starts, planned by the store for jobs in a within folder
+        self.window_offset = None
+
     @property
     def next_execution(self) -> datetime:
         """
         Returns the next datetime the function needs to be executed.
 
-        Takes into account the offset if a job incorrectly runs.
+        Takes into account the offset if a job incorrectly runs, see RetryPolicy.
         :return: datetime
         """
         if self.failed_attempts > 0:
-            return self.last_failed_execution + timedelta(minutes=settings.JOB_FAIL_TIMEOUT_PERIOD_MINUTES)
+            if RetryPolicy.retrying(self.failed_attempts):
+                return self.last_failed_execution + RetryPolicy.delay(self.failed_attempts, self.job_uuid.int)
 
-        return self.interval.next_time(self.last_execution)
-
-    def _parse_script_folder_structure(self):
-        """
-        Calculates the required interval based on the relative path of the job
-        """
-
-        parent_parts = self.relative_name.parent.parts
-
-        # invalidate scripts in root folder
-        if not parent_parts:
-            raise InvalidJobException(self.script_path,
-                                      f'Script is in the root scripts folder with no definition of how often to run.')
+            # Out of retries or parked, try again on the normal interval but never sooner than the longest retry delay
+            slot = self.interval.next_time(self.last_failed_execution)
+            earliest = self.last_failed_execution.replace(second=0, microsecond=0) + RetryPolicy.probe_delay()
+            return self._planned(max(slot, earliest))
 
-        # Calculate the every part of the interval
-        every_parameter = parent_parts[0]
-        self.interval = self._parse_every_parameter(every_parameter)
+        return self._planned(self.interval.next_time(self.last_execution))
 
-        # Calculate the at part of the interval
-        if len(parent_parts) == 2:
-            at_parameter = parent_parts[1]
+    def _planned(self, slot: datetime) -> datetime:
+        if self.window_offset:
+            return slot + timedelta(seconds=self.window_offset)
+        return slot
 
-            self._parse_at_parameter(at_parameter)
+    @property
+    def root(self) -> str:
+        """
+        Name of the job root the script is in, see JOB_ROOTS
+        """
+        first = self.relative_name.parts[0]
+        return first[1:] if first.startswith(ROOT_PREFIX) else DEFAULT_ROOT
 
-    def _parse_every_parameter(self, every_parameter: str) -> Interval:
+    @property
+    def priority(self) -> str:
+        """
+        Priority class of the job, see PRIORITIES
         """
-        Calculates the every_parameter of the interval.
+        return self.metadata.priority or DEFAULT_PRIORITY
 
-        JobFolder
-            |-> 1hour
-                    |-> at0030
-                            |-> helloworld.sh
+    @property
+    def priority_rank(self) -> int:
+        """
+        0 for the most urgent class, due jobs are ordered and admitted by it
+        """
+        return PRIORITY_RANKS[self.priority]
 
-        The above structure would produce an interval of every 1 hour at half past
+    @property
+    def parked(self) -> bool:
+        """
+        Failed often enough in a row to trip the circuit breaker
+        """
+        return RetryPolicy.parked(self.failed_attempts)
 
+    def reset_failures(self):
+        """
+        Forget the failures of a job, closing its circuit breaker. It then runs as if its last run succeeded.
         """
-        valid_every_parameter_map = {
-            'min': Minutes,
-            'hour': Hours,
-            'day': Days,
-            'week': Weeks
-        }
-        every_parameter_string = '|'.join(valid_every_parameter_map.keys())
+        self.failed_attempts = 0
+        self.run_reason = JobRunReasons.ROUTINE
 
-        #                    captures every               captures timeinterval      ensures string ends
-        regex_match = rf'(?P<every>[0-9]+)(?P<time_interval>{every_parameter_string})\Z'
+    def _parse_script_folder_structure(self):
+        """
+        Calculates the required interval based on the relative path of the job, see IntervalParser
+        """
 
-        matches = re.match(regex_match, every_parameter)
+        parent_parts = self.relative_name.parent.parts
+        if self.root != DEFAULT_ROOT:
+            parent_parts = parent_parts[1:]
 
-        if not matches:
+        # invalidate scripts in root folder
+        if not parent_parts:
             raise InvalidJobException(self.script_path,
-                                      f'Unable to correctly parse the `every` parameter ({every_parameter}) of the folder structure')
-
-        every = int(matches.group('every'))
-        time_interval = matches.group('time_interval')
+                                      f'Script is in the root scripts folder with no definition of how often to run.')
 
-        interval_obj = valid_every_parameter_map[time_interval](every)
+        if parent_parts[0] == Cron.FOLDER:
+            try:
+                interval_parser.cron_folder(parent_parts)
+            except ValueError as excp:
+                raise InvalidJobException(self.script_path, str(excp))
+            self.interval = self._parse_cron_sidecar()
+            return
 
-        return interval_obj
+        try:
+            self.interval = interval_parser.folder(parent_parts)
+        except ValueError as excp:
+            raise InvalidJobException(self.script_path, str(excp))
 
-    def _parse_at_parameter(self, at_parameter: str):
+    def _parse_cron_sidecar(self) -> Cron:
         """
-        Calculates the at_parameter of the interval.
+        Reads the interval of a job in the cron folder from the `<script>.cron` file next to it
 
         JobFolder
-            |-> 1hour
-                    |-> at0030
-                            |-> helloworld.sh
-
-        The above structure would produce an interval of every 1 hour at half past
+            |-> cron
+                    |-> report.sh
+                    |-> report.sh.cron      (30 6,18 * * mon-fri)
 
+        Any folders below `cron` only organise the jobs, they do not change the interval
         """
-        regex_match = rf'at(?P<at>[0-2][0-9][0-5][0-9])\Z'
-
-        matches = re.match(regex_match, at_parameter)
-
-        if not matches:
-            raise InvalidJobException(self.script_path,
-                                      f'Unable to correctly parse the `at` parameter ({at_parameter}) of the folder structure')
-
-        at_str = matches['at']
+        sidecar = self.script_path.with_name(self.script_path.name + Cron.SUFFIX)
+        try:
+            lines = [line.strip() for line in sidecar.read_text().splitlines()]
+        except FileNotFoundError:
+            raise InvalidJobException(self.script_path, f'Job in the cron folder has no {sidecar.name} file')
+
+        expressions = [line for line in lines if line and not line.startswith('#')]
+        if len(expressions) != 1:
+            raise InvalidJobException(self.script_path, f'{sidecar.name} must hold exactly one cron expression')
+
+        try:
+            return interval_parser.cron(expressions[0])
+        except ValueError as excp:
+            raise InvalidJobException(self.script_path, f'Unable to parse {sidecar.name}: {excp}')
+
+    def _load_metadata(self) -> JobMetadata:
+        try:
+            return metadata_cache.resolve(self.script_path)
+        except ValueError as excp:
+            raise InvalidJobException(self.script_path, str(excp))
+
+    def reload_schedule(self):
+        """
+        Sidecars, the cron schedule and the INI metadata, can change while the job is stored
+        """
+        if isinstance(self.interval, Cron):
+            interval = self._parse_cron_sidecar()
+            if interval != self.interval:
+                self.interval = interval
 
-        self.interval.at(at_str)
+        self.metadata = self._load_metadata()
 
-    def success(self):
+    def success(self, finished_at: datetime = None):
         """
         Job ran successfully - Set it up for the next scheduled run
 
         Provides a hook for subclasses to implement the correct running acknowledgement
 
-        Sets the last_execution to current datetime
+        Sets the last_execution to current datetime, or to when the run finished if that is known
         Sets failed_attempts to 0
         Sets run_reason the routine scheduled reason
         """
-        self.last_execution = datetime.now()
+        self.last_execution = self.last_success = finished_at or clock.now()
         self.failed_attempts = 0
         self.run_reason = JobRunReasons.ROUTINE
-        self.unlock()
+        self.unlock(finished_at)
 
-    def fail(self):
+    def fail(self, finished_at: datetime = None):
         """
         Job did not run successfully - Sets up the job to run after a timeout period
 
@@ -220,20 +304,31 @@ class Job:
         Sets run_reason to indicate the job failed to run successfully
         """
         self.failed_attempts += 1
-        self.last_failed_execution = datetime.now()
+        self.last_failed_execution = finished_at or clock.now()
         self.run_reason = JobRunReasons.JOB_FAILED
-        self.unlock()
+        self.unlock(finished_at)
 
-    def lock(self):
+    def lock(self, due: datetime = None):
         """
         Signal that the job is targeted by a thread and not to spawn a new thread to run it.
 
-        This should be called by the executor
+        This should be called by the executor, with the time the run was due to record how late it started
         """
         self.locked = True
-        self.locked_at = datetime.now()
+        self.locked_at = clock.now()
+        self.start_lag = max((self.locked_at - due).total_seconds(), 0) if due else 0
+        self.run_uuid = uuid4()
+        self.pid = None
+
+    def mark_started(self, started: datetime):
+        """
+        A job run in a batch starts once the jobs before it finished, not when the batch was admitted, and a job run by
+        a worker agent once the agent received it
+        """
+        self.start_lag = (self.start_lag or 0) + (started - self.locked_at).total_seconds()
+        self.locked_at = started
 
-    def unlock(self):
+    def unlock(self, finished_at: datetime = None):
         """
         Release lock signaling the job is runnable again.
 
@@ -241,7 +336,23 @@ class Job:
         :return:
         """
         self.locked = False
-        self.unlocked_at = datetime.now()
+        self.unlocked_at = finished_at or clock.now()
+        self.pid = None
+
+    def record_run(self, exit_code: int):
+        """
+        Add the run that just finished to the job's history. Called by the store once the job is unlocked.
+        """
+        if self.history is None:
+            self.history = RunHistory(settings.RUN_HISTORY_LENGTH)
+
+        self.history.append(self.locked_at, self.unlocked_at, exit_code, self.start_lag or 0)
+
+    def record_usage(self, usage: dict):
+        if self.usage is None:
+            self.usage = ResourceUsage()
+
+        self.usage.add(usage)
 
     @property
     def runtime(self):
@@ -249,9 +360,17 @@ class Job:
 
         runtime: timedelta = self.unlocked_at - self.locked_at
 
-        secs = runtime.seconds
+        secs = int(runtime.total_seconds())
+
+        return f'{secs // 3600} hours, {secs % 3600 // 60} minutes, {secs % 60} seconds'
+
+    def __getstate__(self):
+        return {name: getattr(self, name, None) for name in self.__slots__}
 
-        return f'{secs // 3600} hours, {secs // 60} minutes, {secs % 60} seconds'
+    def __setstate__(self, state):
+        # Pickles written before __slots__ hold the instance __dict__, which may predate some attributes
+        for name in self.__slots__:
+            setattr(self, name, state.get(name, self.STATE_DEFAULTS.get(name)))
 
     def __str__(self):
         return str(self.relative_name)
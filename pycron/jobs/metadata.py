@@ -0,0 +1,228 @@
+import os
+from configparser import ConfigParser, Error as ConfigError
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+from pycron import settings
+from pycron.jobs.priority import PRIORITIES
+
+
+class JobMetadata:
+    """
+    What the sidecar INI files above and next to a script declare about it
+
+        job_folder/.pycron.ini                  ->  every job of the job root
+        job_folder/1day/.pycron.ini             ->  every job in 1day and below
+        job_folder/1day/at0200/backup.sh.ini    ->  backup.sh only
+
+    Files closer to the script override the keys of the files above them, environment variables are merged.
+
+        [job]
+        timeout = 600               ; seconds, the run is terminated after
+        max_concurrency = 2         ; folder files only, jobs below the folder running at once
+        working_directory = /srv    ; defaults to the daemon's own
+        priority = critical         ; critical, high, normal (default) or low
+
+        [environment]
+        BACKUP_TARGET = /mnt/backup
+
+    Instances are shared by every job with the same sidecars and must not be changed.
+    """
+
+    __slots__ = ('timeout', 'max_concurrency', 'concurrency_group', 'environment', 'working_directory', 'priority')
+
+    # The only keys of the [job] section
+    KEYS = ('timeout', 'max_concurrency', 'working_directory', 'priority')
+
+    def __init__(self, timeout: float = None, max_concurrency: int = None, concurrency_group: Path = None,
+                 environment: Dict[str, str] = None, working_directory: Path = None, priority: str = None):
+        self.timeout = timeout
+        # Cap on the running jobs below concurrency_group, the folder relative to the jobs folder that declared it
+        self.max_concurrency = max_concurrency
+        self.concurrency_group = concurrency_group
+        self.environment = environment or {}
+        self.working_directory = working_directory
+        # One of PRIORITIES, None for the default
+        self.priority = priority
+
+    @property
+    def isolated(self) -> bool:
+        """
+        Whether the job needs a process of its own, rather than a place in a batch shell
+        """
+        return self.timeout is not None or bool(self.environment) or self.working_directory is not None
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        for name in self.__slots__:
+            setattr(self, name, state.get(name))
+        self.environment = self.environment or {}
+
+    def __eq__(self, other):
+        return isinstance(other, JobMetadata) and self.__getstate__() == other.__getstate__()
+
+    def __repr__(self):
+        declared = {name: value for name, value in self.__getstate__().items() if value}
+        return f'JobMetadata({declared})'
+
+
+# Jobs without any sidecar share this one
+NO_METADATA = JobMetadata()
+
+
+class MetadataCache:
+    """
+    Reads the sidecar INI files of the jobs folder, each only again once its modification time changed
+
+    Within a discovery pass every file is looked at once however many jobs share it, and jobs with the same sidecars
+    share one JobMetadata. Between passes nothing touches the filesystem, jobs hold the resolved JobMetadata.
+    """
+
+    FOLDER_FILE = '.pycron.ini'
+    SUFFIX = '.ini'
+
+    def __init__(self):
+        # path -> (modification time, parsed sections or the reason they are invalid), across passes
+        self.files: Dict[Path, Tuple[int, Union[dict, ValueError]]] = {}
+        # Memo of the current pass, see discovery_pass
+        self.memo: Optional[dict] = None
+
+    @contextmanager
+    def discovery_pass(self):
+        """
+        Files changed before the pass are picked up, files changed during it on the next one
+        """
+        self.memo = {'seen': {}, 'folders': {}, 'resolved': {}}
+        try:
+            yield self
+        finally:
+            self.memo = None
+
+    @classmethod
+    def sidecar(cls, script: Path) -> Path:
+        return script.with_name(script.name + cls.SUFFIX)
+
+    def resolve(self, script_path: Path) -> JobMetadata:
+        """
+        The metadata of a script, raises ValueError when one of its sidecars is invalid
+        """
+        # Outside a discovery pass, e.g. in the management commands, nothing is remembered between scripts
+        memo = self.memo or {'seen': {}, 'folders': {}, 'resolved': {}}
+
+        folder = self._folder(script_path.parent, memo)
+        own = self._read(self.sidecar(script_path), memo)
+        if own is not None and 'max_concurrency' in own['job']:
+            raise ValueError(f'max_concurrency can only be set in a {self.FOLDER_FILE} file')
+
+        key = (id(folder), id(own) if own is not None else None)
+        metadata = memo['resolved'].get(key)
+        if metadata is None:
+            metadata = memo['resolved'][key] = self._build(self._merge(folder, own))
+        return metadata
+
+    def _folder(self, folder: Path, memo: dict) -> dict:
+        merged = memo['folders'].get(folder)
+        if merged is not None:
+            return merged
+
+        _, root = settings.root_of(folder)
+        if folder == root or root not in folder.parents:
+            parent = {'job': {}, 'environment': {}}
+        else:
+            parent = self._folder(folder.parent, memo)
+
+        own = self._read(folder / self.FOLDER_FILE, memo)
+        merged = self._merge(parent, own)
+        if own is not None and 'max_concurrency' in own['job']:
+            merged['job']['concurrency_group'] = settings.relative_name(folder)
+
+        memo['folders'][folder] = merged
+        return merged
+
+    @staticmethod
+    def _merge(parent: dict, own: Optional[dict]) -> dict:
+        if own is None:
+            return parent
+        return {'job': {**parent['job'], **own['job']}, 'environment': {**parent['environment'], **own['environment']}}
+
+    def _read(self, path: Path, memo: dict) -> Optional[dict]:
+        """
+        Parsed sections of a sidecar, None when there is none
+        """
+        seen = memo['seen']
+        if path not in seen:
+            seen[path] = self._load(path)
+
+        sections = seen[path]
+        if isinstance(sections, ValueError):
+            raise sections
+        return sections
+
+    def _load(self, path: Path) -> Union[dict, ValueError, None]:
+        try:
+            modified = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            self.files.pop(path, None)
+            return None
+
+        cached = self.files.get(path)
+        if cached is None or cached[0] != modified:
+            try:
+                sections = self._parse(path)
+            except ValueError as excp:
+                # Every job below an invalid folder file is rejected with the same reason, it is parsed once
+                sections = excp
+            cached = self.files[path] = (modified, sections)
+
+        return cached[1]
+
+    def _parse(self, path: Path) -> dict:
+        ini_parser = ConfigParser(interpolation=None)
+        # Environment variable names are case sensitive
+        ini_parser.optionxform = str
+        try:
+            ini_parser.read(path)
+        except ConfigError as excp:
+            raise ValueError(f'Unable to parse {path.name}: {excp}')
+
+        unknown = [section for section in ini_parser.sections() if section not in ('job', 'environment')]
+        if unknown:
+            raise ValueError(f'Unknown sections in {path.name}: {", ".join(unknown)}')
+
+        job = dict(ini_parser['job']) if ini_parser.has_section('job') else {}
+        unknown = [key for key in job if key not in JobMetadata.KEYS]
+        if unknown:
+            raise ValueError(f'Unknown keys in {path.name}: {", ".join(unknown)}')
+
+        try:
+            if 'timeout' in job:
+                job['timeout'] = float(job['timeout'])
+                if job['timeout'] <= 0:
+                    raise ValueError('timeout must be above 0')
+            if 'max_concurrency' in job:
+                job['max_concurrency'] = int(job['max_concurrency'])
+                if job['max_concurrency'] < 1:
+                    raise ValueError('max_concurrency must be at least 1')
+            if 'priority' in job and job['priority'] not in PRIORITIES:
+                raise ValueError(f'priority must be one of {", ".join(PRIORITIES)}')
+        except ValueError as excp:
+            raise ValueError(f'Invalid value in {path.name}: {excp}')
+
+        if 'working_directory' in job:
+            # Relative to the folder of the sidecar
+            job['working_directory'] = path.parent / job['working_directory']
+
+        environment = dict(ini_parser['environment']) if ini_parser.has_section('environment') else {}
+        return {'job': job, 'environment': environment}
+
+    @staticmethod
+    def _build(merged: dict) -> JobMetadata:
+        if not merged['job'] and not merged['environment']:
+            return NO_METADATA
+        return JobMetadata(environment=merged['environment'], **merged['job'])
+
+
+metadata_cache = MetadataCache()
@@ -0,0 +1,156 @@
+from collections import deque
+from datetime import datetime, timedelta
+from math import ceil
+from typing import Callable, Iterable, List, Optional
+
+from pycron.jobs.jobs import Job
+
+
+class WindowPlanner:
+    """
+    Picks when jobs with a tolerance window (`1day/at0200/within0300`) start inside their window
+
+    Purpose: Nightly jobs pinned to the same slot all start at once and fight for the box. Given a window they are
+            spread over it instead, so fewer run at the same time and the window's work finishes sooner.
+
+            Each job's predicted runtime is the p95 of its recorded runs, its weight the cores it kept busy on average
+            (at least 1, every run holds a slot). Planning is greedy: the biggest jobs are placed first, each at the
+            start minute that keeps the peak predicted load over its run lowest, the earliest such minute on a tie.
+            Runs in flight and the other scheduled jobs with a recorded runtime of a minute or more are counted as
+            fixed load.
+
+    The plan is an offset from the job's slot, see Job.window_offset, so it holds for every slot until replanned.
+    """
+
+    # Start times are planned to the minute, the resolution of interval slots
+    RESOLUTION = 60
+
+    def __init__(self, runtime: Callable[[Job], Optional[float]] = None):
+        # Predicted seconds a job runs for, None when unknown
+        self.runtime = runtime or self.recorded_runtime
+
+    @staticmethod
+    def recorded_runtime(job: Job) -> Optional[float]:
+        history = job.history
+        if history is None or not history.count:
+            return None
+        return history.p95
+
+    @staticmethod
+    def weight(job: Job, runtime: Optional[float]) -> float:
+        usage = job.usage
+        if usage is None or not usage.runs or not runtime:
+            return 1
+        return max(usage.cpu_seconds / usage.runs / runtime, 1)
+
+    def _buckets(self, seconds: Optional[float]) -> int:
+        return max(ceil((seconds or 0) / self.RESOLUTION), 1)
+
+    def plan(self, jobs: Iterable[Job], now: datetime, scheduled: Callable[[Job], bool] = None) -> List[Job]:
+        """
+        Set the window offset of the windowed jobs among jobs, returns the jobs that were planned
+
+        scheduled tells the jobs that run on their interval from the ones started by other jobs, all are by default
+        """
+        scheduled = scheduled or (lambda job: True)
+
+        windowed, fixed = [], []
+        for job in jobs:
+            if job.paused or not scheduled(job):
+                continue
+            if job.interval.window is not None and not job.locked and job.failed_attempts == 0:
+                windowed.append(job)
+            else:
+                fixed.append(job)
+
+        if not windowed:
+            return []
+
+        origin = now.replace(second=0, microsecond=0)
+        slots = {job: job.interval.next_time(job.last_execution) for job in windowed}
+        horizon = max(slot + job.interval.window for job, slot in slots.items())
+
+        def index(moment: datetime) -> int:
+            return max(int((moment - origin).total_seconds() // self.RESOLUTION), 0)
+
+        size = index(horizon)
+        load = [0.0] * (size + 1)
+
+        def occupy(start: int, length: int, weight: float):
+            end = start + length
+            if end > len(load):
+                load.extend([0.0] * (end - len(load)))
+            for position in range(start, end):
+                load[position] += weight
+
+        for job in fixed:
+            self._add_fixed_load(job, now, origin, horizon, index, occupy)
+
+        # Longest and heaviest first, names keep the plan the same from one run to the next
+        predicted = {job: self.runtime(job) for job in windowed}
+        windowed.sort(key=lambda job: (-self._buckets(predicted[job]) * self.weight(job, predicted[job]),
+                                       str(job.relative_name)))
+
+        for job in windowed:
+            slot, runtime = slots[job], predicted[job]
+            length, weight = self._buckets(runtime), self.weight(job, runtime)
+
+            first = index(max(slot, origin))
+            # Finish inside the window when it is long enough
+            last = max(index(slot + job.interval.window) - length, first)
+            if last + length > len(load):
+                load.extend([0.0] * (last + length - len(load)))
+
+            peaks = self._window_peaks(load, first, last, length)
+            best = min(range(len(peaks)), key=lambda offset: (peaks[offset], offset))
+            occupy(first + best, length, weight)
+
+            start = origin + timedelta(seconds=(first + best) * self.RESOLUTION)
+            # A job overdue past its whole window starts now, its offset still has to fit the windows after it
+            job.window_offset = int(min(start - slot, job.interval.window).total_seconds())
+
+        return windowed
+
+    def _add_fixed_load(self, job: Job, now: datetime, origin: datetime, horizon: datetime, index, occupy):
+        runtime = self.runtime(job)
+        if runtime is None:
+            return
+        weight = self.weight(job, runtime)
+
+        if job.locked:
+            # What is left of the run in flight
+            remaining = runtime - (now - job.locked_at).total_seconds()
+            if remaining > 0:
+                occupy(0, self._buckets(remaining), weight)
+            return
+
+        # Short frequent jobs load every minute alike, they do not change where the windowed jobs go
+        if runtime < self.RESOLUTION or job.interval.timer_driven:
+            return
+
+        length = self._buckets(runtime)
+        due = job.next_execution
+        while due is not None and due < horizon:
+            occupy(index(due), length, weight)
+            due = job.interval.next_time(due)
+
+    @staticmethod
+    def _window_peaks(load: List[float], first: int, last: int, length: int) -> List[float]:
+        """
+        Highest load over length buckets starting at each of first to last, a sliding window maximum
+        """
+        peaks = []
+        candidates = deque()
+        for position in range(first, last + length):
+            while candidates and load[candidates[-1]] <= load[position]:
+                candidates.pop()
+            candidates.append(position)
+
+            start = position - length + 1
+            if start < first:
+                continue
+            if candidates[0] < start:
+                candidates.popleft()
+            peaks.append(load[candidates[0]])
+
+        return peaks
@@ -0,0 +1,37 @@
+from math import ceil
+from typing import Iterable, List
+
+# Priority classes, most urgent first. Jobs are normal unless their metadata says otherwise.
+PRIORITIES = ('critical', 'high', 'normal', 'low')
+DEFAULT_PRIORITY = 'normal'
+
+PRIORITY_RANKS = {name: rank for rank, name in enumerate(PRIORITIES)}
+
+WAIT_REPORT_FIELDS = ['priority', 'jobs', 'runs', 'p50_wait_seconds', 'p95_wait_seconds', 'p99_wait_seconds',
+                      'max_wait_seconds']
+
+
+def wait_report(jobs: Iterable) -> List[dict]:
+    """
+    Queue wait per priority class, from the lag (seconds between due and started) of the runs in the jobs' histories
+    """
+    lags = {name: [] for name in PRIORITIES}
+    counts = dict.fromkeys(PRIORITIES, 0)
+    for job in jobs:
+        counts[job.priority] += 1
+        if job.history is not None:
+            # Order does not matter here, the ring buffer is read as is
+            lags[job.priority].extend(job.history.lags)
+
+    rows = []
+    for name in PRIORITIES:
+        ordered = sorted(lags[name])
+        row = {'priority': name, 'jobs': counts[name], 'runs': len(ordered)}
+        for percent in (50, 95, 99):
+            # Nearest rank, as the duration percentiles of RunHistory
+            row[f'p{percent}_wait_seconds'] = (round(ordered[max(ceil(percent / 100 * len(ordered)), 1) - 1], 3)
+                                               if ordered else None)
+        row['max_wait_seconds'] = round(ordered[-1], 3) if ordered else None
+        rows.append(row)
+
+    return rows
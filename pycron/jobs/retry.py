@@ -0,0 +1,54 @@
+from datetime import timedelta
+from random import Random
+
+from pycron import settings
+
+
+class RetryPolicy:
+    """
+    When a failed job is tried again, configured in the [Retry] section
+
+    Purpose: Keep broken jobs from hammering what they depend on and from retrying in lockstep
+
+            The n-th consecutive failure is retried after
+                JOB_FAIL_TIMEOUT_PERIOD_MINUTES * RETRY_BACKOFF_MULTIPLIER ^ (n - 1)
+            capped at RETRY_MAX_DELAY_MINUTES and spread by +/- RETRY_JITTER of the delay.
+
+            After RETRY_MAX_ATTEMPTS failures (0 for no limit) the job is no longer retried early, it runs again on its
+            normal interval. After CIRCUIT_BREAKER_FAILURES failures (0 to disable) the job is parked: it is reported as
+            such and only probed until a run succeeds or its failures are reset by hand. Either way it is tried no more
+            often than every RETRY_MAX_DELAY_MINUTES, so a broken `1min` job does not go back to running every minute.
+
+    The defaults retry every JOB_FAIL_TIMEOUT_PERIOD_MINUTES forever, as PyCron always did.
+    """
+
+    @staticmethod
+    def parked(failed_attempts: int) -> bool:
+        return 0 < settings.CIRCUIT_BREAKER_FAILURES <= failed_attempts
+
+    @classmethod
+    def retrying(cls, failed_attempts: int) -> bool:
+        if cls.parked(failed_attempts):
+            return False
+
+        return settings.RETRY_MAX_ATTEMPTS == 0 or failed_attempts <= settings.RETRY_MAX_ATTEMPTS
+
+    @staticmethod
+    def probe_delay() -> timedelta:
+        """
+        Least time between the runs of a job that is out of retries or parked
+        """
+        return timedelta(minutes=settings.RETRY_MAX_DELAY_MINUTES)
+
+    @staticmethod
+    def delay(failed_attempts: int, seed: int) -> timedelta:
+        # The exponent is bounded so a job failing for months cannot overflow the float
+        exponent = min(failed_attempts - 1, 64)
+        minutes = settings.JOB_FAIL_TIMEOUT_PERIOD_MINUTES * settings.RETRY_BACKOFF_MULTIPLIER ** exponent
+        minutes = min(minutes, settings.RETRY_MAX_DELAY_MINUTES)
+
+        if settings.RETRY_JITTER:
+            # Seeded by job and attempt, so the retry time of a job is stable between calls but differs between jobs
+            minutes *= 1 + Random(seed + failed_attempts).uniform(-settings.RETRY_JITTER, settings.RETRY_JITTER)
+
+        return timedelta(minutes=minutes)
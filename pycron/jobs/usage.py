@@ -0,0 +1,98 @@
+from typing import Dict, Iterable, List
+
+# Fields added to the status record of a run, from the rusage of its process
+USAGE_FIELDS = ['cpu_user_seconds', 'cpu_system_seconds', 'max_rss_kb', 'block_input', 'block_output',
+                'voluntary_context_switches', 'involuntary_context_switches']
+
+
+def usage_of(rusage) -> Dict[str, float]:
+    """
+    The fields of an os.wait4 rusage that matter for a run, the script's own children are included
+    """
+    return {
+        'cpu_user_seconds': round(rusage.ru_utime, 6),
+        'cpu_system_seconds': round(rusage.ru_stime, 6),
+        # Kilobytes on Linux
+        'max_rss_kb': rusage.ru_maxrss,
+        'block_input': rusage.ru_inblock,
+        'block_output': rusage.ru_oublock,
+        'voluntary_context_switches': rusage.ru_nvcsw,
+        'involuntary_context_switches': rusage.ru_nivcsw,
+    }
+
+
+class ResourceUsage:
+    """
+    Running totals of the resources used by the runs of a job, or of all jobs of a folder
+
+    Only runs reaped by the daemon itself are counted: runs re-adopted after a restart and runs of a batch have no
+    usage of their own.
+    """
+
+    __slots__ = ('runs', 'cpu_user_seconds', 'cpu_system_seconds', 'max_rss_kb', 'block_input', 'block_output',
+                 'voluntary_context_switches', 'involuntary_context_switches')
+
+    def __init__(self):
+        self.runs = 0
+        for field in USAGE_FIELDS:
+            setattr(self, field, 0)
+
+    def add(self, usage: Dict[str, float]):
+        self.runs += 1
+        for field in USAGE_FIELDS:
+            if field == 'max_rss_kb':
+                # A peak, not a total
+                self.max_rss_kb = max(self.max_rss_kb, usage[field])
+            else:
+                setattr(self, field, getattr(self, field) + usage[field])
+
+    def merge(self, other: 'ResourceUsage'):
+        self.runs += other.runs
+        for field in USAGE_FIELDS:
+            if field == 'max_rss_kb':
+                self.max_rss_kb = max(self.max_rss_kb, other.max_rss_kb)
+            else:
+                setattr(self, field, getattr(self, field) + getattr(other, field))
+
+    @property
+    def cpu_seconds(self) -> float:
+        return self.cpu_user_seconds + self.cpu_system_seconds
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+
+USAGE_REPORT_FIELDS = ['name', 'runs', 'cpu_seconds', 'cpu_seconds_per_run', 'max_rss_kb', 'block_input',
+                       'block_output', 'context_switches']
+
+
+def usage_rows(jobs: Iterable, by_folder: bool = False) -> List[dict]:
+    """
+    Resource totals per job, or per interval folder, heaviest CPU users first
+    """
+    totals: Dict[str, ResourceUsage] = {}
+    for job in jobs:
+        if job.usage is None:
+            continue
+
+        name = str(job.relative_name.parent if by_folder else job.relative_name)
+        totals.setdefault(name, ResourceUsage()).merge(job.usage)
+
+    rows = []
+    for name, usage in totals.items():
+        rows.append({
+            'name': name,
+            'runs': usage.runs,
+            'cpu_seconds': round(usage.cpu_seconds, 3),
+            'cpu_seconds_per_run': round(usage.cpu_seconds / usage.runs, 3),
+            'max_rss_kb': usage.max_rss_kb,
+            'block_input': usage.block_input,
+            'block_output': usage.block_output,
+            'context_switches': usage.voluntary_context_switches + usage.involuntary_context_switches,
+        })
+
+    return sorted(rows, key=lambda row: row['cpu_seconds'], reverse=True)
@@ -1,27 +1,38 @@
 import argparse
-import os
+import sys
 from pathlib import Path
 
 from pycron import settings
 
 
-from pycron.coordinator import MainThread
-
-
 def relative_to_absolute(path: str) -> Path:
     return Path(path).absolute()
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
+    parser.add_argument('command', nargs='?', default='run', choices=['run', 'agent', 'list', 'next', 'validate', 'history', 'output', 'usage', 'waits', 'simulate', 'trace', 'ctl'],
+                        help='Run the daemon (default), a worker agent or a management command')
+    parser.add_argument('arguments', nargs='*', help='Arguments of the management command')
+    parser.add_argument('-n', '--number', action='store', type=int, default=10,
+                        help='Number of entries shown by `next`, `usage`, `ctl` and `simulate`')
     parser.add_argument('--nuke', action='store_true')
+    parser.add_argument('--days', action='store', type=float, default=7, help='Days `simulate` covers')
+    parser.add_argument('--start', action='store', help='When `simulate` starts (ISO format), defaults to now')
+    parser.add_argument('--duration', action='store', type=float,
+                        help='Seconds every simulated run takes, defaults to the recorded median of each job')
+    parser.add_argument('--add', action='append', metavar='COUNT:FOLDER[:SECONDS]',
+                        help='Add made up jobs to the `simulate` run, e.g. 300:1day/at0200')
     parser.add_argument('-t', '--target', action='store', help='Jobs folder to target')
     parser.add_argument('-l', '--log-folder', action='store', help='Log folder to target')
     parser.add_argument('-c', '--config-file', action='store', help='Config file to target')
     parser.add_argument('-p', '--pickle-file', action='store', help='Location for the pickle file')
+    parser.add_argument('-u', '--control-socket', action='store', help='Location for the control socket')
+    parser.add_argument('-s', '--shards', action='store', type=int, help='Number of scheduler processes to shard the jobs across')
 
     args = vars(parser.parse_args())
-    print(args)
+    if args['command'] == 'run':
+        print(args)
 
     if args['config_file']:
         settings.reload_config_from_file(args['config_file'])
@@ -38,10 +49,46 @@ if __name__ == '__main__':
         absolute_path = relative_to_absolute(args['pickle_file'])
         settings.set_persistence_file_location(absolute_path)
 
+    if args['control_socket']:
+        absolute_path = relative_to_absolute(args['control_socket'])
+        settings.set_control_socket(absolute_path)
+
+    if args['shards']:
+        settings.set_shard_count(args['shards'])
+
+    if args['command'] == 'agent':
+        import signal
+        from pycron.agents.worker_agent import WorkerAgent
+
+        if not settings.AGENT_ADDRESS:
+            parser.error('No AGENT_ADDRESS configured for the worker agent to connect to')
+
+        agent = WorkerAgent(settings.AGENT_ADDRESS, settings.AGENT_SLOTS)
+        signal.signal(signal.SIGTERM, agent.stop)
+        agent.run()
+        sys.exit(0)
+
+    # Management commands only import what they need, the daemon stack is never loaded for them
+    if args['command'] != 'run':
+        from pycron.commands import COMMANDS
+
+        sys.exit(COMMANDS[args['command']](args))
+
+    from pycron.coordinator import MainThread
+
     settings.summaries_settings()
 
+    if settings.SHARD_COUNT > 1 and settings.AGENT_ADDRESS:
+        parser.error('Worker agents serve a single scheduler, set either SHARD_COUNT or AGENT_ADDRESS')
+
     # try:
-    main_thread = MainThread(nuke_persistence=args['nuke'])
-    main_thread.run()
+    if settings.SHARD_COUNT > 1:
+        from pycron.sharding.supervisor import ShardSupervisor
+
+        supervisor = ShardSupervisor(nuke_persistence=args['nuke'])
+        supervisor.run()
+    else:
+        main_thread = MainThread(nuke_persistence=args['nuke'])
+        main_thread.run()
     # except Exception as excp:
     #     LOG.exception(excp.args)
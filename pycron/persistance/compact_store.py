@@ -0,0 +1,250 @@
+import gc
+import pickle
+import struct
+import zlib
+from array import array
+from datetime import datetime
+from itertools import repeat
+from math import isnan, nan
+from operator import truediv
+from pathlib import Path
+from typing import Dict, BinaryIO, Iterable, Set, Tuple
+from uuid import UUID
+
+from pycron.interval.parser import interval_parser
+from pycron.jobs.jobs import Job, JobRunReasons
+from pycron.settings import ROOT_PREFIX
+
+
+class StoreFormatError(Exception):
+    ...
+
+
+class CompactStoreCodec:
+    """
+    Versioned, column oriented file format for the job store
+
+    Rather than pickling every Job object, each persisted attribute is written as one column (arrays of timestamps,
+    packed uuids, ...). Folders and intervals are interned, so every job in `1hour/at0030` shares a single folder
+    string and a single Interval on load.
+
+    Layout:
+        MAGIC | format version (unsigned short) | flags (unsigned char) | pickled table, zlib compressed if flagged
+
+    Columns are looked up by name: columns missing from an older file fall back to Job.STATE_DEFAULTS and unknown
+    columns are ignored, so adding an attribute does not need a new format version. The folders paused through the
+    control socket are kept next to the columns, older files have none.
+    """
+
+    MAGIC = b'PYCRON-STORE'
+    FORMAT_VERSION = 1
+    _HEADER = struct.Struct('>HB')
+    FLAG_ZLIB = 1
+
+    # Compression level used when writing, fast levels already shrink the repetitive name and time columns a lot
+    COMPRESSION_LEVEL = 1
+
+    _NO_INT = -(2 ** 31)
+
+    # Persisted Job attribute -> column kind
+    COLUMNS = {
+        'job_uuid': 'uuid',
+        'last_execution': 'datetime',
+        'last_success': 'datetime',
+        'last_failed_execution': 'datetime',
+        'run_reason': 'run_reason',
+        'failed_attempts': 'int',
+        'locked': 'bool',
+        'locked_at': 'datetime',
+        'unlocked_at': 'datetime',
+        'run_uuid': 'uuid',
+        'pid': 'int',
+        'paused': 'bool',
+        'start_lag': 'float',
+        'history': 'object',
+        'usage': 'object',
+        'window_offset': 'int',
+        'metadata': 'object',
+    }
+
+    _RUN_REASONS = list(JobRunReasons)
+
+    # --- column kinds ---
+
+    @classmethod
+    def _encode_column(cls, kind: str, values: list):
+        if kind == 'datetime':
+            return array('d', [nan if value is None else value.timestamp() for value in values])
+        if kind == 'float':
+            return array('d', [nan if value is None else value for value in values])
+        if kind == 'int':
+            return array('i', [cls._NO_INT if value is None else value for value in values])
+        if kind == 'bool':
+            return bytes(map(bool, values))
+        if kind == 'uuid':
+            # Presence mask plus the packed uuids that are set, run uuids only exist while a job runs
+            present = bytes(value is not None for value in values)
+            return present, b''.join([value.bytes for value in values if value is not None])
+        if kind == 'run_reason':
+            return bytes([cls._RUN_REASONS.index(value) for value in values])
+
+        # Anything else is pickled as a plain list
+        return values
+
+    @classmethod
+    def _decode_column(cls, kind: str, column) -> list:
+        if kind == 'datetime':
+            from_timestamp = datetime.fromtimestamp
+            return [None if isnan(value) else from_timestamp(value) for value in column]
+        if kind == 'float':
+            return [None if isnan(value) else value for value in column]
+        if kind == 'int':
+            return [None if value == cls._NO_INT else value for value in column]
+        if kind == 'bool':
+            return list(map(bool, column))
+        if kind == 'uuid':
+            present, packed = column
+            chunks = iter([packed[offset:offset + 16] for offset in range(0, len(packed), 16)])
+            return [UUID(bytes=next(chunks)) if is_set else None for is_set in present]
+        if kind == 'run_reason':
+            reasons = cls._RUN_REASONS
+            return [reasons[index] for index in column]
+
+        return list(column)
+
+    # --- store ---
+
+    @classmethod
+    def encode(cls, store: Dict[Path, Job], paused_folders: Iterable[Path] = ()) -> bytes:
+        jobs = list(store.values())
+
+        folder_index: Dict[str, int] = {}
+        interval_index = {}
+        folders, names, intervals = array('I'), [], array('I')
+
+        for job in jobs:
+            folder, _, name = str(job.relative_name).rpartition('/')
+            folders.append(folder_index.setdefault(folder, len(folder_index)))
+            names.append(name)
+            intervals.append(interval_index.setdefault(job.interval, len(interval_index)))
+
+        table = {
+            'count': len(jobs),
+            'folder_table': list(folder_index),
+            'interval_table': list(interval_index),
+            'folder': folders,
+            'name': names,
+            'interval': intervals,
+            'paused_folders': sorted(map(str, paused_folders)),
+            'columns': {
+                field: cls._encode_column(kind, [getattr(job, field) for job in jobs])
+                for field, kind in cls.COLUMNS.items()
+            },
+        }
+
+        payload = pickle.dumps(table, protocol=pickle.HIGHEST_PROTOCOL)
+
+        flags = 0
+        if cls.COMPRESSION_LEVEL:
+            flags |= cls.FLAG_ZLIB
+            payload = zlib.compress(payload, cls.COMPRESSION_LEVEL)
+
+        return cls.MAGIC + cls._HEADER.pack(cls.FORMAT_VERSION, flags) + payload
+
+    @classmethod
+    def decode(cls, data: bytes, jobs_folder: Path, roots: Dict[str, Path] = None) -> Dict[Path, Job]:
+        return cls.decode_state(data, jobs_folder, roots)[0]
+
+    @classmethod
+    def decode_state(cls, data: bytes, jobs_folder: Path,
+                     roots: Dict[str, Path] = None) -> Tuple[Dict[Path, Job], Set[Path]]:
+        """
+        The jobs and the paused folders
+        """
+        if not cls.is_compact(data):
+            raise StoreFormatError('Not a compact store file')
+
+        offset = len(cls.MAGIC)
+        version, flags = cls._HEADER.unpack_from(data, offset)
+        if version > cls.FORMAT_VERSION:
+            raise StoreFormatError(f'Store format version {version} is newer than supported ({cls.FORMAT_VERSION})')
+
+        payload = data[offset + cls._HEADER.size:]
+        if flags & cls.FLAG_ZLIB:
+            payload = zlib.decompress(payload)
+
+        # Millions of fresh objects would otherwise trigger the cyclic garbage collector over and over
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            table = pickle.loads(payload)
+            jobs = cls._decode_table(table, jobs_folder, roots or {})
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+        return jobs, set(map(Path, table.get('paused_folders', ())))
+
+    @classmethod
+    def _decode_table(cls, table: dict, jobs_folder: Path, roots: Dict[str, Path]) -> Dict[Path, Job]:
+        count = table['count']
+
+        relative_folders = [Path(folder) for folder in table['folder_table']]
+        absolute_folders = [cls._absolute_folder(folder, jobs_folder, roots) for folder in relative_folders]
+        # Folders of job roots no longer configured, their jobs are left out
+        unknown = {index for index, folder in enumerate(absolute_folders) if folder is None}
+        if unknown:
+            absolute_folders = [folder or jobs_folder for folder in absolute_folders]
+        folders = table['folder']
+        names = table['name']
+        # The same instances as parsed jobs with the same schedule, see IntervalParser
+        interval_table = list(map(interval_parser.intern, table['interval_table']))
+
+        jobs = [Job.__new__(Job) for _ in range(count)]
+        script_paths = list(map(truediv, [absolute_folders[index] for index in folders], names))
+        relative_names = list(map(truediv, [relative_folders[index] for index in folders], names))
+
+        # Column wise assignment keeps the per job work inside C loops
+        list(map(setattr, jobs, repeat('script_path'), script_paths))
+        list(map(setattr, jobs, repeat('relative_name'), relative_names))
+        list(map(setattr, jobs, repeat('interval'), [interval_table[index] for index in table['interval']]))
+
+        columns = table['columns']
+        for field in Job.__slots__:
+            if field in ('script_path', 'relative_name', 'interval'):
+                continue
+
+            if field in columns and field in cls.COLUMNS:
+                values = cls._decode_column(cls.COLUMNS[field], columns[field])
+            else:
+                values = repeat(Job.STATE_DEFAULTS.get(field), count)
+
+            list(map(setattr, jobs, repeat(field), values))
+
+        if unknown:
+            return {path: job for path, job, folder in zip(script_paths, jobs, folders) if folder not in unknown}
+        return dict(zip(script_paths, jobs))
+
+    @staticmethod
+    def _absolute_folder(folder: Path, jobs_folder: Path, roots: Dict[str, Path]):
+        """
+        Folders of extra job roots are stored as @<root>/<path in the root>, see settings.relative_name
+        """
+        first = folder.parts[0] if folder.parts else ''
+        if not first.startswith(ROOT_PREFIX):
+            return jobs_folder / folder
+
+        root = roots.get(first[1:])
+        return root.joinpath(*folder.parts[1:]) if root is not None else None
+
+    @classmethod
+    def is_compact(cls, data: bytes) -> bool:
+        return data[:len(cls.MAGIC)] == cls.MAGIC
+
+    @classmethod
+    def dump(cls, store: Dict[Path, Job], file: BinaryIO, paused_folders: Iterable[Path] = ()):
+        file.write(cls.encode(store, paused_folders))
+
+    @classmethod
+    def load(cls, file: BinaryIO, jobs_folder: Path, roots: Dict[str, Path] = None) -> Dict[Path, Job]:
+        return cls.decode(file.read(), jobs_folder, roots)
@@ -0,0 +1,289 @@
+import json
+import lzma
+import os
+import shutil
+import struct
+import zlib
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from threading import Lock
+from typing import Iterator, List, Optional, Tuple
+from uuid import UUID
+
+from pycron import settings
+
+
+class OutputArchive:
+    """
+    Compressed archive of the output of every run, looked up by run uuid
+
+    Purpose: Keep run output for post-mortems without growing the job status log by the full output of every run
+
+            Runs are appended to numbered segment files, each run compressed on its own so a single run is read
+            back with one seek. Every segment has a sidecar index of fixed size entries. Next to those, the keys
+            folder holds the same entries hashed into 256 buckets by the first byte of the run uuid and of the job
+            uuid, so a lookup reads one small bucket file and one record however many runs are archived.
+
+    Segment record: run uuid (16 bytes) | codec (unsigned char) | length (unsigned int) | compressed json
+    Index entry:    run uuid (16 bytes) | job uuid (16 bytes) | offset | length | ended at (timestamp)
+    Run key:        run uuid (16 bytes) | segment number | offset | length
+    Job key:        job uuid (16 bytes) | run uuid (16 bytes) | segment number | ended at (timestamp)
+
+    Retention drops whole segments, oldest first, once the archive is over ARCHIVE_MAX_SIZE_MB or a segment is older
+    than ARCHIVE_MAX_AGE_DAYS.
+    """
+
+    _RECORD_HEADER = struct.Struct('>16sBI')
+    _INDEX_ENTRY = struct.Struct('>16s16sQId')
+    _RUN_KEY = struct.Struct('>16sIQI')
+    _JOB_KEY = struct.Struct('>16s16sId')
+    # Position of the segment number in each kind of key
+    _KEY_KINDS = {'run': (_RUN_KEY, 1), 'job': (_JOB_KEY, 2)}
+
+    CODECS = {
+        'zlib': (1, zlib.compress, zlib.decompress),
+        'lzma': (2, lzma.compress, lzma.decompress),
+    }
+    _DECOMPRESS = {codec_id: decompress for codec_id, _, decompress in CODECS.values()}
+
+    # A new segment is started once the current one reaches this size, or on the next day
+    SEGMENT_BYTES = 16 * 1024 * 1024
+
+    def __init__(self, folder: Path):
+        self.folder = folder
+        self.lock = Lock()
+
+        # Opened on the first write, so reading an archive never creates or touches a segment
+        self.segment: Path = None
+        self.segment_started: datetime = None
+
+    # --- writing ---
+
+    def append(self, job_uuid: UUID, run_uuid: UUID, ended_at: datetime, record: dict):
+        codec_id, compress, _ = self.CODECS[settings.ARCHIVE_COMPRESSION]
+        payload = compress(json.dumps(record).encode('utf-8'))
+
+        with self.lock:
+            if self._should_roll():
+                self._roll()
+
+            with open(self.segment, 'ab') as segment:
+                offset = segment.tell() + self._RECORD_HEADER.size
+                segment.write(self._RECORD_HEADER.pack(run_uuid.bytes, codec_id, len(payload)) + payload)
+
+            # Written after the record, a reader never finds an index entry pointing past the end of a segment
+            with open(self.segment.with_suffix('.idx'), 'ab') as index:
+                index.write(self._INDEX_ENTRY.pack(run_uuid.bytes, job_uuid.bytes, offset, len(payload),
+                                                   ended_at.timestamp()))
+
+            number = int(self.segment.stem)
+            with open(self._bucket('run', run_uuid.bytes), 'ab') as bucket:
+                bucket.write(self._RUN_KEY.pack(run_uuid.bytes, number, offset, len(payload)))
+            with open(self._bucket('job', job_uuid.bytes), 'ab') as bucket:
+                bucket.write(self._JOB_KEY.pack(job_uuid.bytes, run_uuid.bytes, number, ended_at.timestamp()))
+
+    def _should_roll(self) -> bool:
+        if self.segment is None:
+            return True
+
+        return (self.segment.stat().st_size >= self.SEGMENT_BYTES
+                or self.segment_started.date() != datetime.now().date())
+
+    def _roll(self):
+        self.folder.mkdir(parents=True, exist_ok=True)
+        if not self.keys_folder.is_dir():
+            self._build_keys()
+
+        segments = self.segments()
+        number = int(segments[-1].stem) + 1 if segments else 0
+        self.segment = self.folder / f'{number:08d}.seg'
+        self.segment.touch()
+        self.segment_started = datetime.now()
+
+        self.apply_retention()
+
+    def apply_retention(self):
+        max_age = timedelta(days=settings.ARCHIVE_MAX_AGE_DAYS)
+        # Sharded daemons each keep their own archive, they share the size budget
+        max_bytes = settings.ARCHIVE_MAX_SIZE_MB * 1024 * 1024 // settings.SHARD_COUNT
+        now = datetime.now()
+
+        segments = [segment for segment in self.segments() if segment != self.segment]
+        total = sum(segment.stat().st_size for segment in segments)
+        if self.segment is not None:
+            total += self.segment.stat().st_size
+
+        removed = set()
+        for segment in segments:
+            too_old = now - datetime.fromtimestamp(segment.stat().st_mtime) > max_age
+            if not too_old and total <= max_bytes:
+                break
+
+            total -= segment.stat().st_size
+            settings.LOG.info(f'Removing archived output segment {segment}')
+            segment.with_suffix('.idx').unlink(missing_ok=True)
+            segment.unlink(missing_ok=True)
+            removed.add(int(segment.stem))
+
+        if removed:
+            self._drop_keys(removed)
+
+    # --- keyed index ---
+
+    @property
+    def keys_folder(self) -> Path:
+        return self.folder / 'keys'
+
+    def _bucket(self, kind: str, key: bytes, folder: Path = None) -> Path:
+        return (folder or self.keys_folder) / f'{kind}-{key[0]:02x}.key'
+
+    def _build_keys(self):
+        """
+        Key the runs of an archive written before there were keys. Built aside, readers scan the segment indexes
+        until it is complete.
+        """
+        building = self.folder / 'keys.building'
+        shutil.rmtree(building, ignore_errors=True)
+        building.mkdir()
+
+        buckets = defaultdict(list)
+        for segment in self.segments():
+            number = int(segment.stem)
+            for run_uuid, job_uuid, offset, length, ended_at in self._INDEX_ENTRY.iter_unpack(self._read_index(segment)):
+                buckets[self._bucket('run', run_uuid, building)].append(
+                    self._RUN_KEY.pack(run_uuid, number, offset, length))
+                buckets[self._bucket('job', job_uuid, building)].append(
+                    self._JOB_KEY.pack(job_uuid, run_uuid, number, ended_at))
+
+        for bucket, keys in buckets.items():
+            bucket.write_bytes(b''.join(keys))
+        building.rename(self.keys_folder)
+
+    def _drop_keys(self, segment_numbers: set):
+        """
+        Rewrite the buckets without the keys of removed segments, replaced whole so readers never see half a bucket
+        """
+        for kind, (key_struct, segment_field) in self._KEY_KINDS.items():
+            for bucket in self.keys_folder.glob(f'{kind}-*.key'):
+                data = self._trimmed(bucket.read_bytes(), key_struct)
+                kept = b''.join(data[position:position + key_struct.size]
+                                for position in range(0, len(data), key_struct.size)
+                                if key_struct.unpack_from(data, position)[segment_field] not in segment_numbers)
+
+                staged = bucket.with_suffix('.staged')
+                staged.write_bytes(kept)
+                os.replace(staged, bucket)
+
+    def _read_bucket(self, kind: str, key: bytes) -> bytes:
+        try:
+            data = self._bucket(kind, key).read_bytes()
+        except FileNotFoundError:
+            return b''
+
+        return self._trimmed(data, self._KEY_KINDS[kind][0])
+
+    # --- reading ---
+
+    def segments(self) -> List[Path]:
+        if not self.folder.is_dir():
+            return []
+
+        return sorted(self.folder.glob('*.seg'))
+
+    def entries(self, segment: Path) -> Iterator[Tuple[UUID, UUID, int, int, datetime]]:
+        data = self._read_index(segment)
+        for run_uuid, job_uuid, offset, length, ended_at in self._INDEX_ENTRY.iter_unpack(data):
+            yield UUID(bytes=run_uuid), UUID(bytes=job_uuid), offset, length, datetime.fromtimestamp(ended_at)
+
+    def _read_index(self, segment: Path) -> bytes:
+        try:
+            data = segment.with_suffix('.idx').read_bytes()
+        except FileNotFoundError:
+            return b''
+
+        return self._trimmed(data, self._INDEX_ENTRY)
+
+    @staticmethod
+    def _trimmed(data: bytes, entry: struct.Struct) -> bytes:
+        # Ignore an entry still being written by the daemon
+        return data[:len(data) - len(data) % entry.size]
+
+    @staticmethod
+    def _find_entry(data: bytes, key: bytes, entry_size: int) -> int:
+        position = data.find(key)
+        while position != -1 and position % entry_size:
+            # Matched inside another field of an entry
+            position = data.find(key, position + 1)
+        return position
+
+    def find(self, run_uuid: UUID) -> Optional[dict]:
+        """
+        Output of a single run, None if it is not (or no longer) archived
+        """
+        key = run_uuid.bytes
+        if not self.keys_folder.is_dir():
+            return self._scan_for(key)
+
+        data = self._read_bucket('run', key)
+        position = self._find_entry(data, key, self._RUN_KEY.size)
+        if position == -1:
+            return None
+
+        _, number, offset, length = self._RUN_KEY.unpack_from(data, position)
+        try:
+            return self._read_record(self.folder / f'{number:08d}.seg', offset, length)
+        except FileNotFoundError:
+            # Removed by retention since the bucket was read
+            return None
+
+    def _scan_for(self, key: bytes) -> Optional[dict]:
+        # Newest first, post-mortems are nearly always about recent runs
+        for segment in reversed(self.segments()):
+            data = self._read_index(segment)
+            position = self._find_entry(data, key, self._INDEX_ENTRY.size)
+            if position != -1:
+                _, _, offset, length, _ = self._INDEX_ENTRY.unpack_from(data, position)
+                return self._read_record(segment, offset, length)
+
+        return None
+
+    def runs_of(self, job_uuid: UUID) -> List[Tuple[UUID, datetime]]:
+        """
+        Archived runs of a job as (run uuid, ended at), oldest first
+        """
+        if not self.keys_folder.is_dir():
+            return [(run_uuid, ended_at)
+                    for segment in self.segments()
+                    for run_uuid, entry_job_uuid, _, _, ended_at in self.entries(segment)
+                    if entry_job_uuid == job_uuid]
+
+        key = job_uuid.bytes
+        return [(UUID(bytes=run_uuid), datetime.fromtimestamp(ended_at))
+                for entry_job_uuid, run_uuid, _, ended_at in self._JOB_KEY.iter_unpack(self._read_bucket('job', key))
+                if entry_job_uuid == key]
+
+    def _read_record(self, segment: Path, offset: int, length: int) -> dict:
+        with open(segment, 'rb') as segment_file:
+            segment_file.seek(offset - self._RECORD_HEADER.size)
+            _, codec_id, _ = self._RECORD_HEADER.unpack(segment_file.read(self._RECORD_HEADER.size))
+            payload = segment_file.read(length)
+
+        return json.loads(self._DECOMPRESS[codec_id](payload))
+
+    @staticmethod
+    def archive_folder(shard_id: int = None) -> Path:
+        folder = settings.LOGS_FOLDER / 'archive'
+        if shard_id is not None:
+            folder = settings.shard_file(folder, shard_id)
+        return folder
+
+    @classmethod
+    def all_archives(cls) -> List['OutputArchive']:
+        """
+        The archive of an unsharded daemon and those of every shard, for lookups from the command line
+        """
+        if not settings.LOGS_FOLDER.is_dir():
+            return []
+
+        return [cls(folder) for folder in sorted(settings.LOGS_FOLDER.glob('archive*')) if folder.is_dir()]
@@ -1,31 +1,53 @@
 import datetime
 import json
+import os
 import pickle
 import subprocess
+from collections import Counter, deque
 from pathlib import Path
 from threading import Thread
-from typing import List
+from typing import List, Set, Tuple
 
-from pycron import settings
+from pycron import clock, settings
+from pycron.jobs.dependencies import DependencyGraph
+from pycron.jobs.fair_share import fair_share, shares_limited
 from pycron.jobs.jobs import Job
+from pycron.jobs.packing import WindowPlanner
+from pycron.persistance.compact_store import CompactStoreCodec, StoreFormatError
+from pycron.persistance.output_archive import OutputArchive
+from pycron.tracing import tracer
 
 
 class MemStore:
     """
     Serves as a persistant store of job status data
 
-    Uses pickle to save the data to a file each time a job status method is called
+    Saves the data to a file each time a job status method is called, see CompactStoreCodec for the file format
     """
 
     JOB_FAILED = 45
     JOB_SUCCEEDED = 40
 
-    def __init__(self, nuke_persistence=False):
-        self.store = self.deserialize_store(nuke_persistence)
+    # Number of failures kept in memory for the control socket
+    RECENT_FAILURES = 100
+
+    def __init__(self, nuke_persistence=False, jobs: dict = None):
+        # Given jobs are kept in memory only, as the simulator does, otherwise they are loaded from the persistence file
+        # Folders paused through the control socket, jobs discovered in them later start paused too
+        self.store, self.paused_folders = self.deserialize_store(nuke_persistence) if jobs is None else (jobs, set())
+
+        self.recent_failures = deque(maxlen=self.RECENT_FAILURES)
+
+        self.output_archive = OutputArchive(OutputArchive.archive_folder(settings.SHARD_ID))
+
+        # Replaced by the job discovery every time it scans the jobs folder
+        self.dependencies = DependencyGraph()
 
     def fetch(self, script_path):
         if script_path in self.store:
-            return self.store[script_path]
+            job = self.store[script_path]
+            job.reload_schedule()
+            return job
 
         return self.create_new_job(script_path)
 
@@ -34,9 +56,50 @@ class MemStore:
 
     def create_new_job(self, script_path):
         new_job = Job(script_path)
+        new_job.paused = any(folder in new_job.relative_name.parents for folder in self.paused_folders)
         self.store[script_path] = new_job
         return new_job
 
+    def find(self, relative_name: str) -> Job:
+        return self.store.get(settings.script_path(relative_name))
+
+    def matching(self, target: str) -> List[Job]:
+        """
+        A single job, or every job in a folder, by its path relative to the jobs folder
+        """
+        job = self.find(target)
+        if job is not None:
+            return [job]
+
+        folder = Path(target)
+        return [job for job in self.store.values() if folder in job.relative_name.parents]
+
+    def set_paused(self, target: str, paused: bool) -> List[Job]:
+        """
+        Pause or resume a single job, or every job in a folder
+        """
+        jobs = self.matching(target)
+        if self.find(target) is None:
+            if paused:
+                self.paused_folders.add(Path(target))
+            else:
+                self.paused_folders.discard(Path(target))
+
+        for job in jobs:
+            job.paused = paused
+
+        return jobs
+
+    def reset_failures(self, target: str) -> List[Job]:
+        """
+        Forget the failures of a single job, or of every job in a folder, unparking them
+        """
+        jobs = [job for job in self.matching(target) if job.failed_attempts > 0]
+        for job in jobs:
+            job.reset_failures()
+
+        return jobs
+
     def check_for_non_existent_job(self, current_existing_scripts: List[Path]):
         """
         Purge any jobs that exist in the store but that have been removed from the script list.
@@ -46,6 +109,7 @@ class MemStore:
         """
         stored_job_keys = self.store.keys()
 
+        current_existing_scripts = set(current_existing_scripts)
         removed_jobs = [x for x in stored_job_keys if x not in current_existing_scripts]
 
         for job in removed_jobs:
@@ -55,32 +119,181 @@ class MemStore:
         self.trigger_threaded_write()
 
     def runnable(self):
-        now = datetime.datetime.now()
+        now = clock.now()
 
         # list of jobs that are unlocked and past the next runnable threshold
         # Locked jobs are the ones already targeted by a thread
-        runnable_jobs = [job for job in self.store.values() if job.next_execution < now and not job.locked]
+        runnable_jobs = [job for job in self.store.values()
+                         if not job.locked and not job.paused and self.is_due(job, now)]
+
+        return self.within_caps(self.prioritised(runnable_jobs))
+
+    def prioritised(self, jobs: List[Job]) -> List[Job]:
+        """
+        Most urgent priority class first, and within a class the job that has been due the longest. Jobs are started
+        and admitted into the concurrency limits in this order, so a critical job never waits behind a wave of low
+        priority ones.
+        """
+        if len(jobs) < 2:
+            return jobs
+        return sorted(jobs, key=lambda job: (job.priority_rank, self.due_time(job)))
+
+    def within_caps(self, jobs: List[Job]) -> List[Job]:
+        """
+        Leave out the jobs that would take a folder over the max_concurrency of its metadata, a job root over its max
+        running jobs or all roots over MAX_RUNNING_JOBS, they stay due. See fair_share for how roots share slots.
+        """
+        folder_caps = any(job.metadata.concurrency_group is not None for job in jobs)
+        if not jobs or not (folder_caps or shares_limited()):
+            return jobs
+
+        in_flight = self.in_flight()
+        if folder_caps:
+            jobs = self._within_folder_caps(jobs, in_flight)
+
+        return fair_share(jobs, Counter(job.root for job in in_flight))
+
+    @staticmethod
+    def _within_folder_caps(jobs: List[Job], in_flight: List[Job]) -> List[Job]:
+        running = Counter(job.metadata.concurrency_group for job in in_flight)
+
+        admitted = []
+        for job in jobs:
+            metadata = job.metadata
+            if metadata.concurrency_group is not None:
+                if running[metadata.concurrency_group] >= metadata.max_concurrency:
+                    continue
+                running[metadata.concurrency_group] += 1
+            admitted.append(job)
+
+        return admitted
+
+    def is_due(self, job: Job, now: datetime.datetime) -> bool:
+        dependencies = self.dependencies
+        if not dependencies.has_dependencies(job.script_path):
+            # Run at their exact slots by the executor's SecondTimer
+            if job.interval.timer_driven:
+                return False
+            return job.next_execution < now
+
+        if job.script_path in dependencies.held:
+            return False
+
+        # A failed run of a dependent job is retried like any other job
+        if job.failed_attempts > 0:
+            return job.next_execution < now
+
+        return self.dependencies_met(job)
+
+    def dependencies_met(self, job: Job) -> bool:
+        """
+        Every upstream job succeeded since this job last succeeded
+        """
+        for upstream_script in self.dependencies.upstream[job.script_path]:
+            upstream = self.store.get(upstream_script)
+            if upstream is None or upstream.last_success is None or upstream.failed_attempts > 0:
+                return False
+
+            if job.last_success is not None and upstream.last_success <= job.last_success:
+                return False
+
+        return True
+
+    def due_time(self, job: Job) -> datetime.datetime:
+        """
+        When the job became due, the latest upstream success for jobs with dependencies
+        """
+        if not self.dependencies.has_dependencies(job.script_path) or job.failed_attempts > 0:
+            return job.next_execution
+
+        upstream_runs = [self.store[script].last_success for script in self.dependencies.upstream[job.script_path]
+                         if script in self.store and self.store[script].last_success]
 
-        return runnable_jobs
+        # Started by hand through the control socket before its upstream jobs ever ran
+        return max(upstream_runs, default=clock.now())
 
-    def job_successful(self, job: Job, job_status):
-        job.success()
+    def ready_downstream(self, job: Job) -> List[Job]:
+        """
+        Jobs waiting on this one that can start now that it succeeded
+        """
+        now = clock.now()
+
+        ready = []
+        for script in self.dependencies.downstream.get(job.script_path, ()):
+            downstream = self.store.get(script)
+            if downstream is not None and not downstream.locked and not downstream.paused and self.is_due(downstream, now):
+                ready.append(downstream)
+
+        return self.within_caps(self.prioritised(ready))
+
+    def scheduled(self, job: Job) -> bool:
+        """
+        Whether the job runs on the interval of its folder rather than after other jobs
+        """
+        return not self.dependencies.has_dependencies(job.script_path)
+
+    def plan_windows(self, runtime=None) -> List[Job]:
+        """
+        Spread the jobs of within folders over their windows, see WindowPlanner
+
+        Triggered by the discovery module, runtime overrides the recorded runtimes as the simulator does
+        """
+        return WindowPlanner(runtime).plan(self.store.values(), clock.now(), self.scheduled)
+
+    def job_successful(self, job: Job, job_status, persist=True, finished_at: datetime.datetime = None):
+        job.success(finished_at)
+        job.record_run(job_status.returncode)
+        self._record_usage(job, job_status)
         self._log_job_status(job, job_status, False)
-        self.trigger_threaded_write()
-        # Update persistant store disk data
+        # Update persistant store disk data, batches write once for all the runs they record together
+        if persist:
+            self.trigger_threaded_write()
 
-    def job_failed(self, job: Job, job_status: subprocess.CompletedProcess):
-        job.fail()
+    def job_failed(self, job: Job, job_status: subprocess.CompletedProcess, persist=True,
+                   finished_at: datetime.datetime = None):
+        job.fail(finished_at)
+        job.record_run(job_status.returncode)
+        self._record_usage(job, job_status)
+        self.recent_failures.append({
+            'file': str(job.relative_name),
+            'run_uuid': str(job.run_uuid),
+            'status_code': job_status.returncode,
+            'failed_at': job.last_failed_execution.isoformat(),
+            'number_of_failed_attempts': job.failed_attempts,
+            'parked': job.parked,
+        })
+        if job.failed_attempts == settings.CIRCUIT_BREAKER_FAILURES:
+            settings.LOG.warning(f'{job.relative_name} failed {job.failed_attempts} times in a row, parking it until it '
+                                 f'succeeds on its normal interval or is reset')
         self._log_job_status(job, job_status, True)
-        self.trigger_threaded_write()
+        if persist:
+            self.trigger_threaded_write()
+
+    @staticmethod
+    def _record_usage(job: Job, job_status: subprocess.CompletedProcess):
+        # Runs re-adopted from a previous daemon or run in a batch were not reaped with their resource usage
+        usage = getattr(job_status, 'usage', None)
+        if usage is not None:
+            job.record_usage(usage)
 
     def _log_job_status(self, job: Job, job_status: subprocess.CompletedProcess, failed):
+        """
+        The full record, output included, goes to the output archive. The job status log only gets a summary that
+        refers to the archived run by its run uuid.
+        """
+        with tracer.span('log_job_status'):
+            self._write_job_status(job, job_status, failed)
+
+    def _write_job_status(self, job: Job, job_status: subprocess.CompletedProcess, failed):
+        output = job_status.stdout.decode('utf-8', errors='replace')
+        error = job_status.stderr.decode('utf-8', errors='replace')
+        usage = getattr(job_status, 'usage', None)
+        timed_out = getattr(job_status, 'timed_out', False)
         job_status = {
             'file': str(job.relative_name),
             'uuid': str(job.job_uuid),
+            'run_uuid': str(job.run_uuid),
             'status_code': job_status.returncode,
-            'output': job_status.stdout.decode('utf-8'),
-            'error': job_status.stderr.decode('utf-8'),
             'next_run': job.next_execution.isoformat(),
             'reason_for_run': job.run_reason.value,
             'number_of_failed_attempts': job.failed_attempts,
@@ -88,6 +301,15 @@ class MemStore:
             'ended_at': job.unlocked_at.isoformat(),
             'runtime': job.runtime
         }
+        if usage is not None:
+            job_status.update(usage)
+        if timed_out:
+            job_status['timed_out'] = True
+        self.output_archive.append(job.job_uuid, job.run_uuid, job.unlocked_at,
+                                   {**job_status, 'output': output, 'error': error})
+
+        job_status['output_bytes'] = len(output)
+        job_status['error_bytes'] = len(error)
         if failed:
             settings.LOG.log(self.JOB_FAILED, json.dumps(job_status, indent=True))
         else:
@@ -95,11 +317,14 @@ class MemStore:
 
     def next_runnable(self):
         """Debug feature to get the next runtime in minutes for each job"""
-        now = datetime.datetime.now()
+        now = clock.now()
         next_executions = {job.relative_name: f'{(job.next_execution - now).seconds}' for job in self.store.values()}
         settings.LOG.debug(f'Next runtimes: {next_executions}')
         # return [(next_exe - now).seconds for next_exe in next_executions]
 
+    def in_flight(self) -> List[Job]:
+        return [job for job in self.store.values() if job.locked]
+
     def trigger_threaded_write(self):
         """
         Runs the threaded job to write the store to a file
@@ -107,23 +332,75 @@ class MemStore:
         TODO make this a singleton thread and send the store to the thread for each write instead of spawning a new thread for each job result
         """
         settings.LOG.info('Writing store to file...')
-        write_thread = Thread(target=self.serialize_store, args=[self.store], name=f'log_writer')
-        write_thread.start()
-        write_thread.join()
+        with tracer.span('serialize_store', jobs=len(self.store)):
+            write_thread = Thread(target=self.serialize_store, args=[self.store, set(self.paused_folders)],
+                                  name=f'log_writer')
+            write_thread.start()
+            write_thread.join()
         settings.LOG.info('Finished storing.')
 
     @staticmethod
-    def serialize_store(store):
+    def serialize_store(store, paused_folders=()):
         """
         Writes store to persistence layer
+
+        Written to a temporary file first so a crash mid write never leaves a truncated store behind
+        """
+        temporary_file = settings.PERSISTENCE_FILE.with_name(f'{settings.PERSISTENCE_FILE.name}.tmp')
+        with open(temporary_file, 'wb') as cache:
+            CompactStoreCodec.dump(store, cache, paused_folders)
+        os.replace(temporary_file, settings.PERSISTENCE_FILE)
+
+    @staticmethod
+    def read_store_file(persistence_file: Path) -> dict:
+        """
+        Reads a store written in the compact format, or a plain pickle from older versions
+        """
+        return MemStore.read_store_state(persistence_file)[0]
+
+    @staticmethod
+    def read_store_state(persistence_file: Path) -> Tuple[dict, Set[Path]]:
+        """
+        The jobs and the paused folders of a store file, plain pickles from older versions have no paused folders
         """
-        with open(settings.PERSISTENCE_FILE, 'wb') as cache:
-            pickle.dump(store, cache)
+        with open(persistence_file, 'rb') as cache:
+            data = cache.read()
+
+        if CompactStoreCodec.is_compact(data):
+            return CompactStoreCodec.decode_state(data, settings.JOBS_FOLDER, settings.EXTRA_JOB_ROOTS)
+
+        return pickle.loads(data), set()
+
+    def adopt_jobs(self, persistence_file: Path, owns):
+        """
+        Take over the jobs of another shard's persistence file that this shard now owns.
+
+        Used after a rebalance so moved jobs keep their execution history.
+        """
+        if not persistence_file.is_file():
+            return
+
+        try:
+            other_store = self.read_store_file(persistence_file)
+        except (OSError, EOFError, pickle.UnpicklingError, StoreFormatError) as excp:
+            settings.LOG.warning(f'Unable to adopt jobs from {persistence_file}: {excp}')
+            return
+
+        adopted = 0
+        for script_path, job in other_store.items():
+            if script_path in self.store or not owns(script_path):
+                continue
+
+            job.unlock()
+            self.store[script_path] = job
+            adopted += 1
+
+        settings.LOG.info(f'Adopted {adopted} jobs from {persistence_file}')
 
     @staticmethod
-    def deserialize_store(nuke_persistence) -> dict:
+    def deserialize_store(nuke_persistence) -> Tuple[dict, Set[Path]]:
         """
-        Reads store from persistence layer
+        Reads store and paused folders from persistence layer
         """
 
         if nuke_persistence:
@@ -131,11 +408,14 @@ class MemStore:
             settings.PERSISTENCE_FILE.unlink(missing_ok=True)  # Delete persistence file to start fresh
 
         if not settings.PERSISTENCE_FILE.is_file():
-            return {}
-        with open(settings.PERSISTENCE_FILE, 'rb') as cache:
-            settings.LOG.info('Loading previous state from file...')
-            store = pickle.load(cache)
-            for job in store.values():
-                job.unlock()
-
-        return store
+            return {}, set()
+        settings.LOG.info('Loading previous state from file...')
+        store, paused_folders = MemStore.read_store_state(settings.PERSISTENCE_FILE)
+        for job in store.values():
+            # Runs handed off by the previous daemon stay locked until the executor re-adopts them, by pid or, for
+            # runs on worker agents which have none, by run uuid
+            if job.locked and job.run_uuid is not None:
+                continue
+            job.unlock()
+
+        return store, paused_folders
@@ -1,7 +1,11 @@
+import ipaddress
 import logging
 import os
+import re
+import sys
 from configparser import ConfigParser
 from pathlib import Path
+from typing import Dict, Tuple, Union
 
 """
     All modular settings available to pycron
@@ -9,6 +13,10 @@ from pathlib import Path
 
 SETTINGS_OBJ = None
 
+# JOBS_FOLDER is the job root of this name, the jobs of the other roots are named @<root>/<path in the root>
+DEFAULT_ROOT = 'default'
+ROOT_PREFIX = '@'
+
 
 class SettingsSingleton:
     """
@@ -28,6 +36,20 @@ class SettingsSingleton:
         return SETTINGS_OBJ
 
 
+class LazySettings:
+    """
+    Stands in for the settings object until an attribute is first used.
+
+    Importing pycron then does not parse the config file, which keeps short lived management commands fast.
+    """
+
+    def __getattr__(self, name):
+        return getattr(SettingsSingleton.get_settings(), name)
+
+    def __setattr__(self, name, value):
+        setattr(SettingsSingleton.get_settings(), name, value)
+
+
 class _Settings:
     """
     Do not import directly. Use singleton class to retrieve the single instance of settings
@@ -41,10 +63,48 @@ class _Settings:
         self.SLEEP_DURATION = None
         self.CHECK_FOR_NEW_JOBS_EVERY = None
         self.JOB_FAIL_TIMEOUT_PERIOD_MINUTES = None
+        self.DRAIN_TIMEOUT_SECONDS = None
+        self.RETRY_BACKOFF_MULTIPLIER = None
+        self.RETRY_MAX_DELAY_MINUTES = None
+        self.RETRY_JITTER = None
+        self.RETRY_MAX_ATTEMPTS = None
+        self.CIRCUIT_BREAKER_FAILURES = None
         self.JOBS_FOLDER = None
         self.LOGS_FOLDER = None
         self.PERSISTENCE_FILE = None
+        self.CONTROL_SOCKET = None
         self.LOG_LEVEL = None
+        self.RUN_HISTORY_LENGTH = None
+        self.ARCHIVE_COMPRESSION = None
+        self.ARCHIVE_MAX_SIZE_MB = None
+        self.ARCHIVE_MAX_AGE_DAYS = None
+        self.BATCH_FOLDERS = None
+        self.BATCH_MAX_JOBS = None
+        self.TRACE_SAMPLE_RATE = None
+        self.TRACE_MAX_SIZE_MB = None
+        self.TICK_BUDGET_SECONDS = None
+        self.CATCH_UP_RATE = None
+        self.CATCH_UP_BURST = None
+        self.EXTRA_JOB_ROOTS = None
+        self.ROOT_SHARES = None
+        self.MAX_RUNNING_JOBS = None
+        self.SHARD_COUNT = None
+        self.SHARD_MAX_RESTARTS = None
+        self.SHARD_REJOIN_AFTER_MINUTES = None
+        self.AGENT_ADDRESS = None
+        self.AGENT_TOKEN = None
+        self.AGENT_SLOTS = None
+        self.AGENT_LOST_SECONDS = None
+        self.RESULT_HANDLERS = None
+        self.RESULT_QUEUE_SIZE = None
+        self.RESULT_DROP_POLICY = None
+        self.RESULT_WORKERS = None
+        self.RESULT_WEBHOOK_URL = None
+
+        # Set by the shard supervisor in each shard process, never read from the config file
+        self.SHARD_ID = None
+        self.SHARD_MEMBERSHIP = None
+        self.SHARDED_PERSISTENCE_FILE = None
 
         self.loaded_file = None
 
@@ -65,6 +125,25 @@ class _Settings:
         # If a job fails, retry in x minutes
         self.JOB_FAIL_TIMEOUT_PERIOD_MINUTES = int(ini_parser['Timings'].get('JOB_FAIL_TIMEOUT_PERIOD_MINUTES', '2'))
 
+        # On shutdown wait up to x seconds for running jobs before handing them off to the next daemon
+        self.DRAIN_TIMEOUT_SECONDS = int(ini_parser['Timings'].get('DRAIN_TIMEOUT_SECONDS', '30'))
+
+        retry = self._optional_section(ini_parser, 'Retry')
+
+        # each consecutive failure multiplies the retry delay by x, up to x minutes
+        self.RETRY_BACKOFF_MULTIPLIER = float(retry.get('RETRY_BACKOFF_MULTIPLIER', '1'))
+        self.RETRY_MAX_DELAY_MINUTES = float(retry.get('RETRY_MAX_DELAY_MINUTES', '60'))
+
+        # spread retries by +/- x (fraction of the delay) so failing jobs do not retry in lockstep
+        self.RETRY_JITTER = float(retry.get('RETRY_JITTER', '0'))
+        assert 0 <= self.RETRY_JITTER < 1, f'RETRY_JITTER must be between 0 and 1, not {self.RETRY_JITTER}'
+
+        # stop retrying early after x consecutive failures and wait for the normal interval, 0 retries forever
+        self.RETRY_MAX_ATTEMPTS = int(retry.get('RETRY_MAX_ATTEMPTS', '0'))
+
+        # park a job after x consecutive failures until it succeeds on its normal interval or is reset, 0 to disable
+        self.CIRCUIT_BREAKER_FAILURES = int(retry.get('CIRCUIT_BREAKER_FAILURES', '0'))
+
         # read and write
         self.JOBS_FOLDER = Path(ini_parser['Folders'].get('JOBS_FOLDER', '/etc/pycron/jobs')).absolute()
 
@@ -72,17 +151,186 @@ class _Settings:
 
         self.PERSISTENCE_FILE = Path(ini_parser['Folders'].get('PERSISTENCE_FILE', 'persistence.pickle')).absolute()
 
+        # unix socket used to query and control the running daemon, left empty to disable it
+        control_socket = ini_parser['Folders'].get('CONTROL_SOCKET', '')
+        self.CONTROL_SOCKET = Path(control_socket).absolute() if control_socket else None
+
         self.LOG_LEVEL = ini_parser['Logging'].get('LOG_LEVEL', 'NOTSET')
 
+        history = self._optional_section(ini_parser, 'History')
+
+        # number of recent runs kept per job for duration percentiles and history exports
+        self.RUN_HISTORY_LENGTH = int(history.get('RUN_HISTORY_LENGTH', '20'))
+
+        archive = self._optional_section(ini_parser, 'Archive')
+
+        # compression of archived run output, zlib or lzma (smaller, slower)
+        self.ARCHIVE_COMPRESSION = archive.get('ARCHIVE_COMPRESSION', 'zlib')
+        assert self.ARCHIVE_COMPRESSION in ('zlib', 'lzma'), f'Unknown ARCHIVE_COMPRESSION {self.ARCHIVE_COMPRESSION}'
+
+        # oldest archived output is removed once the archive is larger than x megabytes or older than x days
+        self.ARCHIVE_MAX_SIZE_MB = int(archive.get('ARCHIVE_MAX_SIZE_MB', '1024'))
+        self.ARCHIVE_MAX_AGE_DAYS = int(archive.get('ARCHIVE_MAX_AGE_DAYS', '30'))
+
+        batching = self._optional_section(ini_parser, 'Batching')
+
+        # comma separated folders, e.g. `1min, 5min/at0002`, whose jobs due in the same tick run back to back in one
+        # shell instead of a process, thread and store write each. Meant for many scripts that take well under a second
+        batch_folders = batching.get('BATCH_FOLDERS', '').split(',')
+        self.BATCH_FOLDERS = tuple(Path(folder.strip().strip('/')) for folder in batch_folders if folder.strip())
+
+        # at most x jobs per batch, the rest of the folder goes in further batches running alongside
+        self.BATCH_MAX_JOBS = int(batching.get('BATCH_MAX_JOBS', '50'))
+        assert self.BATCH_MAX_JOBS > 0, f'BATCH_MAX_JOBS must be at least 1, not {self.BATCH_MAX_JOBS}'
+
+        tracing = self._optional_section(ini_parser, 'Tracing')
+
+        # fraction of runs whose lifecycle spans are written to <logs folder>/trace.jsonl, 0 disables tracing
+        self.TRACE_SAMPLE_RATE = float(tracing.get('TRACE_SAMPLE_RATE', '0'))
+        assert 0 <= self.TRACE_SAMPLE_RATE <= 1, f'TRACE_SAMPLE_RATE must be between 0 and 1, not {self.TRACE_SAMPLE_RATE}'
+
+        # the trace file is rotated once larger than x megabytes, one rotated file is kept
+        self.TRACE_MAX_SIZE_MB = int(tracing.get('TRACE_MAX_SIZE_MB', '100'))
+
+        watchdog = self._optional_section(ini_parser, 'Watchdog')
+
+        # seconds one iteration of the scheduler loop may spend on work besides its sleep before it is reported with
+        # the time of each phase and a stack sample, 0 disables the watchdog
+        self.TICK_BUDGET_SECONDS = float(watchdog.get('TICK_BUDGET_SECONDS', '5'))
+        assert self.TICK_BUDGET_SECONDS >= 0, f'TICK_BUDGET_SECONDS must not be negative, not {self.TICK_BUDGET_SECONDS}'
+
+        catch_up = self._optional_section(ini_parser, 'CatchUp')
+
+        # jobs that came due while PyCron was not running are started at most x a second, most urgent and longest
+        # overdue first, after a first burst of x jobs. A rate of 0 starts them all in the first tick
+        self.CATCH_UP_RATE = float(catch_up.get('CATCH_UP_RATE', '10'))
+        assert self.CATCH_UP_RATE >= 0, f'CATCH_UP_RATE must not be negative, not {self.CATCH_UP_RATE}'
+        self.CATCH_UP_BURST = int(catch_up.get('CATCH_UP_BURST', '50'))
+        assert self.CATCH_UP_BURST > 0, f'CATCH_UP_BURST must be at least 1, not {self.CATCH_UP_BURST}'
+
+        # extra folders of jobs scheduled next to JOBS_FOLDER, one per line: <name> = <folder>[, <weight>[, <max running>]]
+        roots = self._optional_section(ini_parser, 'Roots')
+        fair_share = self._optional_section(ini_parser, 'FairShare')
+
+        # at most x jobs of all roots run at once, 0 for no limit. When jobs have to wait, every root gets slots in
+        # proportion to its weight
+        self.MAX_RUNNING_JOBS = int(fair_share.get('MAX_RUNNING_JOBS', '0'))
+
+        # root name -> (weight, at most x of its jobs running at once or 0 for no limit)
+        self.ROOT_SHARES = {DEFAULT_ROOT: (float(fair_share.get('DEFAULT_ROOT_WEIGHT', '1')),
+                                           int(fair_share.get('DEFAULT_ROOT_MAX_RUNNING', '0')))}
+        self.EXTRA_JOB_ROOTS = {}
+        for name, value in roots.items():
+            assert re.fullmatch(r'[\w-]+', name) and name != DEFAULT_ROOT, f'Invalid job root name {name}'
+            folder, weight, max_running = ([part.strip() for part in value.split(',')] + ['1', '0'])[:3]
+            self.EXTRA_JOB_ROOTS[name] = Path(folder).absolute()
+            self.ROOT_SHARES[name] = (float(weight), int(max_running))
+
+        for name, (weight, max_running) in self.ROOT_SHARES.items():
+            assert weight > 0 and max_running >= 0, f'Invalid weight or max running jobs for the {name} job root'
+
+        sharding = self._optional_section(ini_parser, 'Sharding')
+
+        # number of scheduler processes sharing the jobs folder
+        self.SHARD_COUNT = int(sharding.get('SHARD_COUNT', '1'))
+
+        # a shard restarting more than x times in 10 minutes is dropped and its jobs rebalanced
+        self.SHARD_MAX_RESTARTS = int(sharding.get('SHARD_MAX_RESTARTS', '5'))
+
+        # a dropped shard is given another chance after x minutes
+        self.SHARD_REJOIN_AFTER_MINUTES = int(sharding.get('SHARD_REJOIN_AFTER_MINUTES', '10'))
+
+        agents = self._optional_section(ini_parser, 'Agents')
+
+        # unix socket, or <host>:<port>, the daemon hands runs to worker agents on. Empty runs them in the daemon itself
+        self.AGENT_ADDRESS = self.agent_address(agents.get('AGENT_ADDRESS', ''))
+
+        # shared secret agents present when they connect, required when AGENT_ADDRESS is reachable from other hosts
+        self.AGENT_TOKEN = agents.get('AGENT_TOKEN', '').strip()
+        assert self.AGENT_TOKEN or not self.agent_address_exposed(self.AGENT_ADDRESS), \
+            f'AGENT_ADDRESS {self.AGENT_ADDRESS[0]}:{self.AGENT_ADDRESS[1]} accepts other hosts, set AGENT_TOKEN'
+
+        # runs a worker agent started with `pycron agent` takes on at once
+        self.AGENT_SLOTS = int(agents.get('AGENT_SLOTS', '8'))
+        assert self.AGENT_SLOTS > 0, f'AGENT_SLOTS must be at least 1, not {self.AGENT_SLOTS}'
+
+        # runs of an agent that disconnected are rerun unless it reconnects within x seconds
+        self.AGENT_LOST_SECONDS = int(agents.get('AGENT_LOST_SECONDS', '300'))
+
+        result_handlers = self._optional_section(ini_parser, 'ResultHandlers')
+
+        # comma separated <module>:<class> handlers given every finished run on background threads, e.g.
+        # pycron.executor.result_handlers:FailureWebhook. Empty hands results to no one
+        handlers = result_handlers.get('RESULT_HANDLERS', '').split(',')
+        self.RESULT_HANDLERS = tuple(handler.strip() for handler in handlers if handler.strip())
+        for handler in self.RESULT_HANDLERS:
+            assert re.fullmatch(r'[\w.]+:\w+', handler), f'Result handlers are given as <module>:<class>, not {handler}'
+
+        # at most x runs wait for the handlers, once full the newest or the oldest waiting run is dropped
+        self.RESULT_QUEUE_SIZE = int(result_handlers.get('RESULT_QUEUE_SIZE', '1000'))
+        assert self.RESULT_QUEUE_SIZE > 0, f'RESULT_QUEUE_SIZE must be at least 1, not {self.RESULT_QUEUE_SIZE}'
+        self.RESULT_DROP_POLICY = result_handlers.get('RESULT_DROP_POLICY', 'newest')
+        assert self.RESULT_DROP_POLICY in ('newest', 'oldest'), f'Unknown RESULT_DROP_POLICY {self.RESULT_DROP_POLICY}'
+
+        # threads running the handlers
+        self.RESULT_WORKERS = int(result_handlers.get('RESULT_WORKERS', '2'))
+        assert self.RESULT_WORKERS > 0, f'RESULT_WORKERS must be at least 1, not {self.RESULT_WORKERS}'
+
+        # url the FailureWebhook handler posts failed runs to
+        self.RESULT_WEBHOOK_URL = result_handlers.get('RESULT_WEBHOOK_URL', '')
+
         self.loaded_file = ini_file
 
+    @staticmethod
+    def _optional_section(ini_parser: ConfigParser, section: str):
+        """
+        Sections added after the original config layout may be missing from older config files
+        """
+        if ini_parser.has_section(section):
+            return ini_parser[section]
+
+        return {}
+
     def reload_config_from_file(self, file_path: str):
         ini_file = Path(file_path).absolute()
         assert ini_file.is_file(), f'{ini_file} does not exist'
 
-        print(f'Loaded config from file: {ini_file}')
+        # stderr, management commands print data to stdout
+        print(f'Loaded config from file: {ini_file}', file=sys.stderr)
         self.load_config_params(ini_file)
 
+    @property
+    def JOB_ROOTS(self) -> Dict[str, Path]:
+        return {DEFAULT_ROOT: self.JOBS_FOLDER, **self.EXTRA_JOB_ROOTS}
+
+    def root_of(self, path: Path) -> Tuple[str, Path]:
+        """
+        Name and folder of the job root a path is in, extra roots win over the JOBS_FOLDER they may be nested in
+        """
+        for name, folder in self.EXTRA_JOB_ROOTS.items():
+            if folder == path or folder in path.parents:
+                return name, folder
+
+        return DEFAULT_ROOT, self.JOBS_FOLDER
+
+    def relative_name(self, path: Path) -> Path:
+        """
+        Name of a script or folder across job roots, e.g. `1hour/report.sh` or `@team_a/1hour/report.sh`
+        """
+        name, folder = self.root_of(path)
+        relative = path.relative_to(folder)
+        return relative if name == DEFAULT_ROOT else Path(f'{ROOT_PREFIX}{name}') / relative
+
+    def script_path(self, relative_name) -> Path:
+        """
+        Absolute path of a name given by relative_name
+        """
+        parts = Path(relative_name).parts
+        if parts and parts[0].startswith(ROOT_PREFIX) and parts[0][1:] in self.EXTRA_JOB_ROOTS:
+            return self.EXTRA_JOB_ROOTS[parts[0][1:]].joinpath(*parts[1:])
+
+        return self.JOBS_FOLDER / relative_name
+
     def set_jobs_folder(self, folder: str):
         job_path = Path(folder).absolute()
         assert job_path.is_dir(), f'{job_path} does not exist'
@@ -101,9 +349,77 @@ class _Settings:
 
         self.PERSISTENCE_FILE = job_path
 
+    def set_shard_count(self, shard_count: int):
+        assert shard_count >= 1, f'{shard_count} is not a valid number of shards'
+
+        self.SHARD_COUNT = shard_count
+
+    def set_shard(self, shard_id: int, membership):
+        """
+        Turn this process into one shard of a sharded scheduler.
+
+        The persistence file and job status log get a per shard name so shards never write to the same file.
+        """
+        self.SHARD_ID = shard_id
+        self.SHARD_MEMBERSHIP = membership
+        self.SHARDED_PERSISTENCE_FILE = self.PERSISTENCE_FILE
+        self.PERSISTENCE_FILE = self.shard_file(self.PERSISTENCE_FILE, shard_id)
+        if self.CONTROL_SOCKET:
+            self.CONTROL_SOCKET = self.shard_file(self.CONTROL_SOCKET, shard_id)
+
+    @property
+    def sharded(self) -> bool:
+        return self.SHARD_ID is not None
+
+    @staticmethod
+    def shard_file(path: Path, shard_id: int) -> Path:
+        return path.with_name(f'{path.stem}.shard{shard_id}{path.suffix}')
+
+    @staticmethod
+    def agent_address(value: str) -> Union[Path, Tuple[str, int], None]:
+        """
+        (host, port) for `<host>:<port>`, otherwise the path of a unix socket
+        """
+        value = value.strip()
+        if not value:
+            return None
+
+        tcp = re.fullmatch(r'([\w.-]+):(\d+)', value)
+        if tcp:
+            return tcp.group(1), int(tcp.group(2))
+        return Path(value).absolute()
+
+    @staticmethod
+    def agent_address_exposed(address) -> bool:
+        """
+        Whether other hosts can connect to the address: a TCP address not bound to the loopback interface
+        """
+        if not isinstance(address, tuple):
+            return False
+
+        host = address[0]
+        if host == 'localhost':
+            return False
+        try:
+            return not ipaddress.ip_address(host).is_loopback
+        except ValueError:
+            # A host name, resolved to an interface other hosts may reach
+            return True
+
+    def set_control_socket(self, file: str):
+        socket_path = Path(file).absolute()
+        assert socket_path.parent.is_dir(), f'{socket_path.parent} does not exist'
+
+        self.CONTROL_SOCKET = socket_path
+
+    # Settings never printed
+    SECRETS = ('AGENT_TOKEN',)
+
     def summaries_settings(self):
         params = vars(self)
 
         for k, v in params.items():
+            if k in self.SECRETS and v:
+                v = '<set>'
             print(f'{k:35} ==> {v}')
             # Pad the key value up to 35 chars long
@@ -0,0 +1,54 @@
+from bisect import bisect
+from hashlib import md5
+from pathlib import Path
+from typing import Iterable, List
+
+from pycron import settings
+
+
+class HashRing:
+    """
+    Consistent hash ring mapping job names onto scheduler shards
+
+    Each shard is placed on the ring `replicas` times so jobs spread evenly. Removing a shard only moves the jobs that
+    shard owned, every other job keeps its owner. md5 is used rather than `hash()` so every process agrees on the ring.
+    """
+
+    def __init__(self, shards: Iterable[int], replicas: int = 64):
+        self.shards = sorted(set(shards))
+        self.replicas = replicas
+
+        points = sorted(
+            (self._hash(f'shard-{shard}-{replica}'), shard)
+            for shard in self.shards
+            for replica in range(replicas)
+        )
+        self._keys: List[int] = [point for point, _ in points]
+        self._owners: List[int] = [shard for _, shard in points]
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(md5(key.encode('utf-8')).digest()[:8], 'big')
+
+    def owner(self, key: str) -> int:
+        """
+        Shard responsible for the key
+        """
+        if not self._keys:
+            raise LookupError('Hash ring has no shards')
+
+        index = bisect(self._keys, self._hash(key)) % len(self._keys)
+        return self._owners[index]
+
+    def owns(self, shard: int, key: str) -> bool:
+        return self.owner(key) == shard
+
+    def __len__(self):
+        return len(self.shards)
+
+
+def shard_key(script_path: Path) -> str:
+    """
+    Jobs are placed on the ring by their path relative to the jobs folder so every shard agrees on the owner
+    """
+    return str(settings.relative_name(script_path))
@@ -0,0 +1,168 @@
+import multiprocessing
+import signal
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from time import sleep
+from typing import Dict, List, Tuple
+
+from pycron import settings
+from pycron.sharding.hash_ring import HashRing
+
+
+class ShardMembership:
+    """
+    Which shards are currently part of the hash ring
+
+    Backed by a shared array so the supervisor can drop and re-add shards while the shard processes are running. Each
+    shard process rebuilds its ring lazily when the membership changes.
+    """
+
+    def __init__(self, shard_count: int, context=multiprocessing):
+        self._alive = context.Array('b', [1] * shard_count)
+
+        # Per process cache, rebuilt on demand
+        self._members: Tuple[int, ...] = ()
+        self._ring: HashRing = None
+
+    def set_member(self, shard_id: int, member: bool):
+        with self._alive.get_lock():
+            self._alive[shard_id] = 1 if member else 0
+
+    def members(self) -> Tuple[int, ...]:
+        with self._alive.get_lock():
+            return tuple(shard_id for shard_id, alive in enumerate(self._alive) if alive)
+
+    def changed(self) -> bool:
+        return self._ring is None or self.members() != self._members
+
+    def refresh(self) -> Tuple[HashRing, List[int]]:
+        """
+        Returns the current ring and the shards that left it since the last refresh
+        """
+        members = self.members()
+        departed = [shard_id for shard_id in self._members if shard_id not in members]
+
+        if self._ring is None or members != self._members:
+            self._ring = HashRing(members)
+            self._members = members
+
+        return self._ring, departed
+
+
+def run_shard(shard_id: int, membership: ShardMembership, nuke_persistence: bool):
+    """
+    Entry point of a shard process
+    """
+    from pycron.coordinator import MainThread
+
+    # The supervisor's handlers are inherited through fork
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    settings.set_shard(shard_id, membership)
+    main_thread = MainThread(nuke_persistence=nuke_persistence)
+    main_thread.run()
+
+
+class ShardSupervisor:
+    """
+    Runs SHARD_COUNT scheduler processes over one jobs folder
+
+    Purpose: Keep every shard alive
+
+            A shard that dies is restarted. A shard that keeps dying is dropped from the ring, its jobs move to the
+            surviving shards, and it is given another chance after SHARD_REJOIN_AFTER_MINUTES.
+    """
+    CHECK_EVERY = 1  # seconds
+    RESTART_WINDOW = timedelta(minutes=10)
+
+    def __init__(self, nuke_persistence):
+        self.shard_count = settings.SHARD_COUNT
+        self.nuke_persistence = nuke_persistence
+
+        jobs_folder = Path(settings.JOBS_FOLDER).absolute()
+        if not jobs_folder.is_dir():
+            raise NotADirectoryError(f'{jobs_folder} is not a directory!')
+
+        self.context = multiprocessing.get_context('fork')
+        self.membership = ShardMembership(self.shard_count, self.context)
+
+        self.processes: Dict[int, multiprocessing.Process] = {}
+        self.restarts: Dict[int, List[datetime]] = defaultdict(list)
+        self.dropped_at: Dict[int, datetime] = {}
+
+        self.running = False
+
+    def start_shard(self, shard_id: int, nuke_persistence=False):
+        process = self.context.Process(target=run_shard,
+                                       args=(shard_id, self.membership, nuke_persistence),
+                                       name=f'pycron-shard{shard_id}')
+        process.start()
+        self.processes[shard_id] = process
+        settings.LOG.info(f'Started shard {shard_id} (pid {process.pid})')
+
+    def check_shards(self):
+        now = datetime.now()
+
+        for shard_id, process in list(self.processes.items()):
+            if process.is_alive():
+                continue
+
+            del self.processes[shard_id]
+            settings.LOG.warning(f'Shard {shard_id} exited with code {process.exitcode}')
+
+            recent_restarts = [at for at in self.restarts[shard_id] if now - at < self.RESTART_WINDOW]
+            self.restarts[shard_id] = recent_restarts
+
+            # Never drop the last shard, there would be nobody left to run the jobs
+            if len(recent_restarts) >= settings.SHARD_MAX_RESTARTS and len(self.membership.members()) > 1:
+                self.drop_shard(shard_id, now)
+            else:
+                recent_restarts.append(now)
+                self.start_shard(shard_id)
+
+        rejoin_after = timedelta(minutes=settings.SHARD_REJOIN_AFTER_MINUTES)
+        for shard_id, dropped_at in list(self.dropped_at.items()):
+            if now - dropped_at > rejoin_after:
+                self.rejoin_shard(shard_id)
+
+    def drop_shard(self, shard_id: int, now: datetime):
+        settings.LOG.warning(f'Shard {shard_id} restarted too often, rebalancing its jobs onto the other shards')
+        self.membership.set_member(shard_id, False)
+        self.dropped_at[shard_id] = now
+
+    def rejoin_shard(self, shard_id: int):
+        settings.LOG.info(f'Shard {shard_id} is rejoining the ring')
+        del self.dropped_at[shard_id]
+        self.restarts[shard_id] = []
+        self.membership.set_member(shard_id, True)
+        self.start_shard(shard_id)
+
+    def stop(self, *_):
+        self.running = False
+
+    def shutdown(self):
+        for process in self.processes.values():
+            process.terminate()
+
+        for shard_id, process in self.processes.items():
+            process.join(timeout=settings.DRAIN_TIMEOUT_SECONDS + 5)
+            settings.LOG.info(f'Shard {shard_id} stopped')
+
+    def run(self):
+        settings.LOG.info(f'--- Starting {self.shard_count} shards ---')
+
+        signal.signal(signal.SIGTERM, self.stop)
+
+        for shard_id in range(self.shard_count):
+            self.start_shard(shard_id, self.nuke_persistence)
+
+        self.running = True
+        try:
+            while self.running:
+                self.check_shards()
+                sleep(self.CHECK_EVERY)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.shutdown()
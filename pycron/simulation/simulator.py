@@ -0,0 +1,271 @@
+import heapq
+from collections import Counter
+from datetime import datetime, timedelta
+from itertools import count
+from math import ceil, floor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pycron import settings
+from pycron.clock import VirtualClock, virtual_clock
+from pycron.jobs.jobs import Job
+
+
+class SimulationReport:
+    """
+    What the executor would have done: starts and concurrency per minute, and how late runs started
+    """
+
+    def __init__(self, start: datetime, until: datetime):
+        self.start = start
+        self.until = until
+
+        self.runs = 0
+        # minute since the start -> runs started in it / most jobs running at once in it / latest start in it
+        self.starts_per_minute: Counter = Counter()
+        self.concurrency_per_minute: Dict[int, int] = {}
+        self.max_lag_per_minute: Dict[int, float] = {}
+
+        # Seconds between when each run was due and when it started
+        self.lags: List[float] = []
+        self.worst_lag: Tuple[float, str, datetime] = (0, None, None)
+        self.peak_concurrency: Tuple[int, datetime] = (0, None)
+
+    def minute(self, index: int) -> datetime:
+        return self.start + timedelta(minutes=index)
+
+    def per_minute(self) -> Iterable[dict]:
+        for index in sorted(self.starts_per_minute.keys() | self.concurrency_per_minute.keys()):
+            yield {
+                'minute': self.minute(index).isoformat(),
+                'starts': self.starts_per_minute[index],
+                'concurrency': self.concurrency_per_minute.get(index, 0),
+                'max_lag_seconds': round(self.max_lag_per_minute.get(index, 0), 3),
+            }
+
+    def percentile(self, percent: int) -> float:
+        if not self.lags:
+            return 0
+        ordered = sorted(self.lags)
+        return ordered[max(ceil(percent / 100 * len(ordered)), 1) - 1]
+
+    def summary(self, busiest: int = 10) -> List[str]:
+        peak, peak_at = self.peak_concurrency
+        worst_lag, worst_job, worst_at = self.worst_lag
+        lines = [
+            f'Simulated {self.start:%Y-%m-%d %H:%M} to {self.until:%Y-%m-%d %H:%M}: {self.runs} runs',
+            f'Peak concurrency:  {peak}' + (f' at {peak_at:%Y-%m-%d %H:%M:%S}' if peak_at else ''),
+            f'Start lag:         p50 {self.percentile(50):.1f} s, p95 {self.percentile(95):.1f} s, '
+            f'max {worst_lag:.1f} s' + (f' ({worst_job} at {worst_at:%Y-%m-%d %H:%M:%S})' if worst_job else ''),
+            f'Busiest minutes:',
+        ]
+
+        busiest_minutes = sorted(self.concurrency_per_minute.items(), key=lambda item: (-item[1], item[0]))[:busiest]
+        for index, concurrency in sorted(busiest_minutes):
+            lines.append(f'    {self.minute(index):%Y-%m-%d %H:%M}  {self.starts_per_minute[index]:6} starts  '
+                         f'{concurrency:6} running')
+
+        return lines
+
+
+class Simulator:
+    """
+    Replays the schedule of a store on a virtual clock
+
+    Purpose: Answer capacity questions, e.g. peak concurrency once 300 more nightly jobs are added, without deploying
+
+            The store's own due checks, job locking, retries and dependencies decide what runs, exactly as in the
+            executor: scheduled jobs are admitted on the loop's ticks, jobs with second intervals on their slots and
+            downstream jobs as soon as their upstream jobs succeed. Runs take their modelled duration and succeed.
+
+            Due jobs go through the store's concurrency limits in priority order. Jobs held back wait, and are tried
+            again on the first tick after a run finishes, so their start lag includes the time spent queueing.
+
+            Rather than stepping through every tick the clock jumps from event to event, so a week of a large tree is
+            simulated in seconds.
+    """
+
+    ADMIT, SLOT, FINISH, WAKE = 0, 1, 2, 3
+
+    def __init__(self, store, durations: Dict[Path, float], start: datetime, tick: float = None):
+        self.store = store
+        self.durations = durations
+        self.start = start
+        self.tick = tick or settings.SLEEP_DURATION
+        self.clock = VirtualClock(start)
+
+        self.events: List[Tuple[float, int, int, Optional[Job]]] = []
+        self._sequence = count()
+        self.running = 0
+        # script path -> due job held back by the concurrency limits, with the slot it is due in if timer driven
+        self.waiting: Dict[Path, Tuple[Job, Optional[datetime]]] = {}
+        self._wake_at: Optional[float] = None
+        self.report: SimulationReport = None
+
+        self._last_minute = 0
+
+    # --- time ---
+
+    def _seconds(self, moment: datetime) -> float:
+        return (moment - self.start).total_seconds()
+
+    def _next_tick(self, due: datetime) -> float:
+        """
+        First tick of the executor loop that sees the job as due, runnable() needs next_execution < now
+        """
+        due_at = self._seconds(due)
+        first_tick_after_due = (floor(due_at / self.tick) + 1) * self.tick
+        current_tick = ceil(self._seconds(self.clock.now()) / self.tick) * self.tick
+        return max(first_tick_after_due, current_tick)
+
+    def _push(self, at: float, kind: int, job: Optional[Job]):
+        heapq.heappush(self.events, (at, next(self._sequence), kind, job))
+
+    # --- scheduling, mirrors FolderExecutor and SecondTimer ---
+
+    def _schedule(self, job: Job):
+        if job.paused:
+            return
+
+        dependencies = self.store.dependencies
+        if dependencies.has_dependencies(job.script_path):
+            # Started by their upstream jobs, only failed runs come back on their own
+            if job.failed_attempts == 0 or job.script_path in dependencies.held:
+                return
+        elif job.interval.timer_driven:
+            self._push(self._seconds(job.interval.next_time(self.clock.now())), self.SLOT, job)
+            return
+
+        self._push(self._next_tick(job.next_execution), self.ADMIT, job)
+
+    def _start(self, job: Job, due: datetime = None):
+        job.lock(due or self.store.due_time(job))
+        self.running += 1
+
+        report = self.report
+        minute = int(self._seconds(self.clock.now()) // 60)
+        lag = job.start_lag
+        report.runs += 1
+        report.starts_per_minute[minute] += 1
+        report.lags.append(lag)
+        report.max_lag_per_minute[minute] = max(report.max_lag_per_minute.get(minute, 0), lag)
+        if lag > report.worst_lag[0]:
+            report.worst_lag = (lag, str(job.relative_name), self.clock.now())
+        if self.running > report.peak_concurrency[0]:
+            report.peak_concurrency = (self.running, self.clock.now())
+        report.concurrency_per_minute[minute] = max(report.concurrency_per_minute.get(minute, 0), self.running)
+
+        self._push(self._seconds(self.clock.now()) + self.durations[job.script_path], self.FINISH, job)
+
+    def _admit(self):
+        """
+        Start the waiting jobs within the concurrency limits, most urgent first
+        """
+        candidates = [job for job, _ in self.waiting.values()]
+        for job in self.store.within_caps(self.store.prioritised(candidates)):
+            _, due = self.waiting.pop(job.script_path)
+            self._start(job, due)
+
+    def _finish(self, job: Job):
+        job.success()
+        self.running -= 1
+
+        for downstream in self.store.ready_downstream(job):
+            self._start(downstream)
+
+        # Held back by the limits, the loop starts them once there is room
+        now = self.clock.now()
+        for script in self.store.dependencies.downstream.get(job.script_path, ()):
+            downstream = self.store.store.get(script)
+            if (downstream is not None and not downstream.locked and not downstream.paused
+                    and self.store.is_due(downstream, now)):
+                self.waiting[script] = (downstream, None)
+
+        if not job.interval.timer_driven or self.store.dependencies.has_dependencies(job.script_path):
+            self._schedule(job)
+
+        if self.waiting:
+            wake_at = (floor(self._seconds(now) / self.tick) + 1) * self.tick
+            if self._wake_at != wake_at:
+                self._wake_at = wake_at
+                self._push(wake_at, self.WAKE, None)
+
+    def _carry_concurrency(self, minute: int):
+        """
+        Minutes without any start still have the jobs started earlier running
+        """
+        if self.running:
+            concurrency = self.report.concurrency_per_minute
+            for quiet_minute in range(self._last_minute + 1, minute + 1):
+                concurrency[quiet_minute] = max(concurrency.get(quiet_minute, 0), self.running)
+        self._last_minute = minute
+
+    def run(self, until: datetime) -> SimulationReport:
+        self.report = SimulationReport(self.start, until)
+        end = self._seconds(until)
+
+        with virtual_clock(self.clock):
+            for job in self.store.store.values():
+                # Runs in flight in the persisted state have no modelled end, start the simulation without them
+                if job.locked:
+                    job.unlock()
+
+            # Jobs with a tolerance window are planned on their modelled durations
+            self.store.plan_windows(lambda job: self.durations.get(job.script_path))
+            for job in self.store.store.values():
+                self._schedule(job)
+
+            while self.events and self.events[0][0] <= end:
+                at = self.events[0][0]
+                self.clock.advance_to(self.start + timedelta(seconds=at))
+                self._carry_concurrency(int(at // 60))
+
+                # Every job due at this moment competes for the same free slots
+                admit = False
+                while self.events and self.events[0][0] == at:
+                    _, _, kind, job = heapq.heappop(self.events)
+                    if kind == self.FINISH:
+                        # Runs ending at this moment do not free their slots for the jobs the loop saw first
+                        if admit:
+                            self._admit()
+                            admit = False
+                        self._finish(job)
+                        continue
+
+                    admit = True
+                    if kind == self.WAKE:
+                        self._wake_at = None
+                    elif kind == self.SLOT:
+                        # The timer skips a slot while the previous run is still going, a held back run moves on to
+                        # the latest slot
+                        if not job.locked:
+                            self.waiting[job.script_path] = (job, self.clock.now())
+                        self._push(at + job.interval.every, self.SLOT, job)
+                    elif not job.locked and self.store.is_due(job, self.clock.now()):
+                        self.waiting[job.script_path] = (job, None)
+                    elif not job.locked and not self.store.dependencies.has_dependencies(job.script_path):
+                        # Not due yet at this tick, e.g. its next_execution moved
+                        self._schedule(job)
+
+                if admit:
+                    self._admit()
+
+            self._carry_concurrency(int(end // 60))
+
+        return self.report
+
+
+def modelled_durations(jobs: Iterable[Job], fixed: Optional[float], default: float) -> Dict[Path, float]:
+    """
+    How long each job runs in the simulation: the fixed duration if given, else the median of its recorded runs
+    """
+    durations = {}
+    for job in jobs:
+        if fixed is not None:
+            durations[job.script_path] = fixed
+        elif job.history is not None and job.history.p50 is not None:
+            durations[job.script_path] = job.history.p50
+        else:
+            durations[job.script_path] = default
+
+    return durations
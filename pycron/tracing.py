@@ -0,0 +1,180 @@
+"""
+    Lifecycle spans of the scheduler, written to LOGS_FOLDER/trace.jsonl
+
+    Each line is one complete event ("ph": "X") of the Chrome trace event format, with microsecond timestamps. `pycron
+    trace` wraps them into a trace Perfetto or chrome://tracing open.
+
+    Runs are sampled by their run uuid, TRACE_SAMPLE_RATE of them get all their spans and the others none. Spans opened
+    inside a traced span on the same thread, such as writing the store after a run, follow that decision.
+"""
+import json
+import os
+import random
+import threading
+from datetime import datetime
+from pathlib import Path
+from threading import Lock
+from time import perf_counter, time
+from typing import Iterable, List
+from uuid import UUID
+
+from pycron import settings
+
+
+class _NullSpan:
+    """
+    Stands in for spans that are not sampled, entering it costs a method call
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    __slots__ = ('tracer', 'name', 'args', 'started', 'started_counter')
+
+    def __init__(self, tracer: 'Tracer', name: str, args: dict):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.tracer.local.depth = getattr(self.tracer.local, 'depth', 0) + 1
+        self.started = time()
+        self.started_counter = perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        duration = perf_counter() - self.started_counter
+        self.tracer.local.depth -= 1
+        self.tracer.emit(self.name, self.started, duration, self.args)
+        return False
+
+
+class Tracer:
+    TRACE_FILE = 'trace.jsonl'
+
+    # Sampling compares this many buckets of the run uuid against the rate
+    _BUCKETS = 1 << 16
+
+    def __init__(self):
+        self.lock = Lock()
+        # Depth of the sampled spans open in each thread
+        self.local = threading.local()
+        self.file = None
+        self.path: Path = None
+
+    @property
+    def enabled(self) -> bool:
+        return settings.TRACE_SAMPLE_RATE > 0
+
+    def run_sampled(self, run_uuid: UUID) -> bool:
+        """
+        The same answer for every span of a run, whichever thread asks
+        """
+        return run_uuid is not None and run_uuid.int % self._BUCKETS < settings.TRACE_SAMPLE_RATE * self._BUCKETS
+
+    def tick_sampled(self) -> bool:
+        # The scheduler loop ticks every second, its spans are sampled like runs
+        return self.enabled and random.random() < settings.TRACE_SAMPLE_RATE
+
+    def span(self, name: str, sampled: bool = None, **args):
+        """
+        Time the block as a span, sampled decides whether it is recorded. Left out, the span is recorded when a
+        recorded span is open in this thread.
+        """
+        if sampled is None:
+            sampled = getattr(self.local, 'depth', 0) > 0
+
+        return Span(self, name, args) if sampled else _NULL_SPAN
+
+    def run_span(self, name: str, job, **args):
+        return self.span(name, self.run_sampled(job.run_uuid), **self.run_args(job), **args)
+
+    @staticmethod
+    def run_args(job) -> dict:
+        return {'job': str(job.relative_name), 'run_uuid': str(job.run_uuid)}
+
+    def complete(self, name: str, start: datetime, end: datetime, **args):
+        """
+        Record a span that was not timed in a block, e.g. the time a run waited between being due and starting
+        """
+        self.emit(name, start.timestamp(), (end - start).total_seconds(), args)
+
+    def emit(self, name: str, started: float, duration: float, args: dict):
+        event = {
+            'name': name,
+            'cat': 'run' if 'run_uuid' in args else 'scheduler',
+            'ph': 'X',
+            'ts': round(started * 1_000_000),
+            'dur': round(duration * 1_000_000),
+            'pid': os.getpid(),
+            'tid': threading.current_thread().name,
+            'args': args,
+        }
+        line = json.dumps(event, default=str) + '\n'
+
+        with self.lock:
+            if self.file is None:
+                self._open()
+            self.file.write(line)
+            # Nested spans are flushed with the outermost one
+            if getattr(self.local, 'depth', 0) == 0:
+                self.file.flush()
+                if self.file.tell() > settings.TRACE_MAX_SIZE_MB * 1024 * 1024:
+                    self._rotate()
+
+    @classmethod
+    def trace_file(cls, shard_id: int = None) -> Path:
+        path = settings.LOGS_FOLDER / cls.TRACE_FILE
+        if shard_id is not None:
+            path = settings.shard_file(path, shard_id)
+        return path
+
+    def _open(self):
+        self.path = self.trace_file(settings.SHARD_ID)
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def _rotate(self):
+        # One previous file is kept, at most twice TRACE_MAX_SIZE_MB is used
+        self.file.close()
+        os.replace(self.path, self.path.with_name(f'{self.path.name}.1'))
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+def all_trace_files() -> List[Path]:
+    """
+    The trace files of the daemon and of every shard
+    """
+    # trace.jsonl and trace.shardN.jsonl
+    return sorted(settings.LOGS_FOLDER.glob('trace*.jsonl'))
+
+
+def read_trace(path: Path) -> Iterable[dict]:
+    """
+    Events of a trace file and of the file it rotated out, oldest first
+    """
+    for file in (path.with_name(f'{path.name}.1'), path):
+        if not file.is_file():
+            continue
+
+        with open(file, encoding='utf-8') as trace:
+            for line in trace:
+                # The last line may still be being written
+                if line.endswith('\n'):
+                    yield json.loads(line)
+
+
+tracer = Tracer()
@@ -4,7 +4,7 @@ setup(
     name='pycron',
     version='0.1.6',
     packages=['pycron', 'pycron.executor', 'pycron.interval', 'pycron.job_discovery', 'pycron.persistance',
-              'pycron.jobs'],
+              'pycron.jobs', 'pycron.sharding', 'pycron.control', 'pycron.simulation', 'pycron.agents'],
     url='',
     license='',
     author='Will Derriman',
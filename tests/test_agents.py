@@ -0,0 +1,160 @@
+import socket
+from pathlib import Path
+from threading import Event, Thread
+from time import monotonic, sleep
+from types import SimpleNamespace
+from unittest import TestCase
+
+from pycron import SettingsSingleton
+from pycron.agents.agent_pool import AgentPool
+from pycron.agents.worker_agent import WorkerAgent
+from pycron.executor.folder_executor import FolderExecutor
+from pycron.jobs.jobs import Job
+from pycron.persistance.pickle_persistence import MemStore
+
+
+class TestWorkerAgents(TestCase):
+    def setUp(self) -> None:
+        self.test_folder = test_folder = Path('test_folder').absolute()
+        test_folder.mkdir(exist_ok=True)
+
+        self.settings = settings = SettingsSingleton.get_settings()
+        settings.set_jobs_folder(test_folder)
+        settings.set_logs_folder(test_folder)
+        settings.PERSISTENCE_FILE = test_folder / 'jar.pickle'
+
+        self.recorded = []
+        self.run_recorded = Event()
+        executor = SimpleNamespace(record_agent_run=self.record_agent_run)
+
+        self.pool = AgentPool(executor, test_folder / 'agents.sock')
+        self.pool.start()
+
+        self.agent = WorkerAgent(self.pool.address, slots=2, name='test')
+        self.agent.RECONNECT_DELAY = 0.05
+        self.agent_thread = Thread(target=self.agent.run, daemon=True)
+        self.agent_thread.start()
+        self.wait_for(lambda: self.pool.free_slots() == 2)
+
+    def tearDown(self) -> None:
+        self.agent.stop()
+        self.agent_thread.join(5)
+        self.pool.stop()
+        self.settings.AGENT_LOST_SECONDS = 300
+
+        for path in sorted(self.test_folder.rglob('*'), reverse=True):
+            path.rmdir() if path.is_dir() else path.unlink()
+        self.test_folder.rmdir()
+
+    def record_agent_run(self, job, run):
+        self.recorded.append((job, run))
+        self.run_recorded.set()
+
+    @staticmethod
+    def wait_for(condition, timeout: float = 5):
+        deadline = monotonic() + timeout
+        while not condition():
+            if monotonic() > deadline:
+                raise AssertionError('Timed out')
+            sleep(0.01)
+
+    def job(self, script: str, content: str) -> Job:
+        path = self.test_folder / script
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+        path.chmod(0o755)
+
+        job = Job(path)
+        job.lock()
+        return job
+
+    def test_run(self):
+        (self.test_folder / '1min/report.sh.ini').parent.mkdir(parents=True, exist_ok=True)
+        (self.test_folder / '1min/report.sh.ini').write_text('[environment]\nTARGET = /srv\n')
+        job = self.job('1min/report.sh', '#!/bin/sh\necho "$TARGET"\necho oops >&2\nexit 3\n')
+
+        self.assertTrue(self.pool.dispatch(job))
+        self.assertEqual(self.pool.free_slots(), 1)
+        self.assertTrue(self.run_recorded.wait(5))
+
+        recorded, run = self.recorded[0]
+        self.assertIs(recorded, job)
+        result = run.result()
+        self.assertEqual((result.returncode, result.stdout, result.stderr), (3, b'/srv\n', b'oops\n'))
+        self.assertIn('cpu_user_seconds', result.usage)
+        self.assertLessEqual(run.started_at, run.finished_at)
+        self.assertEqual(self.pool.free_slots(), 2)
+
+        # An agent that is stopping takes no more runs
+        self.agent.stop()
+        self.wait_for(lambda: self.pool.free_slots() == 0)
+        self.assertFalse(self.pool.dispatch(self.job('1min/other.sh', '#!/bin/sh\n')))
+
+    def test_reconnect(self):
+        job = self.job('1min/slow.sh', '#!/bin/sh\nsleep 0.3\necho done\n')
+        self.pool.dispatch(job)
+        self.wait_for(lambda: self.agent.running)
+
+        # The connection drops while the job runs, the agent comes back and reports the run it kept going
+        first = self.pool.agents[0]
+        self.agent.connection.shutdown(socket.SHUT_RDWR)
+        self.wait_for(lambda: self.pool.agents and self.pool.agents[0] is not first)
+        self.assertEqual(self.pool.status()['awaiting_agent'], [])
+        self.assertEqual(self.pool.status()['agents'][0]['running'], ['1min/slow.sh'])
+
+        self.assertTrue(self.run_recorded.wait(5))
+        self.assertEqual(self.recorded[0][1].result().stdout, b'done\n')
+
+    def test_lost_agent(self):
+        self.settings.AGENT_LOST_SECONDS = 0
+        job = self.job('1min/poll.sh', '#!/bin/sh\n')
+        self.pool.adopt([job])
+        sleep(0.01)
+
+        # No agent claimed the run in time, it is recorded without a result and rerun
+        self.pool.expire_lost()
+        self.assertIsNone(self.recorded[0][1].result())
+        self.assertEqual(self.pool.status()['awaiting_agent'], [])
+
+    def test_daemon_restart(self):
+        job = self.job('1min/long.sh', '#!/bin/sh\n')
+        self.assertIsNone(job.pid)
+        MemStore.serialize_store({job.script_path: job})
+
+        # The next daemon keeps the run locked and waits for the agent running it to claim it
+        store = MemStore()
+        loaded = store.store[job.script_path]
+        self.assertTrue(loaded.locked)
+        self.assertEqual(loaded.run_uuid, job.run_uuid)
+
+        FolderExecutor.adopt_running_jobs(SimpleNamespace(store=store, agents=self.pool))
+        self.assertIn(job.run_uuid, self.pool.orphans)
+        self.assertEqual(self.pool.status()['awaiting_agent'], ['1min/long.sh'])
+
+    def test_token(self):
+        self.settings.AGENT_TOKEN = 'secret'
+        self.addCleanup(setattr, self.settings, 'AGENT_TOKEN', '')
+
+        def hello(token: str) -> socket.socket:
+            connection = socket.socket(socket.AF_UNIX)
+            connection.connect(str(self.pool.address))
+            connection.sendall(f'{{"type": "hello", "name": "rogue", "slots": 5, "token": "{token}"}}\n'.encode())
+            return connection
+
+        with self.assertLogs('main_log', 'WARNING'):
+            refused = hello('guess')
+            # Closed without being handed any runs
+            self.assertEqual(refused.recv(1), b'')
+        refused.close()
+        self.assertEqual(self.pool.free_slots(), 2)
+
+        accepted = hello('secret')
+        self.wait_for(lambda: self.pool.free_slots() == 7)
+        accepted.close()
+
+    def test_exposed_addresses(self):
+        for address, exposed in [(Path('agents.sock'), False), (('localhost', 7000), False),
+                                 (('127.0.0.1', 7000), False), (('::1', 7000), False), (('0.0.0.0', 7000), True),
+                                 (('10.1.2.3', 7000), True), (('scheduler.internal', 7000), True)]:
+            with self.subTest(address=address):
+                self.assertEqual(self.settings.agent_address_exposed(address), exposed)
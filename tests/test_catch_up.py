@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import TestCase
+
+from pycron import SettingsSingleton
+from pycron.executor.catch_up import CatchUp, TokenBucket
+from pycron.job_discovery.folder_discovery import JobFolderScanner
+from pycron.jobs.jobs import Job
+from pycron.persistance.pickle_persistence import MemStore
+
+
+class TestTokenBucket(TestCase):
+    def test_rate_and_burst(self):
+        bucket = TokenBucket(rate=2, burst=3, now=0)
+
+        self.assertEqual([bucket.take(0) for _ in range(4)], [True, True, True, False])
+        # Refilled at 2 a second
+        self.assertTrue(bucket.take(0.5))
+        self.assertFalse(bucket.take(0.6))
+
+        # Never more than the burst saved up
+        self.assertEqual([bucket.take(100) for _ in range(4)], [True, True, True, False])
+
+
+class TestCatchUp(TestCase):
+    def setUp(self) -> None:
+        self.test_folder = test_folder = Path('test_folder').absolute()
+        test_folder.mkdir(exist_ok=True)
+
+        self.settings = settings = SettingsSingleton.get_settings()
+        settings.set_jobs_folder(test_folder)
+        settings.PERSISTENCE_FILE = test_folder / 'jar.pickle'
+
+        self.write('5min/.pycron.ini', '[job]\npriority = critical\n')
+        self.store = MemStore(nuke_persistence=True)
+
+    def tearDown(self) -> None:
+        for path in sorted(self.test_folder.rglob('*'), reverse=True):
+            path.rmdir() if path.is_dir() else path.unlink()
+        self.test_folder.rmdir()
+
+    def write(self, relative_path: str, content: str):
+        path = self.test_folder / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+    def due(self, script: str, overdue: timedelta) -> Job:
+        self.write(script, '#!/bin/sh\n')
+        job = self.store.fetch(self.test_folder / script)
+        job.last_execution = datetime.now() - job.interval.time_delta() - overdue
+        return job
+
+    def test_backlog(self):
+        polls = [self.due(f'1min/poll{index}.sh', timedelta(hours=index)) for index in range(4)]
+        check = self.due('5min/check.sh', timedelta())
+
+        catch_up = CatchUp(self.store, rate=0.001, burst=2)
+        with self.assertLogs('main_log', 'WARNING'):
+            catch_up.start()
+        self.assertEqual(catch_up.status(), {'overdue': 5, 'started': 0, 'left': 5})
+
+        # Most urgent first, then the longest overdue
+        self.assertEqual(catch_up.admit(self.store.runnable()), [check, polls[3]])
+        for job in (check, polls[3]):
+            job.lock()
+
+        # The rest stay due, jobs that came due since the start are not held back
+        late = self.due('1hour/late.sh', timedelta())
+        self.assertEqual(catch_up.admit(self.store.runnable()), [late])
+        self.assertEqual(catch_up.status()['left'], 3)
+
+        # Started from the control socket, no longer waiting
+        for job in polls[:3]:
+            job.lock()
+        with self.assertLogs('main_log', 'INFO') as logs:
+            catch_up.report(catch_up.last_report)
+        self.assertIn('Caught up on 5 jobs', logs.output[0])
+        self.assertIsNone(catch_up.status())
+
+    def test_downstream_jobs(self):
+        for index in range(3):
+            self.write(f'1min/load{index}.sh.deps', 'extract.sh\n')
+        extract = self.due('1min/extract.sh', timedelta(hours=1))
+        for index in range(3):
+            self.due(f'1min/load{index}.sh', timedelta(hours=1))
+
+        # Started by their upstream job rather than caught up, once discovery read their dependencies
+        JobFolderScanner(self.store).run_discovery()
+        catch_up = CatchUp(self.store, rate=0.001, burst=0)
+        with self.assertLogs('main_log', 'WARNING') as logs:
+            catch_up.start()
+        self.assertIn('1 jobs came due', logs.output[0])
+        self.assertEqual(catch_up.backlog, {extract.script_path})
+
+    def test_small_backlog(self):
+        polls = [self.due(f'1min/poll{index}.sh', timedelta()) for index in range(3)]
+
+        catch_up = CatchUp(self.store, rate=0.001, burst=3)
+        catch_up.start()
+        self.assertIsNone(catch_up.status())
+        self.assertCountEqual(catch_up.admit(self.store.runnable()), polls)
+
+        # A rate of 0 disables the catch-up
+        catch_up = CatchUp(self.store, rate=0, burst=1)
+        catch_up.start()
+        self.assertIsNone(catch_up.status())
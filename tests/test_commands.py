@@ -0,0 +1,63 @@
+import io
+from contextlib import redirect_stdout
+from pathlib import Path
+from unittest import TestCase
+
+from pycron import SettingsSingleton
+from pycron.commands import list_jobs, validate_tree, next_runs
+
+
+class TestCommands(TestCase):
+    def setUp(self) -> None:
+        self.test_folder = test_folder = Path('test_folder').absolute()
+        test_folder.mkdir(exist_ok=True)
+
+        self.settings = settings = SettingsSingleton.get_settings()
+        settings.set_jobs_folder(test_folder)
+        settings.PERSISTENCE_FILE = test_folder / 'jar.pickle'
+
+        for script, executable in [('1min/a.sh', True), ('1hour/at0030/b.sh', True), ('1day/c.sh', False),
+                                   ('3mins/d.sh', True)]:
+            path = test_folder / script
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text('#!/bin/sh\n')
+            path.chmod(0o755 if executable else 0o644)
+
+    def tearDown(self) -> None:
+        self._recursive_delete(self.test_folder)
+
+    def _recursive_delete(self, path: Path):
+        for sub_path in path.iterdir():
+            if sub_path.is_dir():
+                self._recursive_delete(sub_path)
+            else:
+                sub_path.unlink()
+        path.rmdir()
+
+    def run_command(self, command, **args):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            exit_code = command(args)
+        return exit_code, output.getvalue()
+
+    def test_validate(self):
+        exit_code, output = self.run_command(validate_tree)
+
+        self.assertEqual(exit_code, 1)
+        self.assertIn('3mins', output)
+        self.assertIn('c.sh: Script is not executable', output)
+        self.assertIn('3 valid jobs, 2 problems', output)
+
+    def test_list(self):
+        exit_code, output = self.run_command(list_jobs)
+
+        self.assertEqual(exit_code, 0)
+        self.assertIn('1hour/at0030/b.sh', output)
+        self.assertIn('3 jobs', output)
+
+    def test_next(self):
+        exit_code, output = self.run_command(next_runs, number=1)
+
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(len(output.splitlines()), 1)
+        self.assertIn('1min/a.sh', output)
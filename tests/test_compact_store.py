@@ -0,0 +1,95 @@
+import pickle
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import TestCase
+
+from pycron import SettingsSingleton
+from pycron.jobs.jobs import Job, JobRunReasons
+from pycron.persistance.compact_store import CompactStoreCodec, StoreFormatError
+from pycron.persistance.pickle_persistence import MemStore
+
+
+class TestCompactStore(TestCase):
+    def setUp(self) -> None:
+        self.settings = settings = SettingsSingleton.get_settings()
+        self.job_folder = settings.JOBS_FOLDER
+
+        self.store = {}
+        for relative_path in ['1min/a.sh', '1min/b.sh', '1hour/at0030/c.sh', '2week/at1733/d.sh']:
+            script_path = self.job_folder / relative_path
+            self.store[script_path] = Job(script_path)
+
+    def test_round_trip(self):
+        """
+        Test every persisted attribute survives an encode and decode
+        """
+        failed = self.store[self.job_folder / '1min/b.sh']
+        failed.lock()
+        failed.fail()
+        failed.fail()
+
+        running = self.store[self.job_folder / '1hour/at0030/c.sh']
+        running.lock()
+        running.pid = 4321
+
+        loaded = CompactStoreCodec.decode(CompactStoreCodec.encode(self.store), self.job_folder)
+
+        self.assertEqual(list(self.store), list(loaded))
+        for script_path, job in self.store.items():
+            loaded_job = loaded[script_path]
+            for attribute in Job.__slots__:
+                self.assertEqual(getattr(job, attribute), getattr(loaded_job, attribute),
+                                 msg=f'{attribute} of {script_path} changed')
+
+        self.assertEqual(loaded[failed.script_path].run_reason, JobRunReasons.JOB_FAILED)
+
+    def test_intervals_are_shared(self):
+        """
+        Test jobs in the same folder share one interval once loaded
+        """
+        loaded = CompactStoreCodec.decode(CompactStoreCodec.encode(self.store), self.job_folder)
+
+        a = loaded[self.job_folder / '1min/a.sh']
+        b = loaded[self.job_folder / '1min/b.sh']
+        self.assertIs(a.interval, b.interval)
+
+    def test_newer_version_rejected(self):
+        data = bytearray(CompactStoreCodec.encode(self.store))
+        data[len(CompactStoreCodec.MAGIC) + 1] += 1
+
+        with self.assertRaises(StoreFormatError):
+            CompactStoreCodec.decode(bytes(data), self.job_folder)
+
+    def test_legacy_pickle(self):
+        """
+        Test stores written as a plain pickle by older versions still load
+        """
+        test_file = Path('legacy.pickle').absolute()
+        job = self.store[self.job_folder / '1min/a.sh']
+        job.last_execution = datetime.now() - timedelta(hours=1)
+
+        with open(test_file, 'wb') as cache:
+            pickle.dump(self.store, cache)
+
+        try:
+            loaded = MemStore.read_store_file(test_file)
+        finally:
+            test_file.unlink()
+
+        self.assertEqual(loaded[job.script_path].last_execution, job.last_execution)
+
+    def test_legacy_job_state(self):
+        """
+        Test job state from before some attributes existed falls back to defaults
+        """
+        job = self.store[self.job_folder / '1min/a.sh']
+
+        legacy_state = job.__getstate__()
+        del legacy_state['run_uuid'], legacy_state['pid'], legacy_state['failed_attempts']
+
+        legacy_job = Job.__new__(Job)
+        legacy_job.__setstate__(legacy_state)
+
+        self.assertEqual(legacy_job.relative_name, job.relative_name)
+        self.assertIsNone(legacy_job.pid)
+        self.assertEqual(legacy_job.failed_attempts, 0)
@@ -0,0 +1,141 @@
+from pathlib import Path
+from threading import Lock
+from types import SimpleNamespace
+from unittest import TestCase
+
+from pycron import SettingsSingleton
+from pycron.control.control_client import ControlClient
+from pycron.control.control_server import ControlServer
+from pycron.executor.profiler import Profiler
+from pycron.executor.catch_up import CatchUp
+from pycron.executor.watchdog import TickWatchdog
+from pycron.job_discovery.folder_discovery import JobFolderScanner
+from pycron.persistance.pickle_persistence import MemStore
+
+
+class TestControlSocket(TestCase):
+    def setUp(self) -> None:
+        self.test_folder = test_folder = Path('test_folder').absolute()
+        test_folder.mkdir(exist_ok=True)
+
+        self.settings = settings = SettingsSingleton.get_settings()
+        settings.set_jobs_folder(test_folder)
+        settings.PERSISTENCE_FILE = test_folder / 'jar.pickle'
+        self.agents_full = False
+
+        store = MemStore(nuke_persistence=True)
+        for script in ['1min/a.sh', '1min/b.sh', '1hour/at0030/c.sh']:
+            store.fetch(test_folder / script)
+
+        # Only the parts of the executor the control plane touches
+        self.executor = SimpleNamespace(store=store, store_lock=Lock(), job_parser=JobFolderScanner(store),
+                                        watchdog=TickWatchdog(0), catch_up=CatchUp(store, 0, 0),
+                                        parallel_job_runner=self.start_jobs)
+        self.executor.profiler = Profiler(self.executor)
+
+        self.server = ControlServer(self.executor, test_folder / 'control.sock')
+        self.server.start()
+        self.client = ControlClient(self.server.socket_path)
+
+    def tearDown(self) -> None:
+        self.client.close()
+        self.server.stop()
+        for path in sorted(self.test_folder.rglob('*'), reverse=True):
+            path.rmdir() if path.is_dir() else path.unlink()
+        self.test_folder.rmdir()
+
+    def test_queries(self):
+        self.assertEqual(self.client.request('ping'), {'ok': True, 'result': 'pong'})
+
+        status = self.client.request('status')['result']
+        self.assertEqual(status['jobs'], 3)
+        self.assertEqual(status['in_flight'], 0)
+        self.assertEqual(status['tick_overruns'], 0)
+        self.assertIsNone(status['catch_up'])
+
+        upcoming = self.client.request('next', limit=2)['result']
+        self.assertEqual(len(upcoming), 2)
+        self.assertEqual({entry['file'] for entry in upcoming}, {'1min/a.sh', '1min/b.sh'})
+
+    def test_pause_folder(self):
+        paused = self.client.request('pause', target='1min')['result']
+        self.assertEqual(set(paused), {'1min/a.sh', '1min/b.sh'})
+        self.assertEqual(self.client.request('status')['result']['paused'], 2)
+
+        # Jobs discovered later in a paused folder start paused
+        new_job = self.executor.store.fetch(self.test_folder / '1min/d.sh')
+        self.assertTrue(new_job.paused)
+
+        # Also after a restart
+        restarted = MemStore()
+        self.assertEqual(restarted.paused_folders, {Path('1min')})
+        self.assertTrue(restarted.fetch(self.test_folder / '1min/e.sh').paused)
+
+        self.client.request('resume', target='1min/a.sh')
+        self.assertFalse(self.executor.store.find('1min/a.sh').paused)
+
+    def start_jobs(self, jobs, due=None):
+        # Worker agents without a free slot start nothing
+        if self.agents_full:
+            return []
+        for job in jobs:
+            job.lock(due)
+        return jobs
+
+    def test_run(self):
+        self.settings.MAX_RUNNING_JOBS = 1
+        self.addCleanup(setattr, self.settings, 'MAX_RUNNING_JOBS', 0)
+
+        running = self.executor.store.find('1min/b.sh')
+        running.lock()
+        response = self.client.request('run', target='1min/a.sh')
+        self.assertFalse(response['ok'])
+        self.assertIn('concurrency limits', response['error'])
+
+        running.unlock()
+        result = self.client.request('run', target='1min/a.sh')['result']
+        self.assertEqual(result['run_uuid'], str(self.executor.store.find('1min/a.sh').run_uuid))
+        self.assertIn('already running', self.client.request('run', target='1min/a.sh')['error'])
+
+        # Not reported as started with the uuid of its previous run
+        self.executor.store.find('1min/a.sh').unlock()
+        self.agents_full = True
+        response = self.client.request('run', target='1min/b.sh')
+        self.assertFalse(response['ok'])
+        self.assertIn('no worker agent has a free slot', response['error'])
+
+    def test_errors(self):
+        response = self.client.request('run', target='1min/missing.sh')
+        self.assertFalse(response['ok'])
+        self.assertIn('No job', response['error'])
+
+        self.assertFalse(self.client.request('unknown')['ok'])
+
+        # Unexpected errors are logged and answered, the connection stays usable
+        self.executor.watchdog = None
+        with self.assertLogs('main_log', 'ERROR'):
+            response = self.client.request('status')
+        self.assertEqual(response, {'ok': False, 'error': "AttributeError: 'NoneType' object has no attribute 'overruns'"})
+        self.assertEqual(self.client.request('ping')['result'], 'pong')
+
+    def test_discover(self):
+        self.client.request('discover')
+        self.assertTrue(self.executor.job_parser.discovery_requested)
+
+    def test_reset(self):
+        job = self.executor.store.find('1min/a.sh')
+        job.failed_attempts = 7
+
+        self.assertEqual(self.client.request('reset', target='1min')['result'], ['1min/a.sh'])
+        self.assertEqual(job.failed_attempts, 0)
+
+    def test_profile(self):
+        self.settings.set_logs_folder(self.test_folder)
+
+        stacks = self.client.request('profile', target='stacks')['result']
+        self.assertIn('control_socket', Path(stacks).read_text())
+
+        # CPU profiles follow the scheduler loop, which only a daemon has
+        response = self.client.request('profile', target='cpu')
+        self.assertFalse(response['ok'])
+        self.assertFalse(self.client.request('profile', target='disk')['ok'])
@@ -0,0 +1,124 @@
+import datetime
+from pathlib import Path
+from unittest import TestCase
+
+from pycron import SettingsSingleton
+from pycron.clock import VirtualClock, virtual_clock
+from pycron.interval.cron import Cron
+from pycron.jobs.jobs import Job, InvalidJobException
+
+
+class TestCron(TestCase):
+    def brute_force_next(self, expression: str, last_run: datetime.datetime) -> datetime.datetime:
+        """
+        Reference implementation stepping one minute at a time
+        """
+        minute, hour, day, month, weekday = expression.split()
+
+        def matches(field: str, value: int, low: int, high: int) -> bool:
+            for part in field.split(','):
+                span, _, step = part.partition('/')
+                step = int(step or 1)
+                if span == '*':
+                    start, end = low, high
+                elif '-' in span:
+                    start, end = map(int, span.split('-'))
+                else:
+                    start = int(span)
+                    end = high if step > 1 else start
+                if value in range(start, end + 1, step):
+                    return True
+            return False
+
+        candidate = last_run.replace(second=0, microsecond=0)
+        while True:
+            candidate += datetime.timedelta(minutes=1)
+            cron_weekday = (candidate.weekday() + 1) % 7
+            day_match = matches(day, candidate.day, 1, 31)
+            weekday_match = matches(weekday, cron_weekday, 0, 6)
+            if day != '*' and weekday != '*':
+                day_ok = day_match or weekday_match
+            else:
+                day_ok = day_match and weekday_match
+
+            if (matches(minute, candidate.minute, 0, 59) and matches(hour, candidate.hour, 0, 23) and day_ok
+                    and matches(month, candidate.month, 1, 12)):
+                return candidate
+
+    def test_matches_brute_force(self):
+        expressions = ['30 6,18 * * 1-5', '*/15 9-17 * * *', '0 0 1,15 * *', '5 4 * * 0', '0 12 13 * 5',
+                       '59 23 31 * *', '7/20 */5 * 1-3,11 *', '0 0 * * *']
+        starts = [datetime.datetime(2021, 1, 1, 0, 0), datetime.datetime(2021, 2, 27, 23, 59, 30),
+                  datetime.datetime(2021, 12, 31, 23, 59), datetime.datetime(2022, 6, 15, 17, 45, 12)]
+
+        for expression in expressions:
+            cron = Cron(expression)
+            for start in starts:
+                with self.subTest(expression=expression, start=start):
+                    self.assertEqual(cron.next_time(start), self.brute_force_next(expression, start))
+
+    def test_names_and_macros(self):
+        self.assertEqual(Cron('30 6,18 * * mon-fri'), Cron('30 6,18 * * 1-5'))
+        self.assertEqual(Cron('0 0 1 jan *').next_time(datetime.datetime(2021, 3, 1)), datetime.datetime(2022, 1, 1))
+        self.assertEqual(Cron('@weekly').next_time(datetime.datetime(2021, 6, 2)), datetime.datetime(2021, 6, 6))
+        self.assertEqual(Cron('0 0 29 2 *').next_time(datetime.datetime(2021, 1, 1)), datetime.datetime(2024, 2, 29))
+        # Sunday is 0 and 7
+        self.assertEqual(Cron('0 0 * * 7').weekdays, Cron('0 0 * * 0').weekdays)
+
+    def test_time_delta(self):
+        with virtual_clock(VirtualClock(datetime.datetime(2021, 6, 4, 7, 0))):  # Friday
+            self.assertEqual(Cron('30 6,18 * * mon-fri').time_delta(), datetime.timedelta(hours=60))
+            self.assertEqual(Cron('*/15 * * * *').time_delta(), datetime.timedelta(minutes=15))
+
+    def test_invalid(self):
+        for expression in ['* * * *', '60 * * * *', '* 24 * * *', '0 0 31 2 *', '*/0 * * * *', 'a * * * *']:
+            with self.subTest(expression=expression):
+                with self.assertRaises(ValueError):
+                    Cron(expression)
+
+
+class TestCronJobs(TestCase):
+    def setUp(self) -> None:
+        self.test_folder = test_folder = Path('test_folder').absolute()
+        (test_folder / 'cron/reports').mkdir(parents=True, exist_ok=True)
+
+        settings = SettingsSingleton.get_settings()
+        settings.set_jobs_folder(test_folder)
+
+        self.script = test_folder / 'cron/reports/report.sh'
+        self.script.write_text('#!/bin/sh\n')
+        self.sidecar = test_folder / 'cron/reports/report.sh.cron'
+
+    def tearDown(self) -> None:
+        for path in sorted(self.test_folder.rglob('*'), reverse=True):
+            path.rmdir() if path.is_dir() else path.unlink()
+        self.test_folder.rmdir()
+
+    def test_sidecar(self):
+        self.sidecar.write_text('# twice every weekday\n30 6,18 * * mon-fri\n')
+        job = Job(self.script)
+
+        job.last_execution = datetime.datetime(2021, 6, 4, 7, 0)  # Friday
+        self.assertEqual(job.next_execution, datetime.datetime(2021, 6, 4, 18, 30))
+
+        self.sidecar.write_text('@daily\n')
+        job.reload_schedule()
+        self.assertEqual(job.interval, Cron('0 0 * * *'))
+
+    def test_missing_or_invalid_sidecar(self):
+        with self.assertRaises(InvalidJobException):
+            Job(self.script)
+
+        self.sidecar.write_text('61 * * * *\n')
+        with self.assertRaises(InvalidJobException):
+            Job(self.script)
+
+    def test_schedule_folders(self):
+        # Would otherwise be ignored, the expression alone sets when cron jobs run
+        for folder in ['cron/within0100', 'cron/reports/at0200']:
+            with self.subTest(folder=folder):
+                script = self.test_folder / folder / 'report.sh'
+                script.parent.mkdir(parents=True)
+                script.with_name('report.sh.cron').write_text('@daily\n')
+                with self.assertRaises(InvalidJobException):
+                    Job(script)
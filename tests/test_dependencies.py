@@ -0,0 +1,121 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import TestCase
+
+from pycron import SettingsSingleton
+from pycron.job_discovery.folder_discovery import JobFolderScanner
+from pycron.persistance.pickle_persistence import MemStore
+
+
+class TestDependencies(TestCase):
+    def setUp(self) -> None:
+        self.test_folder = test_folder = Path('test_folder').absolute()
+        test_folder.mkdir(exist_ok=True)
+
+        self.settings = settings = SettingsSingleton.get_settings()
+        settings.set_jobs_folder(test_folder)
+        settings.PERSISTENCE_FILE = test_folder / 'jar.pickle'
+
+        # extract -> (transform_a, transform_b) -> load
+        self.write('1day/at0200/extract.sh')
+        self.write('1day/at0200/transform_a.sh')
+        self.write('1day/at0200/transform_a.sh.deps', 'extract.sh\n')
+        self.write('1day/at0200/transform_b.sh')
+        self.write('1day/at0200/transform_b.sh.deps', '# comments are ignored\n1day/at0200/extract.sh\n')
+        self.write('1day/at0200/load.sh')
+        self.write('1day/at0200/load.sh.deps', 'transform_a.sh\ntransform_b.sh\n')
+
+        self.explorer = JobFolderScanner(MemStore(nuke_persistence=True))
+        self.store = self.explorer.store
+
+    def tearDown(self) -> None:
+        for path in sorted(self.test_folder.rglob('*'), reverse=True):
+            path.rmdir() if path.is_dir() else path.unlink()
+        self.test_folder.rmdir()
+
+    def write(self, relative_name: str, content: str = '#!/bin/sh\n'):
+        path = self.test_folder / relative_name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+    def job(self, name: str):
+        return self.store.find(f'1day/at0200/{name}')
+
+    def succeed(self, job, at: datetime):
+        job.lock()
+        job.success(at)
+
+    def runnable_names(self):
+        return sorted(job.relative_name.name for job in self.store.runnable())
+
+    def test_sidecars_and_hidden_files_skipped(self):
+        self.write('1min/.a.sh.swp')
+        self.write('1min/.hidden/b.sh')
+        self.write('1min/c.sh')
+
+        self.explorer.run_discovery()
+
+        self.assertEqual(len(self.store.store), 5)
+        self.assertIsNotNone(self.store.find('1min/c.sh'))
+
+    def test_pipeline_order(self):
+        self.explorer.run_discovery()
+        self.assertEqual(self.store.dependencies.problems, [])
+
+        # Dependent jobs ignore their folder's interval and wait for their upstream jobs
+        self.job('extract.sh').last_execution = datetime.now() - timedelta(days=1)
+        self.assertEqual(self.runnable_names(), ['extract.sh'])
+
+        start = datetime.now()
+        self.succeed(self.job('extract.sh'), start)
+        self.assertEqual(sorted(job.relative_name.name for job in self.store.ready_downstream(self.job('extract.sh'))),
+                         ['transform_a.sh', 'transform_b.sh'])
+
+        self.succeed(self.job('transform_a.sh'), start + timedelta(minutes=1))
+        self.assertEqual(self.store.ready_downstream(self.job('transform_a.sh')), [])
+
+        self.succeed(self.job('transform_b.sh'), start + timedelta(minutes=2))
+        self.assertEqual(self.store.ready_downstream(self.job('transform_b.sh')), [self.job('load.sh')])
+        self.assertEqual(self.store.due_time(self.job('load.sh')), start + timedelta(minutes=2))
+
+        self.succeed(self.job('load.sh'), start + timedelta(minutes=3))
+        self.assertEqual(self.runnable_names(), [])
+
+    def test_downstream_created_first(self):
+        # Not a question of which job object is older, the upstream job has to have succeeded
+        self.store.fetch(self.test_folder / '1day/at0200/load.sh')
+        self.store.fetch(self.test_folder / '1day/at0200/transform_a.sh')
+        self.explorer.run_discovery()
+
+        self.job('extract.sh').last_execution = datetime.now() - timedelta(days=1)
+        self.assertEqual(self.runnable_names(), ['extract.sh'])
+
+        self.succeed(self.job('extract.sh'), datetime.now())
+        self.assertEqual(self.runnable_names(), ['transform_a.sh', 'transform_b.sh'])
+
+    def test_failed_upstream_holds_pipeline(self):
+        self.explorer.run_discovery()
+
+        extract = self.job('extract.sh')
+        self.succeed(extract, datetime.now())
+        extract.lock()
+        extract.fail()
+
+        self.assertNotIn('transform_a.sh', self.runnable_names())
+
+    def test_problems_are_held(self):
+        self.write('1day/at0200/extract.sh.deps', 'load.sh\n')
+        self.write('1min/orphan.sh')
+        self.write('1min/orphan.sh.deps', 'missing.sh\n')
+
+        self.explorer.run_discovery()
+
+        held = {path.name for path in self.store.dependencies.held}
+        self.assertEqual(held, {'extract.sh', 'transform_a.sh', 'transform_b.sh', 'load.sh', 'orphan.sh'})
+        self.assertEqual(self.runnable_names(), [])
+
+    def test_pipeline_shares_shard_key(self):
+        self.explorer.run_discovery()
+
+        roots = {self.store.dependencies.pipeline_root(job.script_path) for job in self.store.store.values()}
+        self.assertEqual(roots, {self.job('extract.sh').script_path})
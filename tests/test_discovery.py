@@ -1,6 +1,7 @@
 import datetime
 from pathlib import Path
-from unittest import TestCase
+from threading import Lock
+from unittest import TestCase, mock
 
 from pycron import SettingsSingleton
 from pycron.job_discovery.folder_discovery import JobFolderScanner
@@ -71,3 +72,23 @@ class TestFolderDiscovery(TestCase):
         for job in self.explorer.store.store.keys():
             self.assertIn(job, [x.absolute() for x in self.jobs])
 
+
+    def test_store_lock(self):
+        store_lock = Lock()
+        explorer = JobFolderScanner(self.explorer.store, store_lock)
+        held = []
+
+        def recording(method):
+            def call(*args):
+                held.append((method.__name__, store_lock.locked()))
+                return method(*args)
+            return call
+
+        # The folder is read without the lock, the jobs are added holding it
+        with mock.patch.object(explorer, 'scan_folder', recording(explorer.scan_folder)), \
+                mock.patch.object(explorer.store, 'fetch', recording(explorer.store.fetch)):
+            explorer.run_discovery()
+
+        self.assertEqual(held, [('scan_folder', False)] + [('fetch', True)] * 5)
+        self.assertEqual(4, len(explorer.store.store))
+        self.assertFalse(store_lock.locked())
@@ -0,0 +1,113 @@
+import io
+import json
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import TestCase
+
+from pycron import SettingsSingleton
+from pycron.commands import export_history
+from pycron.jobs.history import RunHistory
+from pycron.persistance.pickle_persistence import MemStore
+
+
+class TestRunHistory(TestCase):
+    def test_ring_wraps(self):
+        history = RunHistory(3)
+        start = datetime(2021, 1, 1)
+        for duration in range(1, 6):
+            history.append(start, start + timedelta(seconds=duration), duration, 0.5)
+
+        self.assertEqual(len(history), 3)
+        # Only the three most recent runs are left, oldest first
+        self.assertEqual([exit_code for _, _, exit_code, _ in history.runs()], [3, 4, 5])
+
+    def test_percentiles(self):
+        history = RunHistory(100)
+        start = datetime(2021, 1, 1)
+        for duration in range(1, 101):
+            history.append(start, start + timedelta(seconds=duration), 0, 0)
+
+        self.assertIsNone(history.percentiles, msg='Appending should not compute the percentiles')
+        self.assertEqual(history.p50, 50)
+        self.assertEqual(history.p95, 95)
+
+        # Recomputed on the next read after an append
+        history.append(start, start + timedelta(seconds=1000), 0, 0)
+        self.assertIsNone(history.percentiles)
+        self.assertEqual(history.p95, 96)
+
+        self.assertIsNone(RunHistory(3).p50)
+
+    def test_older_state(self):
+        history = RunHistory(3)
+        start = datetime(2021, 1, 1)
+        history.append(start, start + timedelta(seconds=2), 0, 0)
+
+        # Pickled while p50 and p95 were kept up to date on append
+        state = {name: getattr(history, name) for name in ('capacity', 'starts', 'ends', 'lags', 'exit_codes', 'head',
+                                                            'count')}
+        loaded = RunHistory.__new__(RunHistory)
+        loaded.__setstate__({**state, 'p50': 2.0, 'p95': 2.0})
+        self.assertEqual((loaded.p50, loaded.p95), (2, 2))
+
+
+class TestHistoryExport(TestCase):
+    def setUp(self) -> None:
+        self.test_folder = test_folder = Path('test_folder').absolute()
+        test_folder.mkdir(exist_ok=True)
+
+        self.settings = settings = SettingsSingleton.get_settings()
+        settings.set_jobs_folder(test_folder)
+        settings.PERSISTENCE_FILE = test_folder / 'jar.pickle'
+
+        script = test_folder / '1min/a.sh'
+        script.parent.mkdir(parents=True, exist_ok=True)
+        script.write_text('#!/bin/sh\n')
+        script.chmod(0o755)
+
+        store = MemStore(nuke_persistence=True)
+        job = store.fetch(script)
+        for exit_code in (0, 1):
+            job.lock()
+            job.unlock()
+            # Runs longer than an hour must not wrap around in runtime
+            job.unlocked_at = job.locked_at + timedelta(hours=2, seconds=5)
+            job.record_run(exit_code)
+        self.job = job
+        MemStore.serialize_store(store.store)
+
+    def tearDown(self) -> None:
+        for path in sorted(self.test_folder.rglob('*'), reverse=True):
+            path.rmdir() if path.is_dir() else path.unlink()
+        self.test_folder.rmdir()
+
+    def run_export(self, *arguments):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            exit_code = export_history({'arguments': list(arguments)})
+        return exit_code, output.getvalue()
+
+    def test_runtime_over_an_hour(self):
+        self.assertEqual(self.job.runtime, '2 hours, 0 minutes, 5 seconds')
+
+    def test_csv(self):
+        exit_code, output = self.run_export()
+
+        self.assertEqual(exit_code, 0)
+        lines = output.splitlines()
+        self.assertEqual(lines[0], 'file,start,end,duration_seconds,exit_code,lag_seconds')
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[2].startswith('1min/a.sh,'))
+
+    def test_jsonl(self):
+        exit_code, output = self.run_export('jsonl')
+
+        self.assertEqual(exit_code, 0)
+        rows = [json.loads(line) for line in output.splitlines()]
+        self.assertEqual([row['exit_code'] for row in rows], [0, 1])
+        self.assertEqual(rows[0]['duration_seconds'], 7205)
+
+    def test_unknown_format(self):
+        exit_code, _ = self.run_export('xml')
+        self.assertEqual(exit_code, 2)
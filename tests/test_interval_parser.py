@@ -0,0 +1,87 @@
+from datetime import timedelta
+from pathlib import Path
+from unittest import TestCase
+
+from pycron import SettingsSingleton
+from pycron.interval.cron import Cron
+from pycron.interval.hours import Hours
+from pycron.interval.parser import IntervalParser, interval_parser
+from pycron.jobs.jobs import Job, InvalidJobException
+from pycron.persistance.compact_store import CompactStoreCodec
+
+
+class TestIntervalParser(TestCase):
+    def setUp(self) -> None:
+        self.parser = IntervalParser()
+
+    def test_folder(self):
+        interval = self.parser.folder(('1hour', 'at0030', 'within0015'))
+
+        expected = Hours(1)
+        expected.at('0030')
+        expected.within(timedelta(minutes=15))
+        self.assertEqual(interval, expected)
+
+        # Folders below the interval folders only organise the jobs
+        self.assertIs(self.parser.folder(('1hour', 'at0030', 'within0015')), interval)
+        self.assertIs(self.parser.folder(('5min', 'reports', 'daily')), self.parser.folder(('5min',)))
+        self.assertIs(self.parser.folder(('1hour', 'at0030', 'reports', 'daily')), self.parser.folder(('1hour',)))
+
+    def test_invalid(self):
+        for parts in [('5mins',), ('0min',), ('1hour', 'at2460'), ('1hour', 'at0030', 'within9900')]:
+            with self.subTest(parts=parts):
+                with self.assertRaises(ValueError):
+                    self.parser.folder(parts)
+                # Rejected again from the cache, with the same reason
+                with self.assertRaises(ValueError):
+                    self.parser.folder(parts)
+
+    def test_cron(self):
+        cron = self.parser.cron('30  6,18 * * mon-fri')
+        self.assertEqual(cron, Cron('30 6,18 * * mon-fri'))
+        self.assertIs(self.parser.cron('30 6,18 * * mon-fri'), cron)
+        # Equal schedules written differently share one instance
+        self.assertIs(self.parser.cron('0 0 * * *'), self.parser.cron('@daily'))
+
+        with self.assertRaises(ValueError):
+            self.parser.cron('61 * * * *')
+
+
+class TestSharedIntervals(TestCase):
+    def setUp(self) -> None:
+        self.settings = SettingsSingleton.get_settings()
+        self.job_folder = self.settings.JOBS_FOLDER
+
+    def test_jobs_share_intervals(self):
+        a = Job(self.job_folder / '1day/at0200/a.sh')
+        b = Job(self.job_folder / '1day/at0200/b.sh')
+        self.assertIs(a.interval, b.interval)
+        self.assertIsNot(a.interval, Job(self.job_folder / '1day/at0300/c.sh').interval)
+
+        with self.assertRaises(InvalidJobException):
+            Job(self.job_folder / '1day/at0060/d.sh')
+
+    def test_loaded_jobs_share_intervals(self):
+        job = Job(self.job_folder / '15min/a.sh')
+        store = {job.script_path: job}
+
+        loaded = CompactStoreCodec.decode(CompactStoreCodec.encode(store), self.job_folder)
+        self.assertIs(loaded[job.script_path].interval, job.interval)
+        self.assertIs(loaded[job.script_path].interval, interval_parser.folder(('15min',)))
+
+
+class TestSharedRootIntervals(TestCase):
+    def setUp(self) -> None:
+        self.test_folder = test_folder = Path('test_folder').absolute()
+        self.settings = settings = SettingsSingleton.get_settings()
+        settings.EXTRA_JOB_ROOTS = {'team_a': test_folder / 'team_a'}
+
+    def tearDown(self) -> None:
+        self.settings.EXTRA_JOB_ROOTS = {}
+
+    def test_roots_share_intervals(self):
+        default = Job(self.settings.JOBS_FOLDER / '1hour/at0030/a.sh')
+        team_a = Job(self.test_folder / 'team_a/1hour/at0030/a.sh')
+
+        self.assertEqual(team_a.root, 'team_a')
+        self.assertIs(default.interval, team_a.interval)
@@ -0,0 +1,178 @@
+import os
+import signal
+from datetime import datetime
+from pathlib import Path
+from time import sleep
+from unittest import TestCase
+
+from pycron import SettingsSingleton
+from types import SimpleNamespace
+
+from pycron.clock import VirtualClock, virtual_clock
+
+from pycron.executor.folder_executor import FolderExecutor
+from pycron.executor.job_process import BatchProcess, JobProcess
+from pycron.jobs.jobs import Job
+
+
+class TestJobProcess(TestCase):
+    def setUp(self) -> None:
+        self.settings = settings = SettingsSingleton.get_settings()
+
+        self.test_folder = test_folder = Path('test_folder').absolute()
+        (test_folder / '1min').mkdir(parents=True, exist_ok=True)
+        settings.set_jobs_folder(test_folder)
+        settings.set_logs_folder(test_folder)
+
+    def tearDown(self) -> None:
+        self._recursive_delete(self.test_folder)
+
+    def _recursive_delete(self, path: Path):
+        for sub_path in path.iterdir():
+            if sub_path.is_dir():
+                self._recursive_delete(sub_path)
+            else:
+                sub_path.unlink()
+        path.rmdir()
+
+    def create_job(self, script: str, name: str = 'test.sh') -> Job:
+        script_path = self.test_folder / '1min' / name
+        script_path.write_text(f'#!/bin/sh\n{script}\n')
+        script_path.chmod(0o755)
+
+        job = Job(script_path)
+        job.lock()
+        return job
+
+    def test_run(self):
+        """
+        Test output and exit code are collected and the run files cleaned up
+        """
+        job = self.create_job('echo hello; echo oops >&2; exit 3')
+
+        process = JobProcess(job)
+        process.start()
+        self.assertIsNotNone(job.pid)
+
+        process.wait()
+        feedback = process.result()
+
+        self.assertEqual(feedback.returncode, 3)
+        self.assertEqual(feedback.stdout, b'hello\n')
+        self.assertEqual(feedback.stderr, b'oops\n')
+        self.assertEqual([], list(JobProcess.run_folder().iterdir()), msg='Run files were not cleaned up')
+
+    def test_reattach(self):
+        """
+        Test a run started by another daemon can be waited on and collected by pid
+        """
+        job = self.create_job('sleep 0.5; echo adopted')
+
+        JobProcess(job).start()
+
+        # A fresh daemon only knows what was persisted on the job
+        adopted = JobProcess.reattach(job)
+        self.assertTrue(adopted.running())
+
+        # The original daemon is still the parent, reap the child here so it does not linger as a zombie
+        os.waitpid(job.pid, 0)
+        self.assertFalse(adopted.running())
+
+        feedback = adopted.result()
+        self.assertEqual(feedback.returncode, 0)
+        self.assertEqual(feedback.stdout, b'adopted\n')
+
+    def test_interrupted(self):
+        """
+        Test a run killed before it recorded an exit code is reported as interrupted
+        """
+        job = self.create_job('sleep 30')
+
+        JobProcess(job).start()
+        os.killpg(job.pid, signal.SIGKILL)
+        os.waitpid(job.pid, 0)
+
+        adopted = JobProcess.reattach(job)
+        self.assertFalse(adopted.running())
+        self.assertIsNone(adopted.result())
+
+    def test_batch(self):
+        """
+        Test the jobs of a batch run one after the other and their results are collected one by one
+        """
+        jobs = [self.create_job('echo first', 'a.sh'),
+                self.create_job('sleep 0.3; echo second >&2; exit 4', 'b.sh'),
+                self.create_job('echo third', 'c.sh')]
+
+        batch = BatchProcess(jobs)
+        batch.start()
+        self.assertEqual({job.pid for job in jobs}, {batch.process.pid})
+
+        collected = []
+        while batch.current() is not None:
+            finished = batch.finished()
+            if len(collected) == 0 and finished:
+                # The second job is still running when the first one is reported
+                self.assertEqual(batch.current().job, jobs[1])
+            collected.extend(finished)
+            sleep(BatchProcess.POLL_INTERVAL)
+
+        self.assertEqual([run.job for run in collected], jobs)
+        # Each run starts when the one before it finished
+        self.assertLess(collected[0].started_at, collected[0].finished_at)
+        self.assertEqual(collected[1].started_at, collected[0].finished_at)
+        self.assertAlmostEqual((collected[1].finished_at - collected[1].started_at).total_seconds(), 0.3, delta=0.1)
+        results = [run.result() for run in collected]
+        self.assertEqual([result.returncode for result in results], [0, 4, 0])
+        self.assertEqual(results[0].stdout, b'first\n')
+        self.assertEqual(results[1].stderr, b'second\n')
+        self.assertEqual([], list(JobProcess.run_folder().iterdir()), msg='Run files were not cleaned up')
+
+    def test_batch_clock(self):
+        """
+        Test the first run of a batch starts on the scheduler's clock, the one its lock and timeout use
+        """
+        started = datetime(2021, 6, 7, 2, 0)
+        with virtual_clock(VirtualClock(started)):
+            batch = BatchProcess([self.create_job('true')])
+            batch.start()
+        batch.process.wait()
+
+        self.assertEqual(batch.runs[0].started_at, started)
+
+    def test_batch_interrupted(self):
+        """
+        Test the jobs of a killed batch that had not finished are reported as interrupted
+        """
+        jobs = [self.create_job('echo done', 'a.sh'), self.create_job('sleep 30', 'b.sh'),
+                self.create_job('echo never', 'c.sh')]
+
+        batch = BatchProcess(jobs)
+        batch.start()
+        while not jobs[1].pid or not JobProcess(jobs[1]).stdout_file.exists():
+            sleep(0.01)
+        os.killpg(batch.process.pid, signal.SIGKILL)
+        batch.process.wait()
+
+        results = [run.result() for run in batch.finished()]
+        self.assertEqual(results[0].returncode, 0)
+        self.assertEqual(results[1:], [None, None])
+
+    def test_batches(self):
+        """
+        Test only the jobs of BATCH_FOLDERS are batched, per folder and up to BATCH_MAX_JOBS at a time
+        """
+        self.settings.BATCH_FOLDERS = (Path('1min'),)
+        self.settings.BATCH_MAX_JOBS = 2
+        try:
+            jobs = [self.create_job('true', f'{name}.sh') for name in 'abc']
+            other = Job(self.test_folder / '5min/d.sh')
+            executor = SimpleNamespace(store=SimpleNamespace(scheduled=lambda job: True))
+
+            batches, single = FolderExecutor.batches(executor, [*jobs, other])
+        finally:
+            self.settings.BATCH_FOLDERS = ()
+            self.settings.BATCH_MAX_JOBS = 50
+
+        self.assertEqual(batches, [jobs[:2], jobs[2:]])
+        self.assertEqual(single, [other])
@@ -0,0 +1,122 @@
+import os
+from pathlib import Path
+from unittest import TestCase
+
+from pycron import SettingsSingleton
+from pycron.executor.job_process import JobProcess
+from pycron.job_discovery.folder_discovery import JobFolderScanner
+from pycron.jobs.jobs import InvalidJobException, Job
+from pycron.jobs.metadata import NO_METADATA, metadata_cache
+from pycron.persistance.pickle_persistence import MemStore
+
+
+class TestJobMetadata(TestCase):
+    def setUp(self) -> None:
+        self.test_folder = test_folder = Path('test_folder').absolute()
+        test_folder.mkdir(exist_ok=True)
+
+        self.settings = settings = SettingsSingleton.get_settings()
+        settings.set_jobs_folder(test_folder)
+        settings.set_logs_folder(test_folder)
+        settings.PERSISTENCE_FILE = test_folder / 'jar.pickle'
+
+        self.write('.pycron.ini', '[job]\ntimeout = 100\n\n[environment]\nTeam = data\nTARGET = /mnt\n')
+        self.write('1day/.pycron.ini', '[job]\nmax_concurrency = 2\n\n[environment]\nTARGET = /srv\n')
+        self.write('1day/at0200/backup.sh.ini', '[job]\ntimeout = 5\nworking_directory = ..\n')
+        for script in ['1day/at0200/backup.sh', '1day/at0200/reindex.sh', '1day/at0200/vacuum.sh', '1min/poll.sh']:
+            self.write(script, '#!/bin/sh\n')
+
+    def tearDown(self) -> None:
+        for path in sorted(self.test_folder.rglob('*'), reverse=True):
+            path.rmdir() if path.is_dir() else path.unlink()
+        self.test_folder.rmdir()
+
+    def write(self, relative_path: str, content: str):
+        path = self.test_folder / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+        path.chmod(0o755)
+
+    def job(self, relative_path: str) -> Job:
+        return Job(self.test_folder / relative_path)
+
+    def test_inheritance(self):
+        backup, reindex, poll = (self.job(script) for script in
+                                 ['1day/at0200/backup.sh', '1day/at0200/reindex.sh', '1min/poll.sh'])
+
+        self.assertEqual(backup.metadata.timeout, 5)
+        self.assertEqual(backup.metadata.working_directory, self.test_folder / '1day/at0200/..')
+        self.assertEqual(backup.metadata.environment, {'Team': 'data', 'TARGET': '/srv'})
+        self.assertEqual((backup.metadata.max_concurrency, backup.metadata.concurrency_group), (2, Path('1day')))
+
+        self.assertEqual(reindex.metadata.timeout, 100)
+        self.assertIsNone(reindex.metadata.working_directory)
+        self.assertEqual(poll.metadata.environment, {'Team': 'data', 'TARGET': '/mnt'})
+        self.assertIsNone(poll.metadata.concurrency_group)
+
+        (self.test_folder / '.pycron.ini').unlink()
+        self.assertIs(self.job('1min/poll.sh').metadata, NO_METADATA)
+
+    def test_cached_per_pass(self):
+        with metadata_cache.discovery_pass():
+            reindex, vacuum = self.job('1day/at0200/reindex.sh'), self.job('1day/at0200/vacuum.sh')
+            # Jobs with the same sidecars share their metadata
+            self.assertIs(reindex.metadata, vacuum.metadata)
+
+            self.write('1day/.pycron.ini', '[job]\nmax_concurrency = 3\n')
+            os.utime(self.test_folder / '1day/.pycron.ini', ns=(1, 1))
+            self.assertEqual(self.job('1day/at0200/vacuum.sh').metadata.max_concurrency, 2)
+
+        parsed = metadata_cache.files[self.test_folder / '.pycron.ini']
+        with metadata_cache.discovery_pass():
+            reindex.reload_schedule()
+        self.assertEqual(reindex.metadata.max_concurrency, 3)
+        # Unchanged files are not parsed again
+        self.assertIs(metadata_cache.files[self.test_folder / '.pycron.ini'], parsed)
+
+    def test_invalid(self):
+        for content in ['[job]\ntimeout = soon\n', '[job]\nretries = 3\n', '[jobs]\ntimeout = 1\n',
+                        '[job]\nmax_concurrency = 2\n']:
+            self.write('1min/poll.sh.ini', content)
+            with self.assertRaises(InvalidJobException, msg=content):
+                self.job('1min/poll.sh')
+
+        jobs, invalid = JobFolderScanner(store=None).parse_jobs()
+        # Sidecars are never jobs themselves
+        self.assertEqual(sorted(str(job.relative_name) for job in jobs),
+                         ['1day/at0200/backup.sh', '1day/at0200/reindex.sh', '1day/at0200/vacuum.sh'])
+        self.assertEqual([excp.args[0] for excp in invalid], [self.test_folder / '1min/poll.sh'])
+
+    def test_concurrency_cap(self):
+        store = MemStore(nuke_persistence=True)
+        jobs = [store.fetch(self.test_folder / script) for script in
+                ['1day/at0200/backup.sh', '1day/at0200/reindex.sh', '1day/at0200/vacuum.sh', '1min/poll.sh']]
+        for job in jobs:
+            job.failed_attempts = 1
+            job.last_failed_execution = job.last_execution.replace(year=2000)
+
+        jobs[0].lock()
+        # One of the 1day jobs is running, one more may start
+        self.assertEqual(store.runnable(), [jobs[1], jobs[3]])
+
+    def test_process(self):
+        self.write('1day/at0200/backup.sh', '#!/bin/sh\necho "$TARGET $Team $(pwd)"\n')
+        job = self.job('1day/at0200/backup.sh')
+        job.lock()
+        process = JobProcess(job)
+        process.start()
+        process.wait()
+        result = process.result()
+        self.assertEqual(result.stdout.decode(), f'/srv data {self.test_folder / "1day"}\n')
+        self.assertFalse(result.timed_out)
+
+        self.write('1day/at0200/backup.sh', '#!/bin/sh\nsleep 30\n')
+        self.write('1day/at0200/backup.sh.ini', '[job]\ntimeout = 0.2\n')
+        job = self.job('1day/at0200/backup.sh')
+        job.lock()
+        process = JobProcess(job)
+        process.start()
+        process.wait()
+        result = process.result()
+        self.assertTrue(result.timed_out)
+        self.assertNotEqual(result.returncode, 0)
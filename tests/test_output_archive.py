@@ -0,0 +1,114 @@
+import io
+import os
+import shutil
+import subprocess
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import TestCase
+from uuid import uuid4
+
+from pycron import SettingsSingleton
+from pycron.commands import show_output
+from pycron.persistance.output_archive import OutputArchive
+from pycron.persistance.pickle_persistence import MemStore
+
+
+class TestOutputArchive(TestCase):
+    def setUp(self) -> None:
+        self.test_folder = test_folder = Path('test_folder').absolute()
+        test_folder.mkdir(exist_ok=True)
+
+        self.settings = settings = SettingsSingleton.get_settings()
+        settings.set_jobs_folder(test_folder)
+        settings.set_logs_folder(test_folder)
+        settings.PERSISTENCE_FILE = test_folder / 'jar.pickle'
+
+        self.archive = OutputArchive(OutputArchive.archive_folder())
+
+    def tearDown(self) -> None:
+        self.settings.ARCHIVE_COMPRESSION = 'zlib'
+        self.settings.ARCHIVE_MAX_SIZE_MB = 1024
+        for path in sorted(self.test_folder.rglob('*'), reverse=True):
+            path.rmdir() if path.is_dir() else path.unlink()
+        self.test_folder.rmdir()
+
+    def test_find(self):
+        job_uuid = uuid4()
+        run_uuids = [uuid4() for _ in range(50)]
+        for number, run_uuid in enumerate(run_uuids):
+            self.archive.append(job_uuid, run_uuid, datetime.now(), {'output': f'run {number}\n' * 100})
+
+        self.assertEqual(self.archive.find(run_uuids[17])['output'], 'run 17\n' * 100)
+        self.assertIsNone(self.archive.find(uuid4()))
+        self.assertEqual([run for run, _ in self.archive.runs_of(job_uuid)], run_uuids)
+
+        # Repetitive output compresses to a fraction of its size
+        segment, = self.archive.segments()
+        self.assertLess(segment.stat().st_size, 50 * 700 / 10)
+
+    def test_lzma(self):
+        self.settings.ARCHIVE_COMPRESSION = 'lzma'
+        run_uuid = uuid4()
+        self.archive.append(uuid4(), run_uuid, datetime.now(), {'output': 'lzma'})
+
+        self.settings.ARCHIVE_COMPRESSION = 'zlib'
+        self.assertEqual(self.archive.find(run_uuid)['output'], 'lzma')
+
+    def test_retention(self):
+        old_run = uuid4()
+        self.archive.append(uuid4(), old_run, datetime.now() - timedelta(days=60), {'output': 'old'})
+
+        # Starting a new daemon starts a new segment, the old one is past ARCHIVE_MAX_AGE_DAYS
+        segment, = self.archive.segments()
+        old = (datetime.now() - timedelta(days=60)).timestamp()
+        os.utime(segment, (old, old))
+
+        archive = OutputArchive(OutputArchive.archive_folder())
+        new_run = uuid4()
+        archive.append(uuid4(), new_run, datetime.now(), {'output': 'new'})
+
+        self.assertIsNone(archive.find(old_run))
+        self.assertEqual(archive.find(new_run)['output'], 'new')
+        self.assertEqual(len(archive.segments()), 1)
+        # The keys of the removed segment went with it
+        self.assertEqual(archive._read_bucket('run', old_run.bytes), b'')
+
+    def test_keys_of_older_archive(self):
+        job_uuid = uuid4()
+        old_runs = [uuid4() for _ in range(20)]
+        for run_uuid in old_runs:
+            self.archive.append(job_uuid, run_uuid, datetime.now(), {'output': str(run_uuid)})
+
+        # Written before there were keys, found by scanning the segment indexes
+        shutil.rmtree(self.archive.keys_folder)
+        self.assertEqual(self.archive.find(old_runs[3])['output'], str(old_runs[3]))
+
+        # The next daemon keys the runs already archived
+        archive = OutputArchive(OutputArchive.archive_folder())
+        new_run = uuid4()
+        archive.append(job_uuid, new_run, datetime.now(), {'output': 'new'})
+
+        self.assertTrue(archive.keys_folder.is_dir())
+        self.assertEqual(archive.find(old_runs[3])['output'], str(old_runs[3]))
+        self.assertEqual([run for run, _ in archive.runs_of(job_uuid)], old_runs + [new_run])
+        self.assertEqual(len(archive.segments()), 2)
+
+    def test_store_archives_output(self):
+        script = self.test_folder / '1min/a.sh'
+        script.parent.mkdir(parents=True, exist_ok=True)
+        script.write_text('#!/bin/sh\n')
+
+        store = MemStore(nuke_persistence=True)
+        job = store.fetch(script)
+        job.lock()
+        store.job_failed(job, subprocess.CompletedProcess([script], 3, b'some output\n', b'some error\n'))
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            exit_code = show_output({'arguments': ['1min/a.sh']})
+
+        self.assertEqual(exit_code, 0)
+        self.assertIn(str(job.run_uuid), output.getvalue())
+        self.assertIn('some output', output.getvalue())
+        self.assertIn('some error', output.getvalue())
@@ -0,0 +1,95 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import TestCase
+
+from pycron import SettingsSingleton
+from pycron.clock import VirtualClock, virtual_clock
+from pycron.jobs.dependencies import DependencyGraph
+from pycron.jobs.jobs import InvalidJobException, Job
+from pycron.jobs.packing import WindowPlanner
+from pycron.jobs.usage import USAGE_FIELDS
+from pycron.persistance.compact_store import CompactStoreCodec
+from pycron.persistance.pickle_persistence import MemStore
+from pycron.simulation.simulator import Simulator
+
+
+class TestWindowPlanner(TestCase):
+    def setUp(self) -> None:
+        self.test_folder = test_folder = Path('test_folder').absolute()
+        test_folder.mkdir(exist_ok=True)
+
+        self.settings = settings = SettingsSingleton.get_settings()
+        settings.set_jobs_folder(test_folder)
+        settings.PERSISTENCE_FILE = test_folder / 'jar.pickle'
+        settings.SLEEP_DURATION = 1
+
+        # Jobs created at midnight first run in the 02:00 slot
+        self.start = datetime(2021, 6, 7)
+
+    def tearDown(self) -> None:
+        for path in sorted(self.test_folder.rglob('*'), reverse=True):
+            path.rmdir() if path.is_dir() else path.unlink()
+        self.test_folder.rmdir()
+
+    def jobs(self, scripts):
+        with virtual_clock(VirtualClock(self.start)):
+            return {job.script_path: job for job in (Job(self.test_folder / script) for script in scripts)}
+
+    def test_within_folder(self):
+        job = self.jobs(['1day/at0200/within0330/backup.sh'])[self.test_folder / '1day/at0200/within0330/backup.sh']
+        self.assertEqual(job.interval.window, timedelta(hours=3, minutes=30))
+        self.assertEqual(job.next_execution, datetime(2021, 6, 7, 2))
+
+        job.window_offset = 5400
+        self.assertEqual(job.next_execution, datetime(2021, 6, 7, 3, 30))
+
+        for script in ['1hour/at0030/within0100/a.sh', '1day/at0200/within1x00/b.sh', '5min/at0000/within0001/c.sh']:
+            with self.assertRaises(InvalidJobException, msg=script):
+                Job(self.test_folder / script)
+
+    def test_spread_over_window(self):
+        scripts = [f'1day/at0200/within0300/job{index:02}.sh' for index in range(30)]
+        jobs = self.jobs(scripts)
+
+        WindowPlanner(lambda job: 20 * 60).plan(jobs.values(), self.start)
+
+        starts = Counter(job.next_execution for job in jobs.values())
+        # Nine 20 minute runs fit in the window one after the other, 30 jobs need 4 at a time
+        self.assertEqual(max(starts.values()), 4)
+        self.assertEqual(min(starts), datetime(2021, 6, 7, 2))
+        self.assertEqual(max(starts), datetime(2021, 6, 7, 4, 40))
+
+    def test_fixed_and_heavy_jobs(self):
+        jobs = self.jobs(['1day/at0200/nightly.sh', '1day/at0200/within0200/light.sh',
+                          '1day/at0200/within0200/heavy.sh'])
+        nightly, light, heavy = jobs.values()
+
+        # Four cores busy on average, it goes first and keeps away from the fixed nightly job
+        heavy.record_usage({**dict.fromkeys(USAGE_FIELDS, 0), 'cpu_user_seconds': 4 * 3600})
+        WindowPlanner(lambda job: 3600).plan(jobs.values(), self.start)
+
+        self.assertEqual(nightly.window_offset, None)
+        self.assertEqual(heavy.next_execution, datetime(2021, 6, 7, 3))
+        # Both hours are loaded, the light job runs along the nightly one rather than the heavy one
+        self.assertEqual(light.next_execution, datetime(2021, 6, 7, 2))
+
+        # The offset survives the store file and holds for the next night
+        table = CompactStoreCodec.decode(CompactStoreCodec.encode(jobs), self.test_folder)
+        restored = table[heavy.script_path]
+        self.assertEqual(restored.interval.window, timedelta(hours=2))
+        restored.success(datetime(2021, 6, 7, 4))
+        self.assertEqual(restored.next_execution, datetime(2021, 6, 8, 3))
+
+    def test_simulated_night(self):
+        jobs = self.jobs([f'1day/at0200/within0300/job{index:02}.sh' for index in range(30)])
+        store = MemStore(jobs=jobs)
+        store.dependencies = DependencyGraph.from_scripts(list(jobs))
+
+        # Runs start on the loop's first tick after their minute, a run of exactly 20 minutes would overlap the next
+        report = Simulator(store, {path: 19 * 60 + 30 for path in jobs}, self.start).run(self.start + timedelta(days=2))
+
+        self.assertEqual(report.runs, 60)
+        self.assertEqual(report.peak_concurrency[0], 4)
+        # Every run finished inside the window
+        self.assertTrue(all(job.last_execution <= datetime(2021, 6, 8, 5) for job in jobs.values()))
@@ -0,0 +1,96 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import TestCase
+
+from pycron import SettingsSingleton
+from pycron.jobs.jobs import InvalidJobException, Job
+from pycron.jobs.priority import wait_report
+from pycron.persistance.pickle_persistence import MemStore
+
+
+class TestPriorities(TestCase):
+    def setUp(self) -> None:
+        self.test_folder = test_folder = Path('test_folder').absolute()
+        test_folder.mkdir(exist_ok=True)
+
+        self.settings = settings = SettingsSingleton.get_settings()
+        settings.set_jobs_folder(test_folder)
+        settings.PERSISTENCE_FILE = test_folder / 'jar.pickle'
+        settings.MAX_RUNNING_JOBS = 0
+
+        self.write('5min/.pycron.ini', '[job]\npriority = critical\n')
+        self.write('1day/.pycron.ini', '[job]\npriority = low\nmax_concurrency = 3\n')
+        self.write('1day/report.sh.ini', '[job]\npriority = high\n')
+
+        self.store = MemStore(nuke_persistence=True)
+
+    def tearDown(self) -> None:
+        self.settings.MAX_RUNNING_JOBS = 0
+
+        for path in sorted(self.test_folder.rglob('*'), reverse=True):
+            path.rmdir() if path.is_dir() else path.unlink()
+        self.test_folder.rmdir()
+
+    def write(self, relative_path: str, content: str):
+        path = self.test_folder / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+    def due(self, script: str, overdue: timedelta) -> Job:
+        self.write(script, '#!/bin/sh\n')
+        job = self.store.fetch(self.test_folder / script)
+        job.last_execution = datetime.now() - job.interval.time_delta() - overdue
+        return job
+
+    def test_classes(self):
+        check, report, batch, poll = (self.due(script, timedelta()) for script in
+                                      ['5min/check.sh', '1day/report.sh', '1day/batch.sh', '1min/poll.sh'])
+        self.assertEqual([job.priority for job in (check, report, batch, poll)], ['critical', 'high', 'low', 'normal'])
+        self.assertEqual(report.metadata.max_concurrency, 3)
+
+        self.write('1min/poll.sh.ini', '[job]\npriority = urgent\n')
+        with self.assertRaises(InvalidJobException):
+            Job(self.test_folder / '1min/poll.sh')
+
+    def test_due_order(self):
+        batches = [self.due(f'1day/batch{index}.sh', timedelta(hours=index)) for index in range(2)]
+        poll = self.due('1min/poll.sh', timedelta(hours=5))
+        check = self.due('5min/check.sh', timedelta())
+
+        # Most urgent class first, the longest due first within a class
+        self.assertEqual(self.store.runnable(), [check, poll, batches[1], batches[0]])
+
+    def test_queue_jumping(self):
+        batches = [self.due(f'1day/batch{index}.sh', timedelta(hours=1)) for index in range(6)]
+        check = self.due('5min/check.sh', timedelta())
+
+        # The folder cap lets 3 of the low priority jobs through, the critical job is admitted first
+        runnable = self.store.runnable()
+        self.assertEqual(runnable, [check] + batches[:3])
+
+        self.settings.MAX_RUNNING_JOBS = 3
+        for job in batches[:2]:
+            job.lock()
+        # One slot is free and goes to the critical job, although the low priority jobs have been due for longer
+        self.assertEqual(self.store.runnable(), [check])
+
+        check.lock()
+        self.assertEqual(self.store.runnable(), [])
+
+    def test_wait_report(self):
+        check, poll = self.due('5min/check.sh', timedelta()), self.due('1min/poll.sh', timedelta())
+        start = datetime(2021, 6, 7)
+        for lag in range(1, 21):
+            for job, job_lag in ((check, lag / 2), (poll, lag)):
+                job.locked_at, job.unlocked_at, job.start_lag = start, start + timedelta(seconds=1), job_lag
+                job.record_run(0)
+
+        rows = {row['priority']: row for row in wait_report(self.store.store.values())}
+        self.assertEqual(Counter({name: row['jobs'] for name, row in rows.items()}),
+                         Counter({'critical': 1, 'normal': 1, 'high': 0, 'low': 0}))
+        self.assertEqual((rows['critical']['runs'], rows['critical']['p50_wait_seconds'],
+                          rows['critical']['p99_wait_seconds'], rows['critical']['max_wait_seconds']),
+                         (20, 5.0, 10.0, 10.0))
+        self.assertEqual(rows['normal']['p95_wait_seconds'], 19)
+        self.assertIsNone(rows['low']['p50_wait_seconds'])
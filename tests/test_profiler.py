@@ -0,0 +1,100 @@
+import pstats
+import signal
+import tracemalloc
+from pathlib import Path
+from unittest import TestCase, mock
+
+from pycron import SettingsSingleton
+from pycron.executor.profiler import Profiler
+
+
+class _Executor:
+    def __init__(self):
+        self.recorded = []
+
+    def record_result(self, job, process):
+        self.recorded.append(job)
+        return sorted(range(1000), reverse=True)
+
+
+class TestProfiler(TestCase):
+    def setUp(self) -> None:
+        self.test_folder = test_folder = Path('test_folder').absolute()
+        test_folder.mkdir(exist_ok=True)
+
+        self.settings = settings = SettingsSingleton.get_settings()
+        settings.set_logs_folder(test_folder)
+
+        self.executor = _Executor()
+        self.profiler = Profiler(self.executor)
+
+    def tearDown(self) -> None:
+        for path in sorted(self.test_folder.rglob('*'), reverse=True):
+            path.rmdir() if path.is_dir() else path.unlink()
+        self.test_folder.rmdir()
+
+    def test_cpu(self):
+        self.assertEqual(self.profiler.toggle_cpu(), 'CPU profiling started')
+        # Recording results is only wrapped while profiling
+        self.assertIn('record_result', vars(self.executor))
+        self.executor.record_result('job', None)
+
+        path = Path(self.profiler.toggle_cpu())
+        self.assertNotIn('record_result', vars(self.executor))
+        self.assertFalse(self.profiler.profiling)
+        self.assertEqual(self.executor.recorded, ['job'])
+
+        self.assertEqual(path.suffix, '.pstats')
+        functions = {function for _, _, function in pstats.Stats(str(path)).stats}
+        self.assertIn('record_result', functions)
+
+    def test_cpu_single_profiler(self):
+        class OneProfiler:
+            def enable(self):
+                raise ValueError('Another profiling tool is already active')
+
+        self.profiler.toggle_cpu()
+        # As on Python 3.12 and later, the result is still recorded without a profile of its own
+        with mock.patch('pycron.executor.profiler.cProfile.Profile', OneProfiler):
+            self.executor.record_result('job', None)
+        self.assertEqual(self.profiler.completion_profiles, [])
+        self.assertEqual(len(self.profiler.completion_seconds), 1)
+
+        with self.assertLogs('main_log', 'WARNING') as logs:
+            self.profiler.toggle_cpu()
+        self.assertIn('Recorded 1 results while profiling', logs.output[0])
+        self.assertEqual(self.executor.recorded, ['job'])
+
+    def test_memory(self):
+        self.profiler.toggle_memory()
+        self.assertTrue(tracemalloc.is_tracing())
+        grown = [str(number) * 100 for number in range(10000)]
+
+        path = Path(self.profiler.toggle_memory())
+        self.assertFalse(tracemalloc.is_tracing())
+        report = path.read_text()
+        self.assertTrue(report.startswith('Allocated since the start of tracing'))
+        self.assertIn('test_profiler.py', report)
+        self.assertEqual(len(grown), 10000)
+
+    def test_stacks(self):
+        report = Path(self.profiler.dump_stacks()).read_text()
+        self.assertIn('Thread MainThread', report)
+        self.assertIn('test_stacks', report)
+
+    def test_signal_from_other_threads(self):
+        with self.assertRaises(RuntimeError):
+            self.profiler.request_cpu_toggle()
+
+        previous = [signal.getsignal(number) for number in (signal.SIGUSR1, signal.SIGUSR2, signal.SIGQUIT)]
+        try:
+            self.profiler.install_signal_handlers()
+            self.profiler.request_cpu_toggle()
+            self.assertTrue(self.profiler.profiling)
+            self.profiler.request_cpu_toggle()
+            self.assertFalse(self.profiler.profiling)
+        finally:
+            for number, handler in zip((signal.SIGUSR1, signal.SIGUSR2, signal.SIGQUIT), previous):
+                signal.signal(number, handler)
+
+        self.assertEqual(len(list((self.test_folder / 'profiles').glob('cpu-*.pstats'))), 1)
@@ -0,0 +1,131 @@
+import subprocess
+from threading import Event
+from time import monotonic, sleep
+from unittest import TestCase
+
+from pycron import SettingsSingleton
+from pycron.executor.result_handlers import ResultDispatcher, ResultHandler, HandledRun
+from pycron.jobs.jobs import Job
+
+
+class Recording(ResultHandler):
+    def __init__(self, release: Event = None):
+        self.results = []
+        self.started = Event()
+        self.release = release
+        self.closed = False
+
+    def handle(self, result: HandledRun):
+        self.started.set()
+        if self.release is not None:
+            self.release.wait(5)
+        self.results.append(result)
+
+    def close(self):
+        self.closed = True
+
+
+class Broken(ResultHandler):
+    def handle(self, result: HandledRun):
+        raise RuntimeError('hook is down')
+
+
+class Incomplete(ResultHandler):
+    def close(self):
+        pass
+
+
+class TestResultHandlers(TestCase):
+    def setUp(self) -> None:
+        self.settings = SettingsSingleton.get_settings()
+        self.dispatchers = []
+
+    def tearDown(self) -> None:
+        for dispatcher in self.dispatchers:
+            dispatcher.stop(1)
+
+    def dispatcher(self, handlers: dict, queue_size: int = 10, drop_policy: str = 'newest') -> ResultDispatcher:
+        dispatcher = ResultDispatcher(handlers, queue_size, 1, drop_policy)
+        dispatcher.start()
+        self.dispatchers.append(dispatcher)
+        return dispatcher
+
+    def finished(self, name: str, returncode: int = 0):
+        job = Job(self.settings.JOBS_FOLDER / f'1min/{name}.sh')
+        job.lock()
+        if returncode:
+            job.fail()
+        else:
+            job.success()
+        return job, subprocess.CompletedProcess([], returncode, stdout=b'done\n', stderr=b'')
+
+    @staticmethod
+    def wait_for(condition, timeout: float = 5):
+        deadline = monotonic() + timeout
+        while not condition():
+            if monotonic() > deadline:
+                raise AssertionError('Timed out')
+            sleep(0.01)
+
+    def test_handlers(self):
+        recording = Recording()
+        dispatcher = self.dispatcher({'recording': recording, 'broken': Broken()})
+
+        with self.assertLogs('main_log', 'WARNING') as logs:
+            dispatcher.submit(*self.finished('report', returncode=3))
+            self.wait_for(lambda: dispatcher.status()['handlers'][1]['handled'] == 1)
+        self.assertIn('hook is down', logs.output[0])
+
+        result = recording.results[0]
+        self.assertEqual((result.file, result.returncode, result.failed, result.stdout), ('1min/report.sh', 3, True,
+                                                                                          b'done\n'))
+        self.assertEqual(result.as_dict()['number_of_failed_attempts'], 1)
+
+        recording_report, broken_report = dispatcher.status()['handlers']
+        self.assertEqual((recording_report['handled'], recording_report['errors']), (1, 0))
+        self.assertEqual((broken_report['handled'], broken_report['errors']), (1, 1))
+        self.assertEqual(broken_report['last_error'], 'RuntimeError: hook is down')
+        self.assertIsNotNone(recording_report['p95_seconds'])
+
+    def test_drop_policies(self):
+        for drop_policy, handled in [('newest', ['0', '1', '2']), ('oldest', ['0', '3', '4'])]:
+            with self.subTest(drop_policy=drop_policy):
+                release = Event()
+                recording = Recording(release)
+                dispatcher = self.dispatcher({'slow': recording}, queue_size=2, drop_policy=drop_policy)
+
+                # The first run keeps the only worker busy, two more fill the queue
+                dispatcher.submit(*self.finished('0'))
+                recording.started.wait(5)
+                with self.assertLogs('main_log', 'WARNING') as logs:
+                    for name in '1234':
+                        dispatcher.submit(*self.finished(name))
+                self.assertEqual(len(logs.records), 1)
+                self.assertEqual(dispatcher.status()['dropped'], 2)
+
+                release.set()
+                self.wait_for(lambda: len(recording.results) == 3)
+                self.assertEqual([result.file[5:-3] for result in recording.results], handled)
+
+    def test_stop(self):
+        release = Event()
+        recording = Recording(release)
+        dispatcher = self.dispatcher({'recording': recording})
+        for name in 'abc':
+            dispatcher.submit(*self.finished(name))
+
+        release.set()
+        dispatcher.stop(5)
+        self.assertEqual(len(recording.results), 3)
+        self.assertTrue(recording.closed)
+
+    def test_load(self):
+        self.assertIsInstance(ResultDispatcher.load('tests.test_result_handlers:Broken'), Broken)
+
+        # Without a handle() the handler fails when it is created, not with every run
+        for spec in ['tests.test_result_handlers:Missing', 'tests.test_result_handlers:TestResultHandlers',
+                     'pycron.executor.result_handlers:FailureWebhook', 'tests.test_result_handlers:Incomplete',
+                     'tests.test_result_handlers:TestCase']:
+            with self.subTest(spec=spec):
+                with self.assertRaises(ValueError):
+                    ResultDispatcher.load(spec)
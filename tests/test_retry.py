@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta
+from unittest import TestCase
+
+from pycron import SettingsSingleton
+from pycron.jobs.jobs import Job
+
+
+class TestRetryPolicy(TestCase):
+    def setUp(self) -> None:
+        self.settings = settings = SettingsSingleton.get_settings()
+        self.defaults = {name: getattr(settings, name) for name in (
+            'JOB_FAIL_TIMEOUT_PERIOD_MINUTES', 'RETRY_BACKOFF_MULTIPLIER', 'RETRY_MAX_DELAY_MINUTES', 'RETRY_JITTER',
+            'RETRY_MAX_ATTEMPTS', 'CIRCUIT_BREAKER_FAILURES')}
+        settings.JOB_FAIL_TIMEOUT_PERIOD_MINUTES = 2
+
+        self.job = Job(settings.JOBS_FOLDER / '1hour/hello.sh')
+        self.failed_at = datetime(2021, 6, 1, 12, 10, 30)
+
+    def tearDown(self) -> None:
+        for name, value in self.defaults.items():
+            setattr(self.settings, name, value)
+
+    def retry_in(self, failed_attempts: int, job: Job = None) -> timedelta:
+        job = job or self.job
+        job.failed_attempts = failed_attempts
+        job.last_failed_execution = self.failed_at
+        return job.next_execution - self.failed_at
+
+    def test_defaults_keep_fixed_timeout(self):
+        for failed_attempts in (1, 5, 500):
+            self.assertEqual(self.retry_in(failed_attempts), timedelta(minutes=2))
+
+    def test_exponential_backoff_is_capped(self):
+        self.settings.RETRY_BACKOFF_MULTIPLIER = 2
+        self.settings.RETRY_MAX_DELAY_MINUTES = 30
+
+        delays = [self.retry_in(failed_attempts) for failed_attempts in range(1, 7)]
+        self.assertEqual(delays, [timedelta(minutes=minutes) for minutes in (2, 4, 8, 16, 30, 30)])
+
+        # Months of failures do not overflow
+        self.assertEqual(self.retry_in(100000), timedelta(minutes=30))
+
+    def test_jitter_spreads_jobs(self):
+        self.settings.RETRY_JITTER = 0.5
+
+        delays = {self.retry_in(3, Job(self.settings.JOBS_FOLDER / f'1hour/job{i}.sh')) for i in range(20)}
+        self.assertGreater(len(delays), 10)
+        for delay in delays:
+            self.assertTrue(timedelta(minutes=1) <= delay <= timedelta(minutes=3))
+
+        # Stable for a given job and attempt
+        self.assertEqual(self.retry_in(3), self.retry_in(3))
+
+    def test_max_attempts_falls_back_to_interval(self):
+        self.settings.RETRY_MAX_ATTEMPTS = 3
+
+        self.assertEqual(self.retry_in(3), timedelta(minutes=2))
+        self.job.failed_attempts = 4
+        self.assertEqual(self.job.next_execution, datetime(2021, 6, 1, 13, 10))
+        self.assertFalse(self.job.parked)
+
+    def test_broken_frequent_job_slows_down(self):
+        self.settings.RETRY_BACKOFF_MULTIPLIER = 2
+        self.settings.RETRY_MAX_DELAY_MINUTES = 30
+        self.settings.CIRCUIT_BREAKER_FAILURES = 4
+        job = Job(self.settings.JOBS_FOLDER / '1min/poll.sh')
+
+        self.assertEqual(self.retry_in(3, job), timedelta(minutes=8))
+        # Parked, probed every RETRY_MAX_DELAY_MINUTES rather than on its 1 minute interval
+        self.retry_in(4, job)
+        self.assertTrue(job.parked)
+        self.assertEqual(job.next_execution, datetime(2021, 6, 1, 12, 40))
+
+        # The same once out of retries
+        self.settings.CIRCUIT_BREAKER_FAILURES = 0
+        self.settings.RETRY_MAX_ATTEMPTS = 3
+        self.assertEqual(self.retry_in(4, job), timedelta(minutes=29, seconds=30))
+
+    def test_circuit_breaker(self):
+        self.settings.CIRCUIT_BREAKER_FAILURES = 5
+
+        self.retry_in(4)
+        self.assertFalse(self.job.parked)
+
+        self.retry_in(5)
+        self.assertTrue(self.job.parked)
+        self.assertEqual(self.job.next_execution, datetime(2021, 6, 1, 13, 10))
+
+        self.job.reset_failures()
+        self.assertFalse(self.job.parked)
+        self.assertEqual(self.job.failed_attempts, 0)
@@ -0,0 +1,104 @@
+from collections import Counter
+from pathlib import Path
+from unittest import TestCase
+
+from pycron import SettingsSingleton
+from pycron.job_discovery.folder_discovery import JobFolderScanner
+from pycron.jobs.fair_share import fair_share
+from pycron.persistance.compact_store import CompactStoreCodec
+from pycron.persistance.pickle_persistence import MemStore
+
+
+class TestJobRoots(TestCase):
+    def setUp(self) -> None:
+        self.test_folder = test_folder = Path('test_folder').absolute()
+        for root in ('default', 'team_a', 'team_b'):
+            (test_folder / root).mkdir(parents=True, exist_ok=True)
+
+        self.settings = settings = SettingsSingleton.get_settings()
+        settings.set_jobs_folder(test_folder / 'default')
+        settings.PERSISTENCE_FILE = test_folder / 'jar.pickle'
+        settings.EXTRA_JOB_ROOTS = {'team_a': test_folder / 'team_a', 'team_b': test_folder / 'team_b'}
+        settings.ROOT_SHARES = {'default': (1, 0), 'team_a': (1, 0), 'team_b': (3, 0)}
+        settings.MAX_RUNNING_JOBS = 0
+
+        self.store = MemStore(nuke_persistence=True)
+
+    def tearDown(self) -> None:
+        self.settings.EXTRA_JOB_ROOTS = {}
+        self.settings.ROOT_SHARES = {'default': (1, 0)}
+        self.settings.MAX_RUNNING_JOBS = 0
+
+        for path in sorted(self.test_folder.rglob('*'), reverse=True):
+            path.rmdir() if path.is_dir() else path.unlink()
+        self.test_folder.rmdir()
+
+    def write(self, root: str, scripts):
+        for script in scripts:
+            path = self.test_folder / root / script
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text('#!/bin/sh\n')
+
+    def due(self, root: str, count: int):
+        self.write(root, [f'1min/job{index}.sh' for index in range(count)])
+        jobs = [self.store.fetch(self.test_folder / root / f'1min/job{index}.sh') for index in range(count)]
+        for job in jobs:
+            job.last_execution = job.last_execution.replace(year=2000)
+        return jobs
+
+    def test_discovery(self):
+        self.write('default', ['1hour/at0030/report.sh'])
+        self.write('team_a', ['1hour/at0030/report.sh', '5min/.hidden/skipped.sh'])
+        self.write('team_a', ['1day/at0200/load.sh'])
+        (self.test_folder / 'team_a/1day/at0200/load.sh.deps').write_text('@team_b/1day/extract.sh\n')
+        self.write('team_b', ['1day/extract.sh'])
+
+        JobFolderScanner(self.store).run_discovery()
+
+        names = sorted(str(job.relative_name) for job in self.store.store.values())
+        self.assertEqual(names, ['1hour/at0030/report.sh', '@team_a/1day/at0200/load.sh',
+                                 '@team_a/1hour/at0030/report.sh', '@team_b/1day/extract.sh'])
+
+        report = self.store.find('@team_a/1hour/at0030/report.sh')
+        self.assertEqual(report.script_path, self.test_folder / 'team_a/1hour/at0030/report.sh')
+        self.assertEqual((report.root, report.interval.at_data), ('team_a', {'minute': 30}))
+        self.assertEqual(self.store.find('1hour/at0030/report.sh').root, 'default')
+        # Dependencies reach across roots
+        self.assertEqual(self.store.dependencies.upstream[self.test_folder / 'team_a/1day/at0200/load.sh'],
+                         (self.test_folder / 'team_b/1day/extract.sh',))
+        self.assertEqual(len(self.store.matching('@team_a')), 2)
+
+        # Jobs of roots that are no longer configured are left out when the store is loaded
+        data = CompactStoreCodec.encode(self.store.store)
+        restored = CompactStoreCodec.decode(data, self.settings.JOBS_FOLDER, {'team_a': self.test_folder / 'team_a'})
+        self.assertEqual(sorted(str(job.relative_name) for job in restored.values()),
+                         ['1hour/at0030/report.sh', '@team_a/1day/at0200/load.sh', '@team_a/1hour/at0030/report.sh'])
+
+    def test_fair_share(self):
+        self.due('team_a', 20)
+        self.due('team_b', 20)
+        self.due('default', 2)
+
+        # Without limits every due job starts
+        self.assertEqual(len(self.store.runnable()), 42)
+
+        self.settings.MAX_RUNNING_JOBS = 10
+        admitted = Counter(job.root for job in self.store.runnable())
+        # The default root has only 2 jobs, the slots it leaves go to the other roots by weight
+        self.assertEqual(admitted, {'default': 2, 'team_a': 2, 'team_b': 6})
+
+        # Slots already taken count against a root's share
+        team_b_running = Counter({'team_b': 6})
+        admitted = Counter(job.root for job in fair_share(self.store.runnable(), team_b_running))
+        self.assertEqual(admitted, {'default': 2, 'team_a': 2})
+
+    def test_root_quota(self):
+        self.due('team_a', 5)
+        self.due('default', 5)
+        self.settings.ROOT_SHARES['team_a'] = (1, 2)
+
+        team_a = [job for job in self.store.runnable() if job.root == 'team_a']
+        self.assertEqual(len(team_a), 2)
+
+        team_a[0].lock()
+        self.assertEqual(Counter(job.root for job in self.store.runnable()), {'default': 5, 'team_a': 1})
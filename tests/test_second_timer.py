@@ -0,0 +1,115 @@
+import datetime
+from pathlib import Path
+from threading import Lock
+from time import sleep, monotonic, time
+from types import SimpleNamespace
+from unittest import TestCase
+
+from pycron import SettingsSingleton
+from pycron.executor.second_timer import SecondTimer
+from pycron.interval.seconds import Seconds
+from pycron.jobs.jobs import Job, InvalidJobException
+from pycron.persistance.pickle_persistence import MemStore
+
+
+class TestSeconds(TestCase):
+    def test_slots_are_anchored(self):
+        interval = Seconds(15)
+
+        # The next slot does not depend on where in the previous slot the last run happened
+        for second, microsecond in [(0, 0), (7, 5), (14, 999999)]:
+            last_run = datetime.datetime(2021, 1, 1, 12, 0, second, microsecond)
+            self.assertEqual(interval.next_time(last_run), datetime.datetime(2021, 1, 1, 12, 0, 15))
+
+    def test_folder(self):
+        settings = SettingsSingleton.get_settings()
+
+        job = Job(settings.JOBS_FOLDER / '15sec/poll.sh')
+        self.assertEqual(job.interval, Seconds(15))
+        self.assertTrue(job.interval.timer_driven)
+
+        with self.assertRaises(InvalidJobException):
+            Job(settings.JOBS_FOLDER / '0sec/poll.sh')
+
+
+class TestSecondTimer(TestCase):
+    def setUp(self) -> None:
+        self.test_folder = test_folder = Path('test_folder').absolute()
+        test_folder.mkdir(exist_ok=True)
+
+        self.settings = settings = SettingsSingleton.get_settings()
+        settings.set_jobs_folder(test_folder)
+        settings.PERSISTENCE_FILE = test_folder / 'jar.pickle'
+
+        self.store = MemStore(nuke_persistence=True)
+        self.fast_job = self.store.fetch(test_folder / '1sec/fast.sh')
+        self.store.fetch(test_folder / '1min/slow.sh')
+
+        self.started = []
+        self.executor = SimpleNamespace(store=self.store, store_lock=Lock(), parallel_job_runner=self.record_start)
+        self.timer = SecondTimer(self.executor)
+
+    def tearDown(self) -> None:
+        self.timer.stop()
+        for path in sorted(self.test_folder.rglob('*'), reverse=True):
+            path.rmdir() if path.is_dir() else path.unlink()
+        self.test_folder.rmdir()
+
+    def record_start(self, jobs, due=None):
+        self.started.append((monotonic(), jobs, due))
+
+    def test_runs_on_slots(self):
+        # Left to the timer, never picked up by the store scan
+        self.fast_job.last_execution = datetime.datetime.now() - datetime.timedelta(hours=1)
+        self.assertEqual(self.store.runnable(), [])
+
+        self.timer.sync(self.store)
+        self.assertEqual(list(self.timer.periods), [self.fast_job.script_path])
+
+        self.timer.start()
+        sleep(2.6)
+
+        self.assertIn(len(self.started), (2, 3))
+        for (started, jobs, due), (next_started, _, _) in zip(self.started, self.started[1:]):
+            self.assertEqual(jobs, [self.fast_job])
+            self.assertAlmostEqual(next_started - started, 1, delta=0.1)
+            # Slots are whole seconds of the wall clock
+            self.assertLess(due.microsecond, 100000)
+
+    def test_skips_running_and_removed_jobs(self):
+        self.fast_job.locked = True
+        self.timer.sync(self.store)
+        self.timer.start()
+        sleep(1.2)
+        self.assertEqual(self.started, [])
+
+        self.fast_job.locked = False
+        del self.store.store[self.fast_job.script_path]
+        self.timer.sync(self.store)
+        sleep(1.2)
+        self.assertEqual(self.started, [])
+
+    def test_retries_jobs_held_back_by_caps(self):
+        self.settings.MAX_RUNNING_JOBS = 1
+        self.settings.SLEEP_DURATION = 0.1
+        self.addCleanup(setattr, self.settings, 'MAX_RUNNING_JOBS', 0)
+        self.addCleanup(setattr, self.settings, 'SLEEP_DURATION', 1)
+
+        slow_job = self.store.store[self.test_folder / '1min/slow.sh']
+        slow_job.lock()
+        self.timer.sync(self.store)
+        self.timer.start()
+        sleep(1.2)
+        self.assertEqual(self.started, [])
+
+        # A little after a slot, the retry starts the job before the next slot is due
+        sleep(1.3 - time() % 1)
+        slow_job.unlock()
+        unlocked = datetime.datetime.now()
+        sleep(0.3)
+
+        _, jobs, due = self.started[0]
+        self.assertEqual(jobs, [self.fast_job])
+        # Still late for the slot it was held back in
+        self.assertLess(due.microsecond, 100000)
+        self.assertGreater(unlocked - due, datetime.timedelta(seconds=0.2))
@@ -0,0 +1,68 @@
+from collections import Counter
+from unittest import TestCase
+
+from pycron.sharding.hash_ring import HashRing
+from pycron.sharding.supervisor import ShardMembership
+
+
+class TestHashRing(TestCase):
+    def setUp(self) -> None:
+        self.keys = [f'{every}min/job_{i}.sh' for every in range(1, 6) for i in range(400)]
+
+    def test_stable_owner(self):
+        """
+        Test two rings with the same shards agree on every owner
+        """
+        ring_a = HashRing(range(4))
+        ring_b = HashRing([3, 2, 1, 0])
+
+        for key in self.keys:
+            self.assertEqual(ring_a.owner(key), ring_b.owner(key))
+
+    def test_spread(self):
+        """
+        Test every shard gets a reasonable share of the jobs
+        """
+        ring = HashRing(range(4))
+
+        shares = Counter(ring.owner(key) for key in self.keys)
+
+        self.assertEqual(set(shares), {0, 1, 2, 3})
+        for shard, share in shares.items():
+            self.assertGreater(share, len(self.keys) / 4 * 0.5, msg=f'Shard {shard} is underloaded')
+
+    def test_removing_shard_only_moves_its_jobs(self):
+        """
+        Test dropping a shard leaves the other shards' jobs where they were
+        """
+        full_ring = HashRing(range(4))
+        reduced_ring = HashRing([0, 1, 3])
+
+        for key in self.keys:
+            before = full_ring.owner(key)
+            after = reduced_ring.owner(key)
+            if before != 2:
+                self.assertEqual(before, after, msg=f'{key} moved without its shard leaving')
+            else:
+                self.assertNotEqual(after, 2)
+
+    def test_empty_ring(self):
+        with self.assertRaises(LookupError):
+            HashRing([]).owner('1min/job.sh')
+
+
+class TestShardMembership(TestCase):
+    def test_refresh_reports_departed(self):
+        membership = ShardMembership(3)
+
+        ring, departed = membership.refresh()
+        self.assertEqual(ring.shards, [0, 1, 2])
+        self.assertEqual(departed, [])
+        self.assertFalse(membership.changed())
+
+        membership.set_member(1, False)
+        self.assertTrue(membership.changed())
+
+        ring, departed = membership.refresh()
+        self.assertEqual(ring.shards, [0, 2])
+        self.assertEqual(departed, [1])
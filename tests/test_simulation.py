@@ -0,0 +1,108 @@
+import io
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import TestCase
+
+from pycron import SettingsSingleton
+from pycron.clock import VirtualClock, virtual_clock
+from pycron.commands import simulate
+from pycron.jobs.dependencies import DependencyGraph
+from pycron.jobs.jobs import Job
+from pycron.persistance.pickle_persistence import MemStore
+from pycron.simulation.simulator import Simulator
+
+
+class TestSimulator(TestCase):
+    def setUp(self) -> None:
+        self.test_folder = test_folder = Path('test_folder').absolute()
+        test_folder.mkdir(exist_ok=True)
+
+        self.settings = settings = SettingsSingleton.get_settings()
+        settings.set_jobs_folder(test_folder)
+        settings.PERSISTENCE_FILE = test_folder / 'jar.pickle'
+        # Other tests load configs with their own loop duration
+        settings.SLEEP_DURATION = 1
+
+        self.start = datetime(2021, 6, 7)  # Monday
+
+    def tearDown(self) -> None:
+        for path in sorted(self.test_folder.rglob('*'), reverse=True):
+            path.rmdir() if path.is_dir() else path.unlink()
+        self.test_folder.rmdir()
+
+    def simulate(self, scripts, duration: float, days: float = 1):
+        with virtual_clock(VirtualClock(self.start)):
+            jobs = {job.script_path: job for job in (Job(self.test_folder / script) for script in scripts)}
+
+        store = MemStore(jobs=jobs)
+        store.dependencies = DependencyGraph.from_scripts(list(jobs))
+        report = Simulator(store, {path: duration for path in jobs}, self.start).run(
+            self.start + timedelta(days=days))
+        return store, report
+
+    def test_nightly_batch(self):
+        _, report = self.simulate([f'1day/at0200/job{index}.sh' for index in range(300)], duration=120)
+
+        self.assertEqual(report.runs, 300)
+        peak, peak_at = report.peak_concurrency
+        self.assertEqual(peak, 300)
+        # Due at 02:00:00, the loop sees them on its first tick after that
+        self.assertEqual(peak_at, datetime(2021, 6, 7, 2, 0, 1))
+        self.assertEqual(report.worst_lag[0], 1)
+        self.assertEqual(report.concurrency_per_minute[121], 300)
+        self.assertNotIn(123, report.concurrency_per_minute)
+
+    def test_queueing_on_caps(self):
+        self.settings.MAX_RUNNING_JOBS = 100
+        self.addCleanup(setattr, self.settings, 'MAX_RUNNING_JOBS', 0)
+
+        _, report = self.simulate([f'1day/at0200/job{index}.sh' for index in range(300)], duration=120)
+
+        self.assertEqual(report.runs, 300)
+        self.assertEqual(report.peak_concurrency[0], 100)
+        # Three waves, the last one waits for the first two to finish
+        self.assertEqual(report.starts_per_minute[120], 100)
+        self.assertEqual(report.starts_per_minute[124], 100)
+        self.assertEqual(report.worst_lag[0], 243)
+
+        # Held back slots of a timer driven job move on to its latest slot
+        self.settings.MAX_RUNNING_JOBS = 1
+        _, report = self.simulate(['1min/slow.sh', '15sec/poll.sh'], duration=40, days=1 / 24)
+        self.assertEqual(report.peak_concurrency[0], 1)
+        # Only the 1min job waits a whole poll run
+        lag, name, _ = report.worst_lag
+        self.assertEqual(name, '1min/slow.sh')
+        self.assertLessEqual(lag, 41)
+
+    def test_overrunning_jobs_skip_slots(self):
+        # A 1min job taking 90 s only gets every other minute
+        _, report = self.simulate(['1min/slow.sh'], duration=90, days=1 / 24)
+        self.assertEqual(report.runs, 30)
+
+        _, report = self.simulate(['15sec/poll.sh'], duration=20, days=1 / 24)
+        self.assertEqual(report.runs, 120)
+        self.assertEqual(report.worst_lag[0], 0)
+
+    def test_pipeline(self):
+        for name, upstream in [('transform.sh', 'extract.sh'), ('load.sh', 'transform.sh')]:
+            sidecar = self.test_folder / '1day/at0200' / f'{name}.deps'
+            sidecar.parent.mkdir(parents=True, exist_ok=True)
+            sidecar.write_text(upstream)
+
+        store, report = self.simulate(['1day/at0200/extract.sh', '1day/at0200/transform.sh', '1day/at0200/load.sh'],
+                                      duration=600)
+
+        self.assertEqual(report.runs, 3)
+        load = store.find('1day/at0200/load.sh')
+        # The pipeline takes its critical path, runs follow each other without waiting for a tick
+        self.assertEqual(load.last_execution, datetime(2021, 6, 7, 2, 30, 1))
+
+    def test_command(self):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            exit_code = simulate({'start': '2021-06-07T00:00', 'days': 7, 'duration': None, 'number': 3,
+                                  'add': ['300:1day/at0200:120', '20:5min'], 'arguments': []})
+
+        self.assertEqual(exit_code, 0)
+        self.assertIn('Peak concurrency:  320', output.getvalue())
@@ -0,0 +1,98 @@
+import io
+import json
+from contextlib import redirect_stdout
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import TestCase
+from uuid import uuid4
+
+from pycron import SettingsSingleton
+from pycron.commands import export_trace
+from pycron.tracing import Tracer, read_trace
+
+
+class TestTracing(TestCase):
+    def setUp(self) -> None:
+        self.test_folder = test_folder = Path('test_folder').absolute()
+        test_folder.mkdir(exist_ok=True)
+
+        self.settings = settings = SettingsSingleton.get_settings()
+        settings.set_logs_folder(test_folder)
+        settings.TRACE_SAMPLE_RATE = 1
+
+        self.tracer = Tracer()
+
+    def tearDown(self) -> None:
+        self.tracer.close()
+        self.settings.TRACE_SAMPLE_RATE = 0
+        self.settings.TRACE_MAX_SIZE_MB = 100
+        for path in sorted(self.test_folder.rglob('*'), reverse=True):
+            path.rmdir() if path.is_dir() else path.unlink()
+        self.test_folder.rmdir()
+
+    def events(self):
+        self.tracer.close()
+        return list(read_trace(self.test_folder / 'trace.jsonl'))
+
+    def job(self):
+        return SimpleNamespace(relative_name=Path('1min/a.sh'), run_uuid=uuid4())
+
+    def test_nested_spans_follow_the_run(self):
+        job = self.job()
+        with self.tracer.run_span('record_result', job):
+            with self.tracer.span('serialize_store', jobs=3):
+                pass
+
+        # Outside of a traced span nothing is recorded
+        with self.tracer.span('serialize_store'):
+            pass
+
+        inner, outer = self.events()
+        self.assertEqual(outer['name'], 'record_result')
+        self.assertEqual(outer['args'], {'job': '1min/a.sh', 'run_uuid': str(job.run_uuid)})
+        self.assertEqual(outer['cat'], 'run')
+        self.assertEqual(inner['args'], {'jobs': 3})
+        self.assertEqual(inner['ph'], 'X')
+        self.assertLessEqual(outer['ts'], inner['ts'])
+        self.assertGreaterEqual(outer['ts'] + outer['dur'], inner['ts'] + inner['dur'])
+
+    def test_sampling(self):
+        self.settings.TRACE_SAMPLE_RATE = 0.25
+        run_uuids = [uuid4() for _ in range(4000)]
+        sampled = [run_uuid for run_uuid in run_uuids if self.tracer.run_sampled(run_uuid)]
+        self.assertAlmostEqual(len(sampled) / len(run_uuids), 0.25, delta=0.05)
+
+        # Every span of a run gets the same answer
+        self.assertTrue(all(self.tracer.run_sampled(run_uuid) for run_uuid in sampled))
+
+        self.settings.TRACE_SAMPLE_RATE = 0
+        self.assertFalse(any(self.tracer.run_sampled(run_uuid) for run_uuid in run_uuids))
+        self.assertFalse(self.tracer.tick_sampled())
+        with self.tracer.run_span('execute', self.job()):
+            pass
+        self.assertEqual(self.events(), [])
+
+    def test_rotation(self):
+        self.settings.TRACE_MAX_SIZE_MB = 0
+        for _ in range(3):
+            with self.tracer.span('discovery', True):
+                pass
+
+        self.assertTrue((self.test_folder / 'trace.jsonl.1').is_file())
+        self.assertEqual(len(self.events()), 1)
+
+    def test_export(self):
+        job = self.job()
+        with self.tracer.run_span('execute', job):
+            pass
+        with self.tracer.span('discovery', True):
+            pass
+        self.tracer.close()
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            exit_code = export_trace({'arguments': ['1min/a.sh']})
+
+        self.assertEqual(exit_code, 0)
+        trace = json.loads(output.getvalue())
+        self.assertEqual([event['name'] for event in trace['traceEvents']], ['execute'])
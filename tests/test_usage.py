@@ -0,0 +1,84 @@
+import io
+import subprocess
+from contextlib import redirect_stdout
+from pathlib import Path
+from unittest import TestCase
+
+from pycron import SettingsSingleton
+from pycron.commands import show_usage
+from pycron.executor.job_process import JobProcess, RunResult
+from pycron.jobs.usage import USAGE_FIELDS, usage_rows
+from pycron.persistance.pickle_persistence import MemStore
+
+
+class TestResourceUsage(TestCase):
+    def setUp(self) -> None:
+        self.test_folder = test_folder = Path('test_folder').absolute()
+        (test_folder / '1min').mkdir(parents=True, exist_ok=True)
+
+        self.settings = settings = SettingsSingleton.get_settings()
+        settings.set_jobs_folder(test_folder)
+        settings.set_logs_folder(test_folder)
+        settings.PERSISTENCE_FILE = test_folder / 'jar.pickle'
+
+        self.store = MemStore(nuke_persistence=True)
+
+    def tearDown(self) -> None:
+        for path in sorted(self.test_folder.rglob('*'), reverse=True):
+            path.rmdir() if path.is_dir() else path.unlink()
+        self.test_folder.rmdir()
+
+    def usage(self, cpu: float, rss: int) -> dict:
+        return {**dict.fromkeys(USAGE_FIELDS, 1), 'cpu_user_seconds': cpu, 'max_rss_kb': rss}
+
+    def test_reaped_usage(self):
+        script_path = self.test_folder / '1min/busy.sh'
+        script_path.write_text('#!/bin/sh\ni=0\nwhile [ $i -lt 100000 ]; do i=$((i+1)); done\n')
+        script_path.chmod(0o755)
+
+        job = self.store.fetch(script_path)
+        job.lock()
+        process = JobProcess(job)
+        process.start()
+        process.wait()
+        result = process.result()
+
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(list(result.usage), USAGE_FIELDS)
+        self.assertGreater(result.usage['cpu_user_seconds'] + result.usage['cpu_system_seconds'], 0)
+        self.assertGreater(result.usage['max_rss_kb'], 0)
+
+        self.store.job_successful(job, result)
+        self.assertEqual(job.usage.runs, 1)
+        self.assertEqual(job.usage.cpu_user_seconds, result.usage['cpu_user_seconds'])
+
+    def test_totals(self):
+        for name, runs in [('1min/a.sh', [(2, 100), (3, 300)]), ('1min/b.sh', [(1, 50)]), ('5min/c.sh', [(10, 20)])]:
+            script_path = self.test_folder / name
+            script_path.parent.mkdir(exist_ok=True)
+            script_path.write_text('#!/bin/sh\n')
+            job = self.store.fetch(script_path)
+            for cpu, rss in runs:
+                job.lock()
+                self.store.job_successful(job, RunResult([name], 0, b'', b'', self.usage(cpu, rss)), persist=False)
+
+        # Runs without a known usage are not counted
+        job = self.store.fetch(self.test_folder / '1min/a.sh')
+        job.lock()
+        self.store.job_failed(job, subprocess.CompletedProcess([], 1, b'', b''), persist=False)
+
+        jobs = self.store.store.values()
+        self.assertEqual([(row['name'], row['runs'], row['cpu_seconds']) for row in usage_rows(jobs)],
+                         [('5min/c.sh', 1, 11), ('1min/a.sh', 2, 7), ('1min/b.sh', 1, 2)])
+
+        folders = usage_rows(jobs, by_folder=True)
+        self.assertEqual([(row['name'], row['runs'], row['cpu_seconds'], row['max_rss_kb']) for row in folders],
+                         [('5min', 1, 11, 20), ('1min', 3, 9, 300)])
+
+        self.store.serialize_store(self.store.store)
+        output = io.StringIO()
+        with redirect_stdout(output):
+            exit_code = show_usage({'arguments': ['folders', 'csv'], 'number': 10})
+
+        self.assertEqual(exit_code, 0)
+        self.assertIn('1min,3,9,3.0,300', output.getvalue())
@@ -0,0 +1,66 @@
+import json
+from time import sleep
+from unittest import TestCase
+
+from pycron import SettingsSingleton
+from pycron.executor.watchdog import TickWatchdog
+
+
+class TestTickWatchdog(TestCase):
+    def setUp(self) -> None:
+        self.settings = SettingsSingleton.get_settings()
+        self.settings.SLEEP_DURATION = 0.05
+
+        self.watchdog = TickWatchdog(0.2)
+        self.watchdog.start()
+
+    def tearDown(self) -> None:
+        self.watchdog.stop()
+        self.settings.SLEEP_DURATION = 1
+
+    @staticmethod
+    def payload(message: str) -> dict:
+        return json.loads(message[message.index('{'):])
+
+    def tick(self, discovery: float):
+        with self.watchdog.phase('runnable'):
+            pass
+        with self.watchdog.phase('discovery'):
+            sleep(discovery)
+        with self.watchdog.phase('sleep'):
+            sleep(self.settings.SLEEP_DURATION)
+        self.watchdog.end_tick()
+
+    def test_within_budget(self):
+        with self.assertNoLogs('main_log'):
+            self.tick(0.05)
+
+        self.assertEqual(self.watchdog.overruns, 0)
+        self.assertEqual(list(self.watchdog.last_tick), ['runnable', 'discovery', 'sleep'])
+        self.assertAlmostEqual(self.watchdog.last_tick['discovery'], 0.05, delta=0.04)
+
+    def test_overrun(self):
+        with self.assertLogs('main_log', 'WARNING') as logs:
+            self.tick(0.45)
+
+        # Reported while the slow phase was still running, then once more with the timings of the whole tick
+        self.assertEqual(len(logs.records), 2)
+        during, after = (self.payload(record.getMessage()) for record in logs.records)
+        self.assertEqual(during['current_phase'], 'discovery')
+        self.assertTrue(any('in tick' in line for line in during['stack']), msg=during['stack'])
+        self.assertEqual(list(after['phases']), ['runnable', 'discovery', 'sleep'])
+        self.assertGreater(after['work_seconds'], 0.4)
+
+        self.assertEqual(self.watchdog.overruns, 1)
+        self.tick(0)
+        self.assertEqual(self.watchdog.overruns, 1)
+
+    def test_disabled(self):
+        watchdog = TickWatchdog(0)
+        watchdog.start()
+        with watchdog.phase('runnable'):
+            pass
+        watchdog.end_tick()
+
+        self.assertIsNone(watchdog.thread)
+        self.assertEqual(watchdog.last_tick, {})